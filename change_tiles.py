@@ -0,0 +1,51 @@
+import csv
+
+import numpy as np
+
+#: UTM zone 12N meters
+TILE_SIZE = 10000.0
+
+
+def tile_keys(xs, ys, tile_size=TILE_SIZE):
+    """(columns, rows) of the grid tiles holding each point, NaN points dropped."""
+    xs = np.asarray(xs, dtype='<f8')
+    ys = np.asarray(ys, dtype='<f8')
+    located = ~(np.isnan(xs) | np.isnan(ys))
+
+    return (np.floor(xs[located] / tile_size).astype(np.int64),
+            np.floor(ys[located] / tile_size).astype(np.int64))
+
+
+def _count_by_tile(xs, ys, tile_size):
+    columns, rows = tile_keys(xs, ys, tile_size)
+    if not len(columns):
+        return np.zeros((0, 2), dtype=np.int64), np.zeros(0, dtype=np.int64)
+    tiles = np.column_stack((columns, rows))
+    tiles, counts = np.unique(tiles.view([('column', np.int64), ('row', np.int64)]).ravel(), return_counts=True)
+
+    return tiles.view(np.int64).reshape(-1, 2), counts
+
+
+def summarize_changes(added_xs, added_ys, removed_xs, removed_ys, tile_size=TILE_SIZE):
+    """Sorted (column, row, added, removed) counts for every tile with a change."""
+    added_tiles, added_counts = _count_by_tile(added_xs, added_ys, tile_size)
+    removed_tiles, removed_counts = _count_by_tile(removed_xs, removed_ys, tile_size)
+    summary = {}
+    for (column, row), count in zip(added_tiles.tolist(), added_counts.tolist()):
+        summary[(column, row)] = [count, 0]
+    for (column, row), count in zip(removed_tiles.tolist(), removed_counts.tolist()):
+        summary.setdefault((column, row), [0, 0])[1] = count
+
+    return [(column, row, added, removed) for (column, row), (added, removed) in sorted(summary.items())]
+
+
+def write_tile_summary(summary_path, summary, tile_size=TILE_SIZE):
+    with open(summary_path, 'wb') as summary_csv:
+        summary_writer = csv.writer(summary_csv)
+        summary_writer.writerow(('tile_col', 'tile_row', 'xmin', 'ymin', 'xmax', 'ymax', 'added', 'removed'))
+        for column, row, added, removed in summary:
+            summary_writer.writerow((column, row,
+                                     column * tile_size, row * tile_size,
+                                     (column + 1) * tile_size, (row + 1) * tile_size,
+                                     added, removed))
+    print 'Changed tiles: {}'.format(len(summary))
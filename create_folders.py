@@ -1,7 +1,6 @@
 from __future__ import print_function
 import os
 from apiclient import errors
-from apiclient.http import MediaFileUpload
 import httplib2
 from apiclient import discovery
 from oauth2client import client
@@ -9,8 +8,13 @@ from oauth2client import tools
 from oauth2client.file import Storage
 import json
 from time import strftime
-import shutil
 import csv
+from drive_index import load_drive_index
+from ftp_catalog import open_catalog
+from drive_transport import build_service, upload_file
+from drive_metadata import MetadataClient, CONCURRENCY, find_file_id
+from path_registry import load_path_registry
+from zip_sync import drive_time, load_local_hashes, save_local_hashes, select_zip_uploads
 
 unique_run_num = strftime("%Y%m%d_%H%M%S")
 
@@ -56,21 +60,18 @@ def get_credentials():
     return credentials
 
 
-def file_exists(file_id):
+def file_exists(file_id, remote_mirror):
     """
     Checks whether a file exists on the Drive and is not trashed.
     :param fileId: The ID of the file to check.
     :type fileId: str
+    :param remote_mirror: RemoteMirror tracking file_id.
     :returns: bool
     """
     if not file_id:
         return False
-    try:
-        results = file_service.get(fileId=file_id, fields="trashed").execute()
-        # Return False if the file is either trashed or does not exist
-        return not results['trashed']
-    except Exception:
-        return False
+    # Answered from the mirror kept current by the drive changes feed
+    return remote_mirror.exists(file_id)
 
 
 def get_file_id_name_and_directory(name, parent_id, service):
@@ -95,39 +96,41 @@ def create_drive_folder(service, parent_id, name):
     return folder.get('id')
 
 
-def create_drive_file(service, parent_id, name, media_body):
+def create_drive_file(service, parent_id, name, local_file, modified_time=None):
 
     file_metadata = {'name': name,
                      'mimeType': 'application/zip',
                      'parents': [parent_id]}
+    if modified_time:
+        file_metadata['modifiedTime'] = modified_time
 
-    request = service.files().create(body=file_metadata,
-                                     media_body=media_body,
-                                     fields="id")
-    response = None
-    while response is None:
-        status, response = request.next_chunk()
-    #   if status :
-    #     print('{} percent {}'.format(name, int(status.progress() * 100)))
+    response = upload_file(service, local_file, body=file_metadata)
 
     return response.get('id')
 
 
-def copy_directory_structure_to_drive(root_drive_folder_id, top_level_directory, folder_path_id_json, service):
+def update_drive_file(service, file_id, local_file, modified_time=None):
+    file_metadata = {}
+    if modified_time:
+        file_metadata['modifiedTime'] = modified_time
+
+    response = upload_file(service, local_file, body=file_metadata, file_id=file_id)
+
+    return response.get('id')
+
+
+def copy_directory_structure_to_drive(root_drive_folder_id, top_level_directory, folder_path_id_json, service,
+                                      catalog=None, concurrency=CONCURRENCY):
     root_drive_folder = root_drive_folder_id
     top_dir = top_level_directory
-    google_folder_ids = {}
-    google_folder_ids[top_dir] = root_drive_folder
-    total_folders = 0
-    for root, dirs, files in os.walk(top_dir, topdown=True):
+    catalog = catalog or open_catalog(top_dir)
+    dir_paths = []
+    for root, dirs, files in catalog.walk(top_dir):
         for name in dirs:
-            dir_path = os.path.join(root, name)
-            if dir_path not in google_folder_ids:
-                temp_id = create_drive_folder(service, google_folder_ids[root], name)
-                google_folder_ids[dir_path] = temp_id
-                total_folders += 1
-                if total_folders % 10 == 0:
-                    print('Created folder count: {}'.format(total_folders))
+            dir_paths.append(os.path.join(root, name))
+    client = MetadataClient(service, concurrency)
+    google_folder_ids = client.create_folder_tree(top_dir, root_drive_folder, dir_paths)
+    total_folders = len(google_folder_ids) - 1
 
     path_id_list = []
     for ftp_path in google_folder_ids:
@@ -143,49 +146,69 @@ def copy_directory_structure_to_drive(root_drive_folder_id, top_level_directory,
 
 
 def load_path_ids(folder_path_id_json):
-    path_id_list = None
-    with open(folder_path_id_json, 'r') as json_file:
-        path_id_list = json.load(json_file)
-    folder_path_ids = {}
-    for path_id in path_id_list:
-        folder_path_ids[path_id['path']] = path_id['fileId']
-    return folder_path_ids
+    return load_path_registry(folder_path_id_json)
+
 
+def load_all_zip_files(top_level_directory, folder_path_id_json, service, file_path_json,
+                       drive_index_json='./data/drive_index.json',
+                       local_hash_json='./data/local_hashes.json',
+                       catalog=None,
+                       concurrency=CONCURRENCY):
+    """Mirror every zip under top_level_directory to drive.
 
-def load_all_zip_files(top_level_directory, folder_path_id_json, service, file_path_json):
+    A zip is skipped when its size and modified time match the drive copy,
+    or when its size matches and its md5 matches the drive md5Checksum.
+    Only new or changed zips are uploaded, concurrency at a time.
+    """
     folder_path_ids = load_path_ids(folder_path_id_json)
     top_dir = top_level_directory
-    google_file_ids = {}
+    drive_index = load_drive_index(folder_path_ids[top_dir], drive_index_json, service)
+    local_hashes = load_local_hashes(local_hash_json)
+    catalog = catalog or open_catalog(top_dir)
+    zip_stats = {}
+    for dir_path, file_size, mtime in catalog.files(top_dir, '.zip'):
+        if file_size > 600000000:
+            print('skipping: {} size: {} MB'.format(dir_path, file_size / 1000000.0))
+            continue
+        zip_stats[dir_path] = (file_size, drive_time(mtime))
+
+    uploads, google_file_ids = select_zip_uploads(top_dir, zip_stats, drive_index, local_hashes)
+    save_local_hashes(local_hash_json, local_hashes)
+
+    def _upload(upload_service, dir_path):
+        root, name = os.path.split(dir_path)
+        file_size, modified_time = zip_stats[dir_path]
+        if file_size > 100000000:
+            print('Loading large file {} size: {}'.format(dir_path, file_size / 1000000.0))
+        if dir_path in google_file_ids:
+            return update_drive_file(upload_service, google_file_ids[dir_path], dir_path, modified_time)
+        return create_drive_file(upload_service, folder_path_ids[root], name, dir_path, modified_time)
+
+    def _find_upload(upload_service, dir_path):
+        # An update is safe to send again, a create that failed late may already have made the file
+        if dir_path in google_file_ids:
+            return None
+        root, name = os.path.split(dir_path)
+        return find_file_id(upload_service, name, folder_path_ids[root])
+
     total_files = 0
-    for root, dirs, files in os.walk(top_dir, topdown=True):
-        for name in files:
-            if name.endswith('.zip'):
-                parent_id = folder_path_ids[root]
-                dir_path = os.path.join(root, name)
-                file_size = os.path.getsize(dir_path)
-                if file_size > 600000000:
-                    print('skipping: {} size: {} MB'.format(dir_path, file_size / 1000000.0))
-                    continue
-                elif file_size < 600000000 and file_size > 100000000:
-                    print('Loading large file {} size: {}'.format(dir_path, file_size / 1000000.0))
-
-                existing_file_id = get_file_id_name_and_directory(name, parent_id, service)
-                if existing_file_id:
-                    google_file_ids[dir_path] = existing_file_id
-                else:
-                    try:
-                        media_body = MediaFileUpload(dir_path,
-                                                     mimetype='application/zip',
-                                                     resumable=True)
-                        file_id = create_drive_file(service, parent_id, name, media_body)
-                        google_file_ids[dir_path] = file_id
-                    except:
-                        print('Failed: {}'.format(dir_path))
-                        continue
-
-                total_files += 1
-                if total_files % 10 == 0:
-                    print('Created file count: {}'.format(total_files))
+    client = MetadataClient(service, concurrency)
+    for dir_path, file_id, error in client.map(_upload, uploads, _find_upload):
+        if error is not None:
+            print('Failed: {} {}'.format(dir_path, error))
+            continue
+        root, name = os.path.split(dir_path)
+        file_size, modified_time = zip_stats[dir_path]
+        google_file_ids[dir_path] = file_id
+        cached = local_hashes.get(dir_path, {})
+        drive_index.add_file(file_id, name, folder_path_ids[root],
+                             size=file_size,
+                             md5_checksum=cached.get('md5'),
+                             modified_time=modified_time)
+
+        total_files += 1
+        if total_files % 10 == 0:
+            print('Uploaded file count: {}'.format(total_files))
 
     path_id_list = []
     for ftp_path in google_file_ids:
@@ -197,7 +220,8 @@ def load_all_zip_files(top_level_directory, folder_path_id_json, service, file_p
     with open(file_path_json, 'w') as file_ids:
         json.dump(path_id_list, file_ids)
     print('created file id json: {}'.format(file_path_json))
-    print('Total files created: {}'.format(total_files))
+    print('Total files uploaded: {} unchanged: {}'.format(total_files, len(zip_stats) - len(uploads)))
+    drive_index.save(drive_index_json)
 
 
 def load_all_zip_files_test(service):
@@ -207,22 +231,22 @@ def load_all_zip_files_test(service):
     load_all_zip_files(top_level_directory, folder_path_id_json, service, file_path_id_json)
 
 
-def print_excluded_zip_files(top_level_directory, file_path_id_json):
+def print_excluded_zip_files(top_level_directory, file_path_id_json, catalog=None):
     file_path_ids = load_path_ids(file_path_id_json)
+    catalog = catalog or open_catalog(top_level_directory)
     print(len(file_path_ids))
-    for root, dirs, files in os.walk(top_level_directory, topdown=True):
-        for name in files:
-            if name.endswith('.zip'):
-                dir_path = os.path.join(root, name)
-                if dir_path not in file_path_ids:
-                    print()
-                    print(name)
-                    print(dir_path)
+    for dir_path, file_size, mtime in catalog.files(top_level_directory, '.zip'):
+        if dir_path not in file_path_ids:
+            print()
+            print(os.path.basename(dir_path))
+            print(dir_path)
 
 
-def create_zip_downloadlink_csv(file_path_id_json, output_directory):
+def create_zip_downloadlink_csv(file_path_id_json, output_directory, catalog=None):
     link_csv = os.path.join(output_directory, 'ftp_file_downloadlinks_{}.csv'.format(unique_run_num))
     file_path_ids = load_path_ids(file_path_id_json)
+    if catalog is None and len(file_path_ids):
+        catalog = open_catalog(os.path.dirname(os.path.commonprefix(file_path_ids.keys())))
     links_created = 0
     with open(link_csv, 'wb') as downloadlinks:
         out_csv = csv.writer(downloadlinks)
@@ -232,7 +256,7 @@ def create_zip_downloadlink_csv(file_path_id_json, output_directory):
             ftp_path = path
             drive_id = file_path_ids[path]
             download_link = 'https://drive.google.com/uc?export=download&id={}'.format(drive_id)
-            file_size = os.path.getsize(path) / 1000000.0
+            file_size = catalog.get_size(path) / 1000000.0
             out_csv.writerow((file_name, ftp_path, drive_id, download_link, file_size))
             links_created += 1
     print('links created: {}'.format(links_created))
@@ -242,8 +266,7 @@ def create_zip_downloadlink_csv(file_path_id_json, output_directory):
 if __name__ == '__main__':
     # get auth
     # credentials = get_credentials()
-    # http = credentials.authorize(httplib2.Http())
-    # service = discovery.build('drive', 'v3', http=http)
+    # service = build_service(credentials, pool_size=CONCURRENCY)
 
     # root_drive_folder = '0ByStJjVZ7c7mT3lsOXVGVnJvd1E'
     # top_level_directory = r'/Volumes/ftp/UtahSGID_Vector'
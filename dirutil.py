@@ -1,42 +1,57 @@
-import os
 import hashlib
+from multiprocessing import Pool
+from ftp_catalog import open_catalog
 
+HASH_CHUNK_SIZE = 1024 * 1024
 
-def get_directory_count(top_dir):
+
+def get_directory_count(top_dir, catalog=None):
     # top_dir = r'/Volumes/ftp/UtahSGID_Vector'
+    catalog = catalog or open_catalog(top_dir)
     dircount = 0
-    for root, dirs, files in os.walk(top_dir, topdown=True):
-        for name in dirs:
-            dir_path = os.path.join(root, name)
-            print dir_path
-            dircount += 1
+    for dir_path in catalog.directories(top_dir):
+        print dir_path
+        dircount += 1
     print dircount
 
 
-def get_file_count(top_dir, ext, size_limit=None):
+def get_file_count(top_dir, ext, size_limit=None, catalog=None):
+    catalog = catalog or open_catalog(top_dir)
     file_count = 0
-    for root, dirs, files in os.walk(top_dir, topdown=True):
-        for name in files:
-            dir_path = os.path.join(root, name)
-            if name.endswith(ext):
-                if size_limit:
-                    if os.path.getsize(dir_path) <= size_limit:
-                        file_count += 1
-                else:
-                    file_count += 1
+    for dir_path, file_size, mtime in catalog.files(top_dir, ext):
+        if size_limit:
+            if file_size <= size_limit:
+                file_count += 1
+        else:
+            file_count += 1
 
     print 'count: {}, type: {}, size <= {}'.format(file_count, ext, size_limit)
 
 
-def hash_files(file_list):
-    hex_digest = []
-    for f in file_list:
-            file_path = f
-            local_file_hash = hashlib.md5(open(file_path, 'rb').read()).hexdigest()
-            hex_digest.append(local_file_hash)
+def md5_file(file_path, chunk_size=HASH_CHUNK_SIZE):
+    hasher = hashlib.md5()
+    with open(file_path, 'rb') as hash_file:
+        for chunk in iter(lambda: hash_file.read(chunk_size), b''):
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+def hash_files(file_list, processes=None):
+    """Returns {file path: md5 hex digest}.
+
+    Files are read in HASH_CHUNK_SIZE chunks so memory stays bounded and
+    are spread across a process pool so large zips hash in parallel."""
+    if not file_list:
+        return {}
+    pool = Pool(processes)
+    try:
+        hex_digests = pool.map(md5_file, file_list, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
 
-    for h in hex_digest:
-        print h
+    return dict(zip(file_list, hex_digests))
 
 
 if __name__ == '__main__':
@@ -45,4 +60,5 @@ if __name__ == '__main__':
 
     files = [r'/Volumes/C/GisWork/drive_sgid/test_outputs/Trails_gdb.zip',
              r'./test/Trails_gdb.zip']
-    hash_files(files)
+    for file_path, hex_digest in hash_files(files).iteritems():
+        print hex_digest, file_path
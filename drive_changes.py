@@ -0,0 +1,136 @@
+from __future__ import print_function
+import os
+import json
+
+MIRROR_JSON = './data/remote_mirror.json'
+FILE_FIELDS = 'id, name, parents, trashed, size, md5Checksum, modifiedTime'
+CHANGE_FIELDS = 'nextPageToken, newStartPageToken, changes(fileId, removed, file({}))'.format(FILE_FIELDS)
+BATCH_SIZE = 100
+
+
+def get_start_page_token(service):
+    return service.changes().getStartPageToken().execute()['startPageToken']
+
+
+def list_changes(service, page_token):
+    """All changes since page_token. Returns (changes, next start page token)."""
+    changes = []
+    while True:
+        response = service.changes().list(pageToken=page_token,
+                                          pageSize=1000,
+                                          spaces='drive',
+                                          fields=CHANGE_FIELDS).execute()
+        changes.extend(response.get('changes', []))
+        if 'newStartPageToken' in response:
+            return changes, response['newStartPageToken']
+        page_token = response['nextPageToken']
+
+
+class RemoteMirror(object):
+    """Local copy of drive metadata for a set of tracked file ids.
+
+    refresh pages changes().list from the saved start page token, so a run
+    costs one small delta call instead of one files().get per file.
+    Files that were deleted or never existed are kept as None.
+    """
+
+    def __init__(self, files=None, page_token=None):
+        self.files = files or {}
+        self.page_token = page_token
+
+    def track(self, service, file_ids):
+        """Fetch metadata once for ids the mirror has not seen."""
+        if not self.page_token:
+            self.page_token = get_start_page_token(service)
+        new_ids = [file_id for file_id in file_ids if file_id and file_id not in self.files]
+
+        def _callback(request_id, response, exception):
+            if exception is None:
+                self.files[request_id] = response
+            elif getattr(exception, 'resp', None) is not None and exception.resp.status == 404:
+                self.files[request_id] = None
+
+        for start in range(0, len(new_ids), BATCH_SIZE):
+            batch = service.new_batch_http_request()
+            for file_id in new_ids[start:start + BATCH_SIZE]:
+                batch.add(service.files().get(fileId=file_id, fields=FILE_FIELDS),
+                          callback=_callback,
+                          request_id=file_id)
+            batch.execute()
+
+        return self
+
+    def refresh(self, service):
+        if not self.page_token:
+            self.page_token = get_start_page_token(service)
+            return self
+        changes, self.page_token = list_changes(service, self.page_token)
+        updated = 0
+        for change in changes:
+            if change['fileId'] not in self.files:
+                continue
+            self.files[change['fileId']] = None if change.get('removed') else change.get('file')
+            updated += 1
+        print('Remote changes: {} tracked files updated: {}'.format(len(changes), updated))
+
+        return self
+
+    def record_upload(self, file_id, size=None, md5_checksum=None):
+        """Note the result of our own upload so the next check needs no call."""
+        drive_file = self.files.get(file_id) or {'id': file_id, 'trashed': False}
+        # The new modifiedTime arrives with the next refresh
+        drive_file.pop('modifiedTime', None)
+        if size is not None:
+            drive_file['size'] = str(size)
+        if md5_checksum:
+            drive_file['md5Checksum'] = md5_checksum
+        self.files[file_id] = drive_file
+
+    def get(self, file_id):
+        return self.files.get(file_id)
+
+    def exists(self, file_id):
+        drive_file = self.files.get(file_id)
+        return drive_file is not None and not drive_file.get('trashed', False)
+
+    def is_trashed(self, file_id):
+        drive_file = self.files.get(file_id)
+        return drive_file is not None and drive_file.get('trashed', False)
+
+    def size(self, file_id):
+        drive_file = self.files.get(file_id)
+        if drive_file and 'size' in drive_file:
+            return int(drive_file['size'])
+        return None
+
+    def md5(self, file_id):
+        drive_file = self.files.get(file_id)
+        if drive_file:
+            return drive_file.get('md5Checksum')
+        return None
+
+    def sizes(self):
+        """{file id: bytes} for every tracked file that exists."""
+        return dict((file_id, int(drive_file['size'])) for file_id, drive_file in self.files.iteritems()
+                    if drive_file and not drive_file.get('trashed', False) and 'size' in drive_file)
+
+    def save(self, mirror_json=MIRROR_JSON):
+        with open(mirror_json, 'w') as mirror_file:
+            json.dump({'pageToken': self.page_token, 'files': self.files}, mirror_file)
+
+    @classmethod
+    def load(cls, mirror_json=MIRROR_JSON):
+        with open(mirror_json, 'r') as mirror_file:
+            saved = json.load(mirror_file)
+
+        return cls(saved['files'], saved['pageToken'])
+
+
+def open_remote_mirror(service, file_ids, mirror_json=MIRROR_JSON):
+    """Load the saved mirror, apply remote changes and track file_ids."""
+    if os.path.exists(mirror_json):
+        mirror = RemoteMirror.load(mirror_json).refresh(service)
+    else:
+        mirror = RemoteMirror()
+
+    return mirror.track(service, file_ids)
@@ -0,0 +1,163 @@
+from __future__ import print_function
+import os
+import json
+
+from drive_changes import get_start_page_token, list_changes
+
+INDEX_FIELDS = 'id,name,mimeType,parents,size,md5Checksum,modifiedTime'
+PAGE_SIZE = 1000
+#: folders whose children are listed by one query
+PARENTS_PER_QUERY = 50
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+
+class DriveTreeIndex(object):
+    """In memory index of every Drive file under a root folder.
+
+    The tree is listed a level at a time, asking for the children of many
+    folders per query in 1000 item pages, and paths are resolved locally by
+    following parent ids up to the root. Later runs apply the drive changes
+    feed from the saved start page token. The feed covers the whole account,
+    so changed files outside the root are kept by id but get no path.
+    """
+
+    def __init__(self, root_id, files=None, page_token=None):
+        self.root_id = root_id
+        self.files = files or {}
+        self.page_token = page_token
+        self._paths = None
+
+    def build(self, service):
+        self.files = {}
+        self.page_token = get_start_page_token(service)
+        folder_ids = [self.root_id]
+        while folder_ids:
+            child_folder_ids = []
+            for start in range(0, len(folder_ids), PARENTS_PER_QUERY):
+                for drive_file in self._list_children(service, folder_ids[start:start + PARENTS_PER_QUERY]):
+                    self.files[drive_file['id']] = drive_file
+                    if drive_file.get('mimeType') == FOLDER_MIME_TYPE:
+                        child_folder_ids.append(drive_file['id'])
+            folder_ids = child_folder_ids
+        self._paths = None
+        print('Indexed {} drive files'.format(len(self.files)))
+
+        return self
+
+    def _list_children(self, service, parent_ids):
+        parents = ' or '.join("'{}' in parents".format(parent_id) for parent_id in parent_ids)
+        page_token = None
+        while True:
+            response = service.files().list(q='({}) and trashed=false'.format(parents),
+                                            spaces='drive',
+                                            pageSize=PAGE_SIZE,
+                                            pageToken=page_token,
+                                            fields='nextPageToken, files({})'.format(INDEX_FIELDS)).execute()
+            for drive_file in response.get('files', []):
+                yield drive_file
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+
+    def refresh(self, service):
+        """Apply every change since the last build or refresh."""
+        if not self.page_token:
+            return self.build(service)
+        changes, self.page_token = list_changes(service, self.page_token)
+        for change in changes:
+            drive_file = change.get('file')
+            if change.get('removed') or not drive_file or drive_file.pop('trashed', False):
+                self.files.pop(change['fileId'], None)
+            else:
+                self.files[change['fileId']] = drive_file
+        self._paths = None
+        print('Refreshed {} drive files'.format(len(changes)))
+
+        return self
+
+    def add_file(self, file_id, name, parent_id, size=None, md5_checksum=None, modified_time=None):
+        """Record a file created during this run without another list call."""
+        drive_file = {'id': file_id, 'name': name, 'parents': [parent_id]}
+        if size is not None:
+            drive_file['size'] = str(size)
+        if md5_checksum:
+            drive_file['md5Checksum'] = md5_checksum
+        if modified_time:
+            drive_file['modifiedTime'] = modified_time
+        self.files[file_id] = drive_file
+        if self._paths is not None:
+            parent_path = self._path_of(parent_id, {self.root_id: ''})
+            if parent_path is not None:
+                self._paths[_join(parent_path, name)] = drive_file
+
+    @property
+    def paths(self):
+        """Path relative to the root, joined with '/', to drive file dict."""
+        if self._paths is None:
+            resolved = {self.root_id: ''}
+            self._paths = {}
+            for file_id, drive_file in self.files.iteritems():
+                path = self._path_of(file_id, resolved)
+                if path:
+                    self._paths[path] = drive_file
+
+        return self._paths
+
+    def _path_of(self, file_id, resolved):
+        chain = []
+        current = file_id
+        while current not in resolved:
+            drive_file = self.files.get(current)
+            if not drive_file or not drive_file.get('parents'):
+                for chained_id in chain:
+                    resolved[chained_id] = None
+                return None
+            chain.append(current)
+            current = drive_file['parents'][0]
+        path = resolved[current]
+        for chained_id in reversed(chain):
+            if path is not None:
+                path = _join(path, self.files[chained_id]['name'])
+            resolved[chained_id] = path
+
+        return path
+
+    def get_path(self, relative_path):
+        return self.paths.get(relative_path.replace(os.sep, '/'))
+
+    def get_id(self, relative_path):
+        drive_file = self.get_path(relative_path)
+        if drive_file:
+            return drive_file['id']
+        return None
+
+    def save(self, index_json):
+        with open(index_json, 'w') as index_file:
+            json.dump({'rootId': self.root_id,
+                       'pageToken': self.page_token,
+                       'files': self.files.values()}, index_file)
+        print('saved drive index: {}'.format(index_json))
+
+    @classmethod
+    def load(cls, index_json):
+        with open(index_json, 'r') as index_file:
+            saved = json.load(index_file)
+        files = dict((drive_file['id'], drive_file) for drive_file in saved['files'])
+
+        return cls(saved['rootId'], files, saved.get('pageToken'))
+
+
+def _join(parent_path, name):
+    if parent_path:
+        return parent_path + '/' + name
+    return name
+
+
+def load_drive_index(root_id, index_json, service):
+    """Load the saved index and refresh it, or build a new one for root_id."""
+    if os.path.exists(index_json):
+        index = DriveTreeIndex.load(index_json)
+        if index.root_id == root_id:
+            return index.refresh(service)
+
+    return DriveTreeIndex(root_id).build(service)
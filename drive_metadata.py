@@ -0,0 +1,246 @@
+from __future__ import print_function
+import os
+import random
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from apiclient import errors
+
+CONCURRENCY = 8
+#: drive allows 1000 requests per 100 seconds per user by default
+QUOTA_PER_SECOND = 10.0
+QUOTA_BURST = 20
+BATCH_SIZE = 50
+MAX_RETRIES = 5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+
+class TokenBucket(object):
+    """Blocks callers so requests stay within a per second quota."""
+
+    def __init__(self, rate=QUOTA_PER_SECOND, burst=QUOTA_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.time()
+        self._lock = threading.Lock()
+
+    def take(self, count=1):
+        count = min(count, self.burst)
+        while True:
+            with self._lock:
+                now = time.time()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= count:
+                    self.tokens -= count
+                    return
+                wait = (count - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_retryable(error):
+    if not isinstance(error, errors.HttpError):
+        return False
+    if error.resp.status in RETRY_STATUSES:
+        return True
+
+    return error.resp.status == 403 and any(reason in str(error.content) for reason in RATE_LIMIT_REASONS)
+
+
+def find_file_id(service, name, parent_id, mime_type=None):
+    """Id of the untrashed file called name in parent_id, None if there is none."""
+    query = "name='{}' and '{}' in parents and trashed=false".format(
+        name.replace('\\', '\\\\').replace("'", "\\'"), parent_id)
+    if mime_type:
+        query += " and mimeType='{}'".format(mime_type)
+    response = service.files().list(q=query, fields='files(id)').execute()
+    files = response.get('files', [])
+
+    return files[0]['id'] if files else None
+
+
+def _backoff(attempt):
+    time.sleep(min(2 ** attempt + random.random(), 64))
+
+
+class MetadataClient(object):
+    """Runs many small drive calls concurrently within the user quota.
+
+    Requests are grouped into drive batch requests and the batches are sent
+    from a pool of concurrency threads. Every call in a batch takes a quota
+    token. Calls that fail with a rate limit or server error are retried
+    with exponential backoff. The service should be built on a pooled
+    transport so threads do not share one connection.
+    """
+
+    def __init__(self, service, concurrency=CONCURRENCY, quota=None, batch_size=BATCH_SIZE):
+        self.service = service
+        self.concurrency = concurrency
+        self.quota = quota or TokenBucket()
+        self.batch_size = batch_size
+
+    def _execute_batch(self, requests):
+        results = {}
+        failures = {}
+
+        def _callback(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+            else:
+                failures[request_id] = exception
+
+        self.quota.take(len(requests))
+        batch = self.service.new_batch_http_request()
+        for key, request in requests:
+            batch.add(request, callback=_callback, request_id=key)
+        try:
+            batch.execute()
+        except errors.HttpError, error:
+            if not is_retryable(error):
+                raise
+            failures = dict((key, error) for key, request in requests)
+
+        return results, failures
+
+    def _find_existing(self, pending, find_existing, errors_by_key):
+        """Split pending into calls to send again and ones find_existing shows already took effect."""
+        retry = {}
+        found = {}
+        for key, request in sorted(pending.items()):
+            self.quota.take()
+            try:
+                existing = find_existing(key)
+            except Exception, error:
+                #: without knowing if the call took effect it is not safe to send again
+                errors_by_key[key] = error
+                continue
+            if existing is None:
+                retry[key] = request
+            else:
+                found[key] = existing
+
+        return retry, found
+
+    def execute(self, requests, find_existing=None):
+        """Run {key: HttpRequest} and return ({key: response}, {key: error}).
+
+        A call that failed may still have taken effect, so a call that is
+        not safe to repeat, such as a create, needs find_existing. It is
+        called with the key before each retry and returns the response the
+        call would have given when it did take effect, or None to send it
+        again.
+        """
+        pending = dict(requests)
+        results = {}
+        errors_by_key = {}
+        pool = ThreadPool(self.concurrency)
+        try:
+            for attempt in range(MAX_RETRIES + 1):
+                if not pending:
+                    break
+                if attempt:
+                    _backoff(attempt)
+                    if find_existing:
+                        pending, found = self._find_existing(pending, find_existing, errors_by_key)
+                        results.update(found)
+                        for key in found:
+                            errors_by_key.pop(key, None)
+                        if not pending:
+                            break
+                items = sorted(pending.items())
+                batches = [items[start:start + self.batch_size] for start in range(0, len(items), self.batch_size)]
+                retry = {}
+                for batch_results, batch_failures in pool.imap_unordered(self._execute_batch, batches):
+                    results.update(batch_results)
+                    for key, error in batch_failures.iteritems():
+                        if is_retryable(error):
+                            retry[key] = pending[key]
+                        errors_by_key[key] = error
+                for key in results:
+                    errors_by_key.pop(key, None)
+                pending = retry
+        finally:
+            pool.close()
+            pool.join()
+
+        return results, errors_by_key
+
+    def map(self, function, items, find_existing=None):
+        """Call function(service, item) for every item concurrently.
+
+        Yields (item, result, error) as calls finish. For work that can not
+        go in a batch request, such as uploads. As with execute, a function
+        that is not safe to repeat needs find_existing(service, item), which
+        returns the result of an earlier call that took effect, or None to
+        call function again.
+        """
+        def _call(item):
+            for attempt in range(MAX_RETRIES + 1):
+                if attempt and find_existing:
+                    self.quota.take()
+                    try:
+                        existing = find_existing(self.service, item)
+                    except Exception, error:
+                        return item, None, error
+                    if existing is not None:
+                        return item, existing, None
+                self.quota.take()
+                try:
+                    return item, function(self.service, item), None
+                except Exception, error:
+                    if attempt == MAX_RETRIES or not is_retryable(error):
+                        return item, None, error
+                    _backoff(attempt)
+
+        pool = ThreadPool(self.concurrency)
+        try:
+            for result in pool.imap_unordered(_call, items):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+
+    def create_folder_tree(self, root_path, root_id, dir_paths):
+        """Create a drive folder for every path in dir_paths below root_path.
+
+        Paths are created a depth at a time so each parent exists before its
+        children. Returns {path: folder id} including root_path.
+        """
+        folder_ids = {root_path: root_id}
+
+        def find_existing(dir_path):
+            return self.find_folder(os.path.basename(dir_path), folder_ids[os.path.dirname(dir_path)])
+
+        levels = {}
+        for dir_path in dir_paths:
+            if dir_path != root_path:
+                levels.setdefault(os.path.relpath(dir_path, root_path).count(os.sep), []).append(dir_path)
+        for depth in sorted(levels):
+            requests = {}
+            for dir_path in levels[depth]:
+                parent_id = folder_ids.get(os.path.dirname(dir_path))
+                if parent_id is None:
+                    print('Parent folder missing for: {}'.format(dir_path))
+                    continue
+                requests[dir_path] = self.service.files().create(body={'name': os.path.basename(dir_path),
+                                                                       'mimeType': FOLDER_MIME_TYPE,
+                                                                       'parents': [parent_id]},
+                                                                 fields='id')
+            created, failed = self.execute(requests, find_existing)
+            for dir_path, folder in created.iteritems():
+                folder_ids[dir_path] = folder['id']
+            for dir_path, error in failed.iteritems():
+                print('Failed folder: {} {}'.format(dir_path, error))
+            print('Created folders at depth {}: {}'.format(depth + 1, len(created)))
+
+        return folder_ids
+
+    def find_folder(self, name, parent_id):
+        """{'id': folder id} of the folder called name in parent_id, None if there is none."""
+        folder_id = find_file_id(self.service, name, parent_id, FOLDER_MIME_TYPE)
+
+        return {'id': folder_id} if folder_id else None
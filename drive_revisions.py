@@ -0,0 +1,119 @@
+from __future__ import print_function
+import time
+from datetime import datetime, timedelta
+
+from apiclient import errors
+
+from spec_store import open_spec_store, ALL_ID_KEYS
+from drive_changes import open_remote_mirror, MIRROR_JSON
+
+KEEP_REVISIONS = 5
+DELETE_BATCH_SIZE = 50
+DELETE_BATCH_PAUSE = 1.0
+#: package manifests are tracked files too and grow a revision every run
+SPEC_ID_KEYS = ALL_ID_KEYS
+
+
+def list_all_revisions(service, file_id):
+    """Page through every revision of a file, oldest first."""
+    revisions = []
+    page_token = None
+    while True:
+        response = service.revisions().list(fileId=file_id,
+                                            pageSize=1000,
+                                            pageToken=page_token,
+                                            fields='nextPageToken, revisions(id, modifiedTime, keepForever, size)').execute()
+        revisions.extend(response.get('revisions', []))
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            break
+
+    return revisions
+
+
+def select_expired_revisions(revisions, keep_revisions=KEEP_REVISIONS, keep_days=None, now=None):
+    """Revisions outside the retention policy.
+
+    The newest keep_revisions, pinned (keepForever) revisions and, when
+    keep_days is set, revisions newer than keep_days are kept. The head
+    revision is always kept.
+    """
+    keep_revisions = max(keep_revisions, 1)
+    cutoff = None
+    if keep_days is not None:
+        now = now or datetime.utcnow()
+        cutoff = (now - timedelta(days=keep_days)).strftime('%Y-%m-%dT%H:%M:%S')
+    ordered = sorted(revisions, key=lambda revision: revision['modifiedTime'])
+    expired = []
+    for revision in ordered[:-keep_revisions]:
+        if revision.get('keepForever'):
+            continue
+        if cutoff and revision['modifiedTime'] >= cutoff:
+            continue
+        expired.append(revision)
+
+    return expired
+
+
+def delete_revisions(service, file_revisions, batch_size=DELETE_BATCH_SIZE, pause=DELETE_BATCH_PAUSE):
+    """Delete (file_id, revision) pairs in batched requests.
+
+    Returns (deleted count, bytes reclaimed)."""
+    results = {'deleted': 0, 'bytes': 0}
+
+    def _make_callback(file_id, revision):
+        def _callback(request_id, response, exception):
+            if exception is not None:
+                print('Failed to delete revision {} of {}: {}'.format(revision['id'], file_id, exception))
+            else:
+                results['deleted'] += 1
+                results['bytes'] += int(revision.get('size', 0))
+        return _callback
+
+    for start in range(0, len(file_revisions), batch_size):
+        batch = service.new_batch_http_request()
+        for file_id, revision in file_revisions[start:start + batch_size]:
+            batch.add(service.revisions().delete(fileId=file_id, revisionId=revision['id']),
+                      callback=_make_callback(file_id, revision))
+        batch.execute()
+        if start + batch_size < len(file_revisions):
+            time.sleep(pause)
+
+    return results['deleted'], results['bytes']
+
+
+def load_spec_file_ids(spec_store=None):
+    spec_store = spec_store or open_spec_store()
+
+    return spec_store.drive_file_ids(SPEC_ID_KEYS)
+
+
+def prune_spec_revisions(service, keep_revisions=KEEP_REVISIONS, keep_days=None, dry_run=False, spec_store=None,
+                         mirror_json=MIRROR_JSON):
+    """Apply the retention policy to every drive file referenced by a spec."""
+    expired = []
+    expired_bytes = 0
+    file_ids = load_spec_file_ids(spec_store)
+    remote_mirror = open_remote_mirror(service, file_ids, mirror_json)
+    remote_mirror.save(mirror_json)
+    for file_id in file_ids:
+        if not remote_mirror.exists(file_id):
+            print('{}: missing or trashed, skipped'.format(file_id))
+            continue
+        try:
+            revisions = list_all_revisions(service, file_id)
+        except errors.HttpError, error:
+            print('An error occurred: {}'.format(error))
+            continue
+        for revision in select_expired_revisions(revisions, keep_revisions, keep_days):
+            expired.append((file_id, revision))
+            expired_bytes += int(revision.get('size', 0))
+        print('{}: {} revisions'.format(file_id, len(revisions)))
+
+    print('Expired revisions: {} size: {} MB'.format(len(expired), expired_bytes / 1000000.0))
+    if dry_run:
+        return 0, 0
+    deleted, reclaimed = delete_revisions(service, expired)
+    print('Deleted revisions: {} reclaimed: {} MB'.format(deleted, reclaimed / 1000000.0))
+
+    return deleted, reclaimed
@@ -0,0 +1,160 @@
+from __future__ import print_function
+import os
+import threading
+import time
+from Queue import Queue, Empty
+
+import httplib2
+from apiclient import discovery
+from apiclient.http import MediaFileUpload
+
+POOL_SIZE = 4
+#: resumable chunks must be a multiple of 256 KB
+CHUNK_UNIT = 256 * 1024
+MIN_CHUNK_SIZE = CHUNK_UNIT
+MAX_CHUNK_SIZE = 128 * 1024 * 1024
+INITIAL_CHUNK_SIZE = 8 * 1024 * 1024
+#: files up to this size go in one multipart request
+MULTIPART_LIMIT = 5 * 1024 * 1024
+#: a chunk should take at least this long to send
+TARGET_CHUNK_SECONDS = 5.0
+#: and at least this many round trips worth of time
+RTT_MULTIPLE = 20
+#: only requests and responses up to this size are timed as round trips
+RTT_BODY_LIMIT = 8 * 1024
+SMOOTHING = 0.5
+
+
+class ChunkSizer(object):
+    """Picks resumable chunk sizes from measured throughput and round trip time.
+
+    A chunk is sized to keep the connection busy for TARGET_CHUNK_SECONDS or
+    RTT_MULTIPLE round trips, whichever is longer, within the given bounds.
+    """
+
+    def __init__(self, min_chunk_size=MIN_CHUNK_SIZE, max_chunk_size=MAX_CHUNK_SIZE,
+                 initial_chunk_size=INITIAL_CHUNK_SIZE):
+        self.min_chunk_size = _round_chunk(min_chunk_size)
+        self.max_chunk_size = max(_round_chunk(max_chunk_size), self.min_chunk_size)
+        self.chunk_size = self._bound(initial_chunk_size)
+        self.rate = None
+        self.rtt = None
+        self._lock = threading.Lock()
+
+    def _bound(self, chunk_size):
+        return min(max(_round_chunk(chunk_size), self.min_chunk_size), self.max_chunk_size)
+
+    def observe_rtt(self, seconds):
+        with self._lock:
+            self.rtt = _smooth(self.rtt, seconds)
+
+    def observe_chunk(self, sent_bytes, seconds):
+        if not sent_bytes or seconds <= 0:
+            return
+        with self._lock:
+            self.rate = _smooth(self.rate, sent_bytes / seconds)
+            chunk_seconds = max(TARGET_CHUNK_SECONDS, (self.rtt or 0) * RTT_MULTIPLE)
+            self.chunk_size = self._bound(self.rate * chunk_seconds)
+
+
+def _round_chunk(chunk_size):
+    return max(int(chunk_size) // CHUNK_UNIT, 1) * CHUNK_UNIT
+
+
+def _smooth(average, sample):
+    if average is None:
+        return sample
+    return SMOOTHING * sample + (1 - SMOOTHING) * average
+
+
+class HttpPool(object):
+    """Authorized keep-alive connections shared by every request of a run.
+
+    Stands in for the httplib2.Http handed to discovery.build. Each request
+    borrows an idle connection, so metadata calls and uploads on different
+    threads reuse open sockets instead of reconnecting. Small requests are
+    timed to estimate the round trip time for the chunk sizer.
+    """
+
+    def __init__(self, credentials, size=POOL_SIZE, sizer=None, timeout=None):
+        self.credentials = credentials
+        self.size = size
+        self.sizer = sizer or ChunkSizer()
+        self.timeout = timeout
+        self._idle = Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return self.credentials.authorize(httplib2.Http(timeout=self.timeout))
+
+        return self._idle.get()
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        http = self._acquire()
+        start = time.time()
+        try:
+            response, content = http.request(uri, method, body, headers, *args, **kwargs)
+        finally:
+            self._idle.put(http)
+        #: media downloads and large listings measure bandwidth, not latency
+        if _is_small(body) and _is_small(content):
+            self.sizer.observe_rtt(time.time() - start)
+
+        return response, content
+
+
+def _is_small(data):
+    #: resumable chunks are sent as stream slices with no length
+    return data is None or (isinstance(data, basestring) and len(data) <= RTT_BODY_LIMIT)
+
+
+def build_service(credentials, pool_size=POOL_SIZE, min_chunk_size=MIN_CHUNK_SIZE, max_chunk_size=MAX_CHUNK_SIZE):
+    pool = HttpPool(credentials, pool_size, ChunkSizer(min_chunk_size, max_chunk_size))
+
+    return discovery.build('drive', 'v3', http=pool)
+
+
+def _sizer_for(service):
+    return getattr(getattr(service, '_http', None), 'sizer', None) or ChunkSizer()
+
+
+def upload_file(service, local_file, body=None, file_id=None, fields='id', mimetype='application/zip'):
+    """Create, or update when file_id is given, a drive file from local_file.
+
+    Files up to MULTIPART_LIMIT go in a single multipart request. Larger
+    files use a resumable session with the chunk size the service's chunk
+    sizer picked when the upload started; the chunk timings feed the sizer
+    for later uploads. Returns the response metadata.
+    """
+    file_size = os.path.getsize(local_file)
+    resumable = file_size > MULTIPART_LIMIT
+    sizer = _sizer_for(service)
+    if resumable:
+        media_body = MediaFileUpload(local_file, mimetype=mimetype, chunksize=sizer.chunk_size, resumable=True)
+    else:
+        media_body = MediaFileUpload(local_file, mimetype=mimetype, resumable=False)
+    if file_id:
+        request = service.files().update(fileId=file_id, body=body or {}, media_body=media_body, fields=fields)
+    else:
+        request = service.files().create(body=body or {}, media_body=media_body, fields=fields)
+    if not resumable:
+        return request.execute()
+
+    response = None
+    progress = 0
+    while response is None:
+        start = time.time()
+        status, response = request.next_chunk()
+        sent = (status.resumable_progress if status else file_size) - progress
+        progress += sent
+        sizer.observe_chunk(sent, time.time() - start)
+
+    return response
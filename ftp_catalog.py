@@ -0,0 +1,200 @@
+from __future__ import print_function
+import os
+import sqlite3
+import sys
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir
+
+CATALOG_DB = './data/ftp_catalog.sqlite'
+FS_ENCODING = sys.getfilesystemencoding() or 'utf-8'
+#: {(db path, top dir): catalog} refreshed by open_catalog in this run
+_refreshed = {}
+
+
+class FtpCatalog(object):
+    """Snapshot of path, size, mtime and type for every entry of a directory tree.
+
+    refresh only lists directories whose mtime changed since the last scan.
+    A file rewritten in place does not touch its directory mtime. Refresh
+    with check_files to stat the files of unchanged directories too, or
+    with full to list every directory again.
+
+    Paths are stored and returned as unicode, byte string paths are decoded
+    with the filesystem encoding.
+    """
+
+    def __init__(self, db_path=CATALOG_DB):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS entries (
+                                   path TEXT PRIMARY KEY,
+                                   parent TEXT,
+                                   name TEXT,
+                                   is_dir INTEGER,
+                                   size INTEGER,
+                                   mtime REAL)''')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent)')
+        self.connection.commit()
+
+    def refresh(self, top_dir, full=False, check_files=False):
+        top_dir = _strip_sep(_fs_path(top_dir))
+        scanned_dirs = 0
+        changed_files = 0
+        with self.connection:
+            if full:
+                self._delete_tree(top_dir)
+            self.connection.execute('INSERT OR IGNORE INTO entries VALUES (?, ?, ?, 1, 0, NULL)',
+                                    (top_dir, os.path.dirname(top_dir), os.path.basename(top_dir)))
+            stack = [(top_dir, os.stat(top_dir).st_mtime)]
+            while stack:
+                dir_path, dir_mtime = stack.pop()
+                if self._stored_mtime(dir_path) == dir_mtime:
+                    if check_files:
+                        changed_files += self._stat_files(dir_path)
+                    for child_path, in self.connection.execute('SELECT path FROM entries WHERE parent = ? AND is_dir = 1',
+                                                               (dir_path,)).fetchall():
+                        try:
+                            stack.append((child_path, os.stat(child_path).st_mtime))
+                        except OSError:
+                            self._delete_tree(child_path)
+                    continue
+
+                stack.extend(self._scan_directory(dir_path))
+                self.connection.execute('UPDATE entries SET mtime = ? WHERE path = ?', (dir_mtime, dir_path))
+                scanned_dirs += 1
+        print('Catalog refreshed, directories scanned: {} files changed in place: {}'.format(scanned_dirs,
+                                                                                           changed_files))
+        _refreshed[(self.db_path, top_dir)] = self
+
+        return self
+
+    def _scan_directory(self, dir_path):
+        child_dirs = []
+        present = set()
+        for entry in scandir(dir_path):
+            entry_stat = entry.stat()
+            entry_path = _fs_path(entry.path)
+            entry_name = _fs_path(entry.name)
+            present.add(entry_path)
+            if entry.is_dir():
+                self.connection.execute('INSERT OR IGNORE INTO entries VALUES (?, ?, ?, 1, 0, NULL)',
+                                        (entry_path, dir_path, entry_name))
+                child_dirs.append((entry_path, entry_stat.st_mtime))
+            else:
+                self.connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, 0, ?, ?)',
+                                        (entry_path, dir_path, entry_name, entry_stat.st_size, entry_stat.st_mtime))
+        for child_path, is_dir in self.connection.execute('SELECT path, is_dir FROM entries WHERE parent = ?',
+                                                          (dir_path,)).fetchall():
+            if child_path not in present:
+                if is_dir:
+                    self._delete_tree(child_path)
+                else:
+                    self.connection.execute('DELETE FROM entries WHERE path = ?', (child_path,))
+
+        return child_dirs
+
+    def _stat_files(self, dir_path):
+        """Update cataloged files of an unchanged directory. Returns how many changed."""
+        changed = 0
+        for file_path, size, mtime in self.connection.execute('SELECT path, size, mtime FROM entries '
+                                                              'WHERE parent = ? AND is_dir = 0',
+                                                              (dir_path,)).fetchall():
+            try:
+                file_stat = os.stat(file_path)
+            except OSError:
+                self.connection.execute('DELETE FROM entries WHERE path = ?', (file_path,))
+                changed += 1
+                continue
+            if (file_stat.st_size, file_stat.st_mtime) != (size, mtime):
+                self.connection.execute('UPDATE entries SET size = ?, mtime = ? WHERE path = ?',
+                                        (file_stat.st_size, file_stat.st_mtime, file_path))
+                changed += 1
+
+        return changed
+
+    def _stored_mtime(self, path):
+        row = self.connection.execute('SELECT mtime FROM entries WHERE path = ?', (path,)).fetchone()
+        if row:
+            return row[0]
+        return None
+
+    def _delete_tree(self, dir_path):
+        lower, upper = _subtree_range(dir_path)
+        self.connection.execute('DELETE FROM entries WHERE path = ? OR (path >= ? AND path < ?)',
+                                (dir_path, lower, upper))
+
+    def walk(self, top_dir):
+        """Top down (root, dirs, files) tuples like os.walk, read from the snapshot."""
+        stack = [_strip_sep(_fs_path(top_dir))]
+        while stack:
+            root = stack.pop()
+            dirs = []
+            files = []
+            for name, is_dir in self.connection.execute('SELECT name, is_dir FROM entries WHERE parent = ? ORDER BY name',
+                                                        (root,)):
+                if is_dir:
+                    dirs.append(name)
+                else:
+                    files.append(name)
+            yield root, dirs, files
+            stack.extend(os.path.join(root, name) for name in reversed(dirs))
+
+    def files(self, top_dir, ext=''):
+        """(path, size, mtime) for every file under top_dir ending with ext."""
+        lower, upper = _subtree_range(_strip_sep(_fs_path(top_dir)))
+
+        return self.connection.execute('''SELECT path, size, mtime FROM entries
+                                          WHERE path >= ? AND path < ? AND is_dir = 0 AND name GLOB ?''',
+                                       (lower, upper, '*' + ext)).fetchall()
+
+    def directories(self, top_dir):
+        lower, upper = _subtree_range(_strip_sep(_fs_path(top_dir)))
+
+        return [row[0] for row in self.connection.execute('''SELECT path FROM entries
+                                                             WHERE path >= ? AND path < ? AND is_dir = 1''',
+                                                          (lower, upper))]
+
+    def stat(self, path):
+        """(size, mtime) of a cataloged file or None."""
+        return self.connection.execute('SELECT size, mtime FROM entries WHERE path = ? AND is_dir = 0',
+                                       (_fs_path(path),)).fetchone()
+
+    def get_size(self, path):
+        file_stat = self.stat(path)
+        if file_stat:
+            return file_stat[0]
+        return os.path.getsize(path)
+
+
+def _subtree_range(dir_path):
+    """Key range that holds every path below dir_path."""
+    return dir_path + os.sep, dir_path + chr(ord(os.sep) + 1)
+
+
+def _strip_sep(dir_path):
+    return dir_path.rstrip(os.sep) or dir_path
+
+
+def _fs_path(path):
+    """sqlite3 only binds ascii byte strings, so paths are kept as unicode."""
+    if isinstance(path, str):
+        return path.decode(FS_ENCODING)
+    return path
+
+
+def open_catalog(top_dir, db_path=CATALOG_DB):
+    """Catalog of top_dir, refreshed once per run.
+
+    A catalog already refreshed for top_dir or a directory above it is
+    returned as it is, so utilities that each open the catalog do not walk
+    the tree again.
+    """
+    top_dir = _strip_sep(_fs_path(top_dir))
+    for (refreshed_db, refreshed_top), catalog in _refreshed.items():
+        if refreshed_db == db_path and (top_dir == refreshed_top or top_dir.startswith(refreshed_top + os.sep)):
+            return catalog
+
+    return FtpCatalog(db_path).refresh(top_dir)
+
@@ -0,0 +1,106 @@
+from __future__ import print_function
+import os
+import re
+from multiprocessing.pool import ThreadPool
+
+from apiclient.http import MediaIoBaseDownload
+
+HASH_CACHE_DIRECTORY = './data/hash_cache'
+#: bytes held in memory per download
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+PREFETCH_WORKERS = 4
+
+
+def download_file(service, file_id, output, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Stream a drive file to output in ranged chunks.
+
+    The bytes go to a .part file that is renamed over output once complete,
+    so an interrupted download never leaves a truncated output behind.
+    """
+    part_path = output + '.part'
+    request = service.files().get_media(fileId=file_id)
+    with open(part_path, 'wb') as part_file:
+        downloader = MediaIoBaseDownload(part_file, request, chunksize=chunk_size)
+        done = False
+        while not done:
+            status, done = downloader.next_chunk()
+    if os.path.exists(output):
+        os.remove(output)
+    os.rename(part_path, output)
+
+    return output
+
+
+def _cache_key(file_id, modified_time):
+    return '{}_{}'.format(file_id, re.sub(r'[^0-9A-Za-z]', '', modified_time))
+
+
+class HashPrefetcher(object):
+    """Downloads past hash zips for a run in the background.
+
+    Zips are cached under file id and drive modifiedTime from the remote
+    mirror, so a hash zip that has not changed since the last run is not
+    downloaded again. The workers share the run's service, which has to be
+    built on a pooled transport so each download borrows its own
+    connection.
+    """
+
+    def __init__(self, service, remote_mirror, cache_directory=HASH_CACHE_DIRECTORY,
+                 workers=PREFETCH_WORKERS, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        self.service = service
+        self.remote_mirror = remote_mirror
+        self.cache_directory = cache_directory
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self._pool = None
+        self._pending = {}
+        if not os.path.exists(cache_directory):
+            os.makedirs(cache_directory)
+
+    def cache_path(self, file_id):
+        """Cached zip path for the current remote version, None when the version is unknown."""
+        drive_file = self.remote_mirror.get(file_id)
+        if not drive_file or not drive_file.get('modifiedTime'):
+            return None
+
+        return os.path.join(self.cache_directory, _cache_key(file_id, drive_file['modifiedTime']) + '.zip')
+
+    def _fetch(self, file_id):
+        cached = self.cache_path(file_id)
+        if cached and os.path.exists(cached):
+            return cached
+        output = cached or os.path.join(self.cache_directory, file_id + '_unversioned.zip')
+        download_file(self.service, file_id, output, self.chunk_size)
+        self._remove_stale(file_id, output)
+
+        return output
+
+    def _remove_stale(self, file_id, keep_path):
+        for cache_name in os.listdir(self.cache_directory):
+            cache_path = os.path.join(self.cache_directory, cache_name)
+            if cache_name.startswith(file_id + '_') and cache_path != keep_path and not cache_name.endswith('.part'):
+                os.remove(cache_path)
+
+    def start(self, file_ids):
+        """Begin downloading every file id that is not already cached."""
+        if self._pool is None:
+            self._pool = ThreadPool(self.workers)
+        for file_id in file_ids:
+            if file_id and file_id not in self._pending:
+                self._pending[file_id] = self._pool.apply_async(self._fetch, (file_id,))
+        print('Prefetching {} hash zips'.format(len(self._pending)))
+
+        return self
+
+    def get(self, file_id):
+        """Local path of the hash zip, waiting for it or downloading it now."""
+        if file_id not in self._pending:
+            return self._fetch(file_id)
+
+        return self._pending.pop(file_id).get()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
@@ -0,0 +1,285 @@
+import os
+import csv
+import zlib
+import struct
+import binascii
+from collections import namedtuple
+from hashlib import md5
+from itertools import islice
+from operator import itemgetter
+
+import numpy as np
+
+MAGIC = 'SGIDHASH'
+VERSION = 1
+BLOCK_ROWS = 65536
+#: digests do not compress, a higher level costs time for almost no gain
+COMPRESS_LEVEL = 1
+DIGEST_SIZE = 16
+HASH_STORE_NAME = '{}_hashes.bin'
+LEGACY_HASH_STORE_NAME = '{}_hashes.csv'
+#: cursor rows hashed together, and the shape text a block may hold
+HASH_BLOCK_ROWS = 10000
+HASH_BLOCK_BYTES = 32 * 1024 * 1024
+#: magic, version, compressed, row count, block count
+FILE_HEADER = struct.Struct('<8sHHQI')
+#: rows, payload bytes
+BLOCK_HEADER = struct.Struct('<IQ')
+
+HashStore = namedtuple('HashStore', ['src_id', 'digest', 'x', 'y'])
+
+
+def _to_bytes(array):
+    return getattr(array, 'tobytes', array.tostring)()
+
+
+class HashStoreWriter(object):
+    """Writes src_id, md5 digest and centroid x/y columns in blocks.
+
+    Each block holds an int64 src_id array, the raw 16 byte digests and two
+    float64 centroid arrays, optionally zlib compressed. Missing centroids
+    are stored as NaN.
+    """
+
+    def __init__(self, path, compress=True, block_rows=BLOCK_ROWS):
+        self.path = path
+        self.compress = compress
+        self.block_rows = block_rows
+        self.row_count = 0
+        self.block_count = 0
+        self._clear()
+        self._file = open(path, 'wb')
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION, int(compress), 0, 0))
+
+    def _clear(self):
+        self._src_ids = []
+        self._digests = []
+        self._xs = []
+        self._ys = []
+
+    def add(self, src_id, digest, x=None, y=None):
+        self._src_ids.append(src_id)
+        self._digests.append(digest)
+        self._xs.append(np.nan if x is None else x)
+        self._ys.append(np.nan if y is None else y)
+        if len(self._src_ids) >= self.block_rows:
+            self.flush()
+
+    def add_block(self, src_ids, digests, xs, ys):
+        """Add many rows at once. digests is the concatenated raw digest bytes."""
+        self.flush()
+        self._write_block(np.asarray(src_ids, dtype='<i8'),
+                          digests,
+                          np.asarray(xs, dtype='<f8'),
+                          np.asarray(ys, dtype='<f8'))
+
+    def flush(self):
+        if not self._src_ids:
+            return
+        self._write_block(np.array(self._src_ids, dtype='<i8'),
+                          ''.join(self._digests),
+                          np.array(self._xs, dtype='<f8'),
+                          np.array(self._ys, dtype='<f8'))
+        self._clear()
+
+    def _write_block(self, src_ids, digests, xs, ys):
+        rows = len(src_ids)
+        if not rows:
+            return
+        payload = ''.join((_to_bytes(src_ids), digests, _to_bytes(xs), _to_bytes(ys)))
+        if self.compress:
+            payload = zlib.compress(payload, COMPRESS_LEVEL)
+        self._file.write(BLOCK_HEADER.pack(rows, len(payload)))
+        self._file.write(payload)
+        self.row_count += rows
+        self.block_count += 1
+
+    def close(self):
+        self.flush()
+        self._file.seek(0)
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION, int(self.compress), self.row_count, self.block_count))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _split_payload(payload, rows, offset=0):
+    src_ids = np.frombuffer(payload, dtype='<i8', count=rows, offset=offset)
+    offset += rows * 8
+    digests = np.frombuffer(payload, dtype=np.uint8, count=rows * DIGEST_SIZE, offset=offset)
+    offset += rows * DIGEST_SIZE
+    xs = np.frombuffer(payload, dtype='<f8', count=rows, offset=offset)
+    offset += rows * 8
+    ys = np.frombuffer(payload, dtype='<f8', count=rows, offset=offset)
+
+    return src_ids, digests.reshape(rows, DIGEST_SIZE), xs, ys
+
+
+def read_hash_store(path, use_mmap=False):
+    """Load a hash store as a HashStore of column arrays.
+
+    Legacy src_id,hash,centroidxy csv stores are accepted too. Uncompressed
+    stores can be memory mapped instead of read.
+    """
+    with open(path, 'rb') as store_file:
+        header = store_file.read(FILE_HEADER.size)
+        if not header.startswith(MAGIC):
+            return _read_legacy_csv(path)
+        magic, version, compressed, row_count, block_count = FILE_HEADER.unpack(header)
+        if use_mmap and not compressed:
+            mapped = np.memmap(path, dtype=np.uint8, mode='r')
+            blocks = []
+            offset = FILE_HEADER.size
+            for block in range(block_count):
+                rows, length = BLOCK_HEADER.unpack(_to_bytes(mapped[offset:offset + BLOCK_HEADER.size]))
+                offset += BLOCK_HEADER.size
+                blocks.append(_split_payload(mapped, rows, offset))
+                offset += length
+        else:
+            blocks = []
+            for block in range(block_count):
+                rows, length = BLOCK_HEADER.unpack(store_file.read(BLOCK_HEADER.size))
+                payload = store_file.read(length)
+                if compressed:
+                    payload = zlib.decompress(payload)
+                blocks.append(_split_payload(payload, rows))
+
+    if not blocks:
+        return HashStore(np.zeros(0, dtype='<i8'),
+                         np.zeros((0, DIGEST_SIZE), dtype=np.uint8),
+                         np.zeros(0, dtype='<f8'),
+                         np.zeros(0, dtype='<f8'))
+    if len(blocks) == 1:
+        return HashStore(*blocks[0])
+
+    return HashStore(*[np.concatenate(column) for column in zip(*blocks)])
+
+
+def _parse_centroid(centroid):
+    try:
+        x, y = centroid.strip('()').split(',')
+        return float(x), float(y)
+    except ValueError:
+        return np.nan, np.nan
+
+
+def _read_legacy_csv(path):
+    src_ids = []
+    digests = []
+    xs = []
+    ys = []
+    with open(path, 'rb') as hash_csv:
+        reader = csv.reader(hash_csv)
+        next(reader)
+        for src_id, hex_digest, centroid in reader:
+            src_ids.append(int(src_id))
+            digests.append(binascii.unhexlify(hex_digest))
+            x, y = _parse_centroid(centroid)
+            xs.append(x)
+            ys.append(y)
+    digest_array = np.frombuffer(''.join(digests), dtype=np.uint8).reshape(len(digests), DIGEST_SIZE)
+
+    return HashStore(np.array(src_ids, dtype='<i8'), digest_array, np.array(xs, dtype='<f8'), np.array(ys, dtype='<f8'))
+
+
+def digest_keys(digests):
+    """Raw digest strings for each row of a digest array."""
+    raw = _to_bytes(np.ascontiguousarray(digests))
+
+    return [raw[start:start + DIGEST_SIZE] for start in xrange(0, len(raw), DIGEST_SIZE)]
+
+
+def hash_lookup(store):
+    """{raw digest: [row indexes]} for a loaded HashStore.
+
+    Identical rows hash to the same digest, so a digest can have several rows.
+    """
+    lookup = {}
+    for index, digest in enumerate(digest_keys(store.digest)):
+        lookup.setdefault(digest, []).append(index)
+
+    return lookup
+
+
+def match_digests(lookup, digests, matched):
+    """Past row index for each digest, or -1 for a row that is new.
+
+    Each past row is matched at most once, so an extra copy of a duplicated
+    row counts as added. matched holds {digest: rows matched so far} across
+    calls and is updated.
+    """
+    indexes = np.full(len(digests), -1, dtype=np.int64)
+    for position, digest in enumerate(digests):
+        past_indexes = lookup.get(digest)
+        if past_indexes:
+            used = matched.get(digest, 0)
+            if used < len(past_indexes):
+                indexes[position] = past_indexes[used]
+                matched[digest] = used + 1
+
+    return indexes
+
+
+def get_hash_lookup(path):
+    return hash_lookup(read_hash_store(path))
+
+
+def _row_blocks(cursor, block_rows, block_bytes, shape_token):
+    if not shape_token:
+        rows = list(islice(cursor, block_rows))
+        while rows:
+            yield rows
+            rows = list(islice(cursor, block_rows))
+        return
+    rows = []
+    shape_bytes = 0
+    for row in cursor:
+        rows.append(row)
+        shape_bytes += len(row[-1] or '')
+        if len(rows) >= block_rows or shape_bytes >= block_bytes:
+            yield rows
+            rows = []
+            shape_bytes = 0
+    if rows:
+        yield rows
+
+
+def hash_row_blocks(cursor, attribute_count, shape_token=None, block_rows=HASH_BLOCK_ROWS,
+                    block_bytes=HASH_BLOCK_BYTES):
+    """Hash cursor rows in blocks of up to block_rows rows and about block_bytes of shape text.
+
+    Rows start with attribute_count hashed fields and end with OID@ and, with
+    a shape_token, SHAPE@XY and the shape token. A digest is the md5 of the
+    attribute tuple's str followed by the shape text, as in the csv stores,
+    so identical rows share a digest. Yields (rows, src_ids, digests, xs, ys).
+
+    Every row is still one md5 call, blocks only batch the store writes and
+    the digest matching. That is only 1.1 to 1.2 times the row at a time loop,
+    see tests/benchmark_hash_rows.py.
+    """
+    oid_index = -3 if shape_token else -1
+    for rows in _row_blocks(cursor, block_rows, block_bytes, shape_token):
+        if shape_token:
+            # None shape gets a stand in so the row still hashes
+            digests = [md5(str(row[:attribute_count]) + (row[-1] or 'No shape')).digest() for row in rows]
+            xy = np.array([row[-2] or (np.nan, np.nan) for row in rows], dtype='<f8').reshape(-1, 2)
+            xs, ys = xy[:, 0], xy[:, 1]
+        else:
+            digests = [md5(str(row[:attribute_count])).digest() for row in rows]
+            xs = ys = np.full(len(rows), np.nan)
+
+        yield rows, map(itemgetter(oid_index), rows), digests, xs, ys
+
+
+def find_hash_store(hash_directory, output_name):
+    """Path of the hash store for output_name, preferring the binary format."""
+    for store_name in (HASH_STORE_NAME, LEGACY_HASH_STORE_NAME):
+        store_path = os.path.join(hash_directory, store_name.format(output_name))
+        if os.path.exists(store_path):
+            return store_path
+
+    return None
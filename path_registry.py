@@ -0,0 +1,180 @@
+import os
+import json
+from array import array
+
+ROOT = 0
+NO_NODE = -1
+
+
+class PathRegistry(object):
+    """Drive file and parent ids for ftp paths, kept in a path component trie.
+
+    Nodes live in parallel arrays indexed by node number. Components are
+    interned to ints so a folder name shared by thousands of paths is
+    stored once. Children are found by walking a node's sibling chain and
+    category queries scan the component column, so there is no per node
+    index to pay for. Parent ids are shared strings, most paths in a folder
+    have the same one. Supports the dict operations the path id maps were
+    used with.
+    """
+
+    def __init__(self, separator=os.sep):
+        self.separator = separator
+        self._component_ids = {}
+        self._component_names = []
+        self._parent_ids = {}
+        self._component = array('l', [NO_NODE])
+        self._parent = array('l', [NO_NODE])
+        self._first_child = array('l', [NO_NODE])
+        self._next_sibling = array('l', [NO_NODE])
+        self._file_id = [None]
+        self._parent_id = [None]
+        self._count = 0
+
+    def _intern(self, component):
+        component_id = self._component_ids.get(component)
+        if component_id is None:
+            component_id = self._component_ids[component] = len(self._component_names)
+            self._component_names.append(component)
+        return component_id
+
+    def _child(self, node, component_id):
+        child = self._first_child[node]
+        while child != NO_NODE and self._component[child] != component_id:
+            child = self._next_sibling[child]
+        return child
+
+    def _node(self, path, create=False):
+        node = ROOT
+        for component in path.split(self.separator):
+            component_id = self._intern(component) if create else self._component_ids.get(component)
+            if component_id is None:
+                return None
+            child = self._child(node, component_id)
+            if child == NO_NODE:
+                if not create:
+                    return None
+                child = self._add_node(node, component_id)
+            node = child
+
+        return node
+
+    def _add_node(self, parent, component_id):
+        node = len(self._component)
+        self._component.append(component_id)
+        self._parent.append(parent)
+        self._first_child.append(NO_NODE)
+        self._next_sibling.append(self._first_child[parent])
+        self._first_child[parent] = node
+        self._file_id.append(None)
+        self._parent_id.append(None)
+
+        return node
+
+    def _path(self, node):
+        components = []
+        while node != ROOT:
+            components.append(self._component_names[self._component[node]])
+            node = self._parent[node]
+
+        return self.separator.join(reversed(components))
+
+    def add(self, path, file_id, parent_id=''):
+        node = self._node(path, create=True)
+        if self._file_id[node] is None:
+            self._count += 1
+        self._file_id[node] = file_id
+        self._parent_id[node] = self._parent_ids.setdefault(parent_id, parent_id)
+
+    def __setitem__(self, path, file_id):
+        self.add(path, file_id)
+
+    def __contains__(self, path):
+        node = self._node(path)
+        return node is not None and self._file_id[node] is not None
+
+    def __getitem__(self, path):
+        node = self._node(path)
+        if node is None or self._file_id[node] is None:
+            raise KeyError(path)
+        return self._file_id[node]
+
+    def get(self, path, default=None):
+        node = self._node(path)
+        if node is None or self._file_id[node] is None:
+            return default
+        return self._file_id[node]
+
+    def parent_id(self, path):
+        """Drive id of the folder holding path, None for a path that is not registered."""
+        node = self._node(path)
+        if node is None or self._file_id[node] is None:
+            return None
+        return self._parent_id[node]
+
+    def __len__(self):
+        return self._count
+
+    def _descendants(self, node):
+        stack = [self._first_child[node]]
+        while stack:
+            child = stack.pop()
+            while child != NO_NODE:
+                yield child
+                if self._first_child[child] != NO_NODE:
+                    stack.append(self._first_child[child])
+                child = self._next_sibling[child]
+
+    def under(self, prefix=None):
+        """Every registered path below prefix, or all of them."""
+        node = ROOT if prefix is None else self._node(prefix.rstrip(self.separator))
+        if node is None:
+            return
+        for descendant in self._descendants(node):
+            if self._file_id[descendant] is not None:
+                yield self._path(descendant)
+
+    def __iter__(self):
+        return self.under()
+
+    def keys(self):
+        return list(self)
+
+    def _is_below(self, node, ancestor):
+        while node != NO_NODE:
+            if node == ancestor:
+                return True
+            node = self._parent[node]
+        return False
+
+    def category(self, folder_name, prefix=None):
+        """Registered paths anywhere below a folder named folder_name, optionally only under prefix."""
+        prefix_node = ROOT if prefix is None else self._node(prefix.rstrip(self.separator))
+        component_id = self._component_ids.get(folder_name)
+        if prefix_node is None or component_id is None:
+            return
+        seen = set()
+        for folder, folder_component in enumerate(self._component):
+            if folder_component != component_id or not self._is_below(folder, prefix_node):
+                continue
+            for descendant in self._descendants(folder):
+                if self._file_id[descendant] is not None and descendant not in seen:
+                    seen.add(descendant)
+                    yield self._path(descendant)
+
+
+def load_path_registry(path_id_json, separator=os.sep):
+    """Registry from a [{path, fileId, parentId}] json file.
+
+    Entries go into the registry as they are parsed, so the whole list of
+    dicts is never held at once.
+    """
+    registry = PathRegistry(separator)
+
+    def _add(path_id):
+        registry.add(path_id['path'], path_id['fileId'], path_id.get('parentId', ''))
+
+    with open(path_id_json, 'r') as json_file:
+        json.load(json_file, object_hook=_add)
+
+    return registry
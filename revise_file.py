@@ -5,6 +5,8 @@ import httplib2
 import os
 import hashlib
 
+from drive_revisions import prune_spec_revisions, KEEP_REVISIONS
+
 from apiclient import discovery
 from oauth2client import client
 from oauth2client import tools
@@ -12,7 +14,16 @@ from oauth2client.file import Storage
 
 try:
     import argparse
-    flags = argparse.ArgumentParser(parents=[tools.argparser]).parse_args()
+    parser = argparse.ArgumentParser(parents=[tools.argparser])
+    parser.add_argument('--prune', action='store_true',
+                        help='delete old revisions of every file in the spec store')
+    parser.add_argument('--keep-revisions', type=int, default=KEEP_REVISIONS,
+                        help='newest revisions to keep per file')
+    parser.add_argument('--keep-days', type=int, default=None,
+                        help='also keep revisions modified within this many days')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='report what would be deleted without deleting')
+    flags = parser.parse_args()
 except ImportError:
     flags = None
 
@@ -146,6 +157,10 @@ def main():
     http = credentials.authorize(httplib2.Http())
     service = discovery.build('drive', 'v3', http=http)
 
+    if flags and flags.prune:
+        prune_spec_revisions(service, flags.keep_revisions, flags.keep_days, flags.dry_run)
+        return
+
     fileId = '0B3wvsjTJuTRQMHhWY2JlLW9iSnM'
     new_file = r'./test/data/repos.zip'
     # request = service.files().get_media(fileId=fileId)
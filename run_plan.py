@@ -0,0 +1,129 @@
+from __future__ import print_function
+import os
+import json
+from datetime import datetime, timedelta
+from time import strftime
+
+THROUGHPUT_JSON = 'throughput.json'
+THROUGHPUT_SAMPLES = 50
+#: bytes per second used before any upload has been timed
+DEFAULT_UPLOAD_RATE = 2000000.0
+ID_KEYS = ('gdb_id', 'shape_id', 'hash_id')
+#: features unchanged by their probe are still rebuilt this often
+FULL_CHECK_DAYS = 30
+UPLOAD_DATE_FORMAT = '%Y_%m_%d'
+
+
+def load_throughput(throughput_json=THROUGHPUT_JSON):
+    if not os.path.exists(throughput_json):
+        return {'uploads': []}
+    with open(throughput_json, 'r') as json_file:
+        return json.load(json_file)
+
+
+def record_upload(upload_bytes, seconds, throughput_json=THROUGHPUT_JSON):
+    """Keep the most recent upload timings for estimating later runs."""
+    throughput = load_throughput(throughput_json)
+    throughput['uploads'] = (throughput['uploads'] + [[upload_bytes, seconds]])[-THROUGHPUT_SAMPLES:]
+    with open(throughput_json, 'w') as json_file:
+        json.dump(throughput, json_file)
+
+
+def upload_rate(throughput_json=THROUGHPUT_JSON):
+    """Bytes per second over the recorded uploads."""
+    uploads = load_throughput(throughput_json)['uploads']
+    total_bytes = sum(upload[0] for upload in uploads)
+    total_seconds = sum(upload[1] for upload in uploads)
+    if not total_bytes or not total_seconds:
+        return DEFAULT_UPLOAD_RATE
+
+    return total_bytes / float(total_seconds)
+
+
+def is_full_check_due(spec, now=None, full_check_days=FULL_CHECK_DAYS):
+    """True when a feature was last rebuilt, and so fully hashed, over full_check_days ago."""
+    try:
+        upload_date = datetime.strptime(spec.get('upload_date') or '', UPLOAD_DATE_FORMAT)
+    except ValueError:
+        return True
+
+    return (now or datetime.now()) - upload_date > timedelta(days=full_check_days)
+
+
+def build_plan(spec_store, probes, remote_sizes, rate=None, now=None):
+    """Predict the work of a catalog run.
+
+    probes: {sgid_name: probe string} from a fast change probe
+    remote_sizes: {drive file id: bytes}, the current remote artifacts stand
+    in for what the next upload of each will weigh
+    A feature is planned when its probe differs from the one stored in its
+    spec or its last full check is due, a package when any of its members is
+    planned or has no spec yet.
+    """
+    rate = rate or upload_rate()
+    features = []
+    unknown_sizes = 0
+    upload_bytes = 0
+    process_seconds = 0.0
+    for spec_name in spec_store.feature_names():
+        spec = spec_store.get_feature(spec_name)
+        sgid_name = spec['sgid_name']
+        if sgid_name in probes and spec.get('probe') == probes[sgid_name] and not is_full_check_due(spec, now):
+            continue
+        features.append(sgid_name)
+        process_seconds += spec.get('process_seconds', 0)
+        for id_key in ID_KEYS:
+            if spec.get(id_key) in remote_sizes:
+                upload_bytes += remote_sizes[spec[id_key]]
+            else:
+                unknown_sizes += 1
+
+    known_features = set(spec_store.get_feature(spec_name)['sgid_name'] for spec_name in spec_store.feature_names())
+    packages = []
+    for package_name in spec_store.package_names():
+        members = set(spec_store.features_in_package(package_name))
+        if members & set(features) or members - known_features:
+            packages.append(package_name)
+            package = spec_store.get_package(package_name)
+            for id_key in ('gdb_id', 'shape_id'):
+                if not package.get(id_key) and package.get('format') == 'reference':
+                    #: every member is referenced, nothing of its own to upload
+                    continue
+                if package.get(id_key) in remote_sizes:
+                    upload_bytes += remote_sizes[package[id_key]]
+                else:
+                    unknown_sizes += 1
+
+    return {'created': strftime('%Y-%m-%d %H:%M:%S'),
+            'features': features,
+            'packages': packages,
+            'probes': dict((sgid_name, probes[sgid_name]) for sgid_name in features if sgid_name in probes),
+            'upload_bytes': upload_bytes,
+            'unknown_sizes': unknown_sizes,
+            'upload_rate': rate,
+            'estimated_seconds': process_seconds + upload_bytes / rate}
+
+
+def print_plan(plan):
+    print('Plan created {}'.format(plan['created']))
+    print('Changed features: {}'.format(len(plan['features'])))
+    for sgid_name in plan['features']:
+        print('  {}'.format(sgid_name))
+    print('Packages to rebuild: {}'.format(len(plan['packages'])))
+    for package_name in plan['packages']:
+        print('  {}'.format(package_name))
+    print('Upload volume: {} MB ({} artifacts without a known size)'.format(plan['upload_bytes'] / 1000000.0,
+                                                                           plan['unknown_sizes']))
+    print('Estimated time: {} minutes at {} MB/s'.format(round(plan['estimated_seconds'] / 60.0, 1),
+                                                         round(plan['upload_rate'] / 1000000.0, 2)))
+
+
+def save_plan(plan_json, plan):
+    with open(plan_json, 'w') as f_out:
+        f_out.write(json.dumps(plan, sort_keys=True, indent=4))
+    print('Plan saved: {}'.format(plan_json))
+
+
+def load_plan(plan_json):
+    with open(plan_json, 'r') as json_file:
+        return json.load(json_file)
@@ -0,0 +1,68 @@
+from __future__ import print_function
+import errno
+import glob
+import json
+import os
+import shutil
+import tempfile
+import time
+
+FIELDS_JSON = 'fields.json'
+BUILDING_SUFFIX = '_building'
+#: a build left this long was abandoned by a killed run
+STALE_BUILD_SECONDS = 60 * 60
+
+
+def _clear_stale_builds(cache_directory, fingerprint, now=None):
+    now = now or time.time()
+    for building in glob.glob(os.path.join(cache_directory, fingerprint + BUILDING_SUFFIX + '*')):
+        try:
+            if now - os.path.getmtime(building) > STALE_BUILD_SECONDS:
+                shutil.rmtree(building)
+        except OSError:
+            #: finished or cleared by another run
+            pass
+
+
+def _read_fields(schema_directory):
+    with open(os.path.join(schema_directory, FIELDS_JSON), 'r') as json_file:
+        return json.load(json_file)
+
+
+def load_schema(cache_directory, fingerprint, build):
+    """Cached template directory and field list for fingerprint.
+
+    A missing schema is built by build(directory), which fills directory
+    and returns the field list. Every run builds in its own directory and
+    renames it into place, so concurrent runs never share a half built
+    template; when another run wins the rename its schema is used.
+    Returns (schema_directory, fields).
+    """
+    schema_directory = os.path.join(cache_directory, fingerprint)
+    if os.path.exists(os.path.join(schema_directory, FIELDS_JSON)):
+        return schema_directory, _read_fields(schema_directory)
+
+    if not os.path.exists(cache_directory):
+        try:
+            os.makedirs(cache_directory)
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+    _clear_stale_builds(cache_directory, fingerprint)
+    building = tempfile.mkdtemp(prefix=fingerprint + BUILDING_SUFFIX, dir=cache_directory)
+    try:
+        fields = build(building)
+        with open(os.path.join(building, FIELDS_JSON), 'w') as f_out:
+            json.dump(fields, f_out)
+        try:
+            os.rename(building, schema_directory)
+        except OSError:
+            if not os.path.exists(os.path.join(schema_directory, FIELDS_JSON)):
+                raise
+            print('Schema {} was cached by another run'.format(fingerprint))
+            return schema_directory, _read_fields(schema_directory)
+    finally:
+        if os.path.exists(building):
+            shutil.rmtree(building, ignore_errors=True)
+
+    return schema_directory, fields
@@ -0,0 +1,162 @@
+from __future__ import print_function
+import os
+import shutil
+import threading
+
+SCRATCH_DIRECTORY = 'package_temp'
+GIGABYTE = 1024 * 1024 * 1024
+SCRATCH_BUDGET = 20 * GIGABYTE
+TMPFS_BUDGET = 2 * GIGABYTE
+#: the only directory created, and ever deleted, inside a shared tmpfs root
+TMPFS_SUBDIRECTORY = 'sgid-scratch'
+
+
+def directory_size(directory):
+    total = 0
+    for root, subdirs, files in os.walk(directory):
+        for filename in files:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass
+
+    return total
+
+
+class ScratchManager(object):
+    """Per feature and package workspaces under a disk budget.
+
+    acquire reserves an estimated size. A workspace is deleted as soon as
+    every hold on it is released, unless it was given a path of its own to
+    keep between runs. Holds for downstream users, such as the packages a
+    feature belongs to, can be placed with retain before the workspace is
+    acquired.
+
+    When a reservation would overrun the budget, workspaces that only
+    retain holds keep are evicted, largest first; their users have to
+    rebuild what they needed from the source. Runs are single threaded, so
+    that is how the budget is kept. If it is still full, acquire waits for
+    another thread to release, and only goes over budget when no other
+    thread could: every workspace belongs to the caller or to threads that
+    are waiting themselves.
+
+    Hot workspaces go to a TMPFS_SUBDIRECTORY of tmpfs_root while it has
+    room.
+    """
+
+    def __init__(self, root=SCRATCH_DIRECTORY, budget=SCRATCH_BUDGET, tmpfs_root=None, tmpfs_budget=TMPFS_BUDGET):
+        self.root = root
+        self.budget = budget
+        self.tmpfs_root = os.path.join(tmpfs_root, TMPFS_SUBDIRECTORY) if tmpfs_root else None
+        self.tmpfs_budget = tmpfs_budget
+        self._workspaces = {}
+        self._holds = {}
+        self._waiting = set()
+        self._condition = threading.Condition()
+        for scratch_root in (root, self.tmpfs_root):
+            if not scratch_root:
+                continue
+            if os.path.exists(scratch_root):
+                shutil.rmtree(scratch_root)
+                print('Scratch directory removed: {}'.format(scratch_root))
+            os.makedirs(scratch_root)
+
+    def _reserved(self, on_tmpfs):
+        return sum(workspace['reserved'] for workspace in self._workspaces.values()
+                   if workspace['tmpfs'] == on_tmpfs)
+
+    def _others_can_release(self, thread_id):
+        return any(workspace['owner'] != thread_id and workspace['owner'] not in self._waiting
+                   for workspace in self._workspaces.values())
+
+    def _evict(self, name, estimate):
+        """Delete idle retained workspaces until estimate fits the budget."""
+        idle = sorted((workspace['reserved'], idle_name) for idle_name, workspace in self._workspaces.items()
+                      if not workspace['users'] and not workspace['keep'] and not workspace['tmpfs'])
+        while idle and self._reserved(False) + estimate > self.budget:
+            reserved, idle_name = idle.pop()
+            workspace = self._workspaces.pop(idle_name)
+            shutil.rmtree(workspace['path'], ignore_errors=True)
+            print('Scratch workspace {} evicted for {}'.format(idle_name, name))
+
+    def acquire(self, name, estimate, hot=False, path=None):
+        """Path of a fresh workspace for name, waiting for budget if needed.
+
+        A workspace given a path is kept there as it is, and is not deleted
+        when it is released.
+        """
+        with self._condition:
+            if name in self._workspaces:
+                self._workspaces[name]['users'] += 1
+                return self._workspaces[name]['path']
+            on_tmpfs = bool(hot and not path and self.tmpfs_root and
+                            self._reserved(True) + estimate <= self.tmpfs_budget)
+            thread_id = threading.current_thread().ident
+            if not on_tmpfs:
+                self._evict(name, estimate)
+            waited = False
+            while not on_tmpfs and self._reserved(False) + estimate > self.budget:
+                if not self._others_can_release(thread_id):
+                    if self._workspaces:
+                        print('Scratch budget exceeded for {}, nothing else can free space'.format(name))
+                    break
+                if not waited:
+                    print('Scratch budget full, waiting for {}'.format(name))
+                    waited = True
+                self._waiting.add(thread_id)
+                #: threads waiting on this one's workspaces may now be stuck too
+                self._condition.notify_all()
+                self._condition.wait()
+                self._waiting.discard(thread_id)
+            if path is None:
+                path = os.path.join(self.tmpfs_root if on_tmpfs else self.root, name)
+                if os.path.exists(path):
+                    shutil.rmtree(path)
+                keep = False
+            else:
+                keep = True
+            if not os.path.exists(path):
+                os.makedirs(path)
+            self._workspaces[name] = {'path': path,
+                                      'reserved': estimate,
+                                      'tmpfs': on_tmpfs,
+                                      'keep': keep,
+                                      'owner': thread_id,
+                                      'users': 1,
+                                      'holds': self._holds.pop(name, 0)}
+
+            return path
+
+    def retain(self, name, count=1):
+        """Keep name's workspace until count more releases."""
+        with self._condition:
+            if name in self._workspaces:
+                self._workspaces[name]['holds'] += count
+            else:
+                self._holds[name] = self._holds.get(name, 0) + count
+
+    def release(self, name):
+        """Drop a hold on name. Users that acquired it release before the holders that retained it."""
+        with self._condition:
+            if name not in self._workspaces:
+                if self._holds.get(name):
+                    self._holds[name] -= 1
+                return
+            workspace = self._workspaces[name]
+            if workspace['users']:
+                workspace['users'] -= 1
+            elif workspace['holds']:
+                workspace['holds'] -= 1
+            if workspace['users'] or workspace['holds']:
+                return
+            del self._workspaces[name]
+            if not workspace['keep']:
+                shutil.rmtree(workspace['path'], ignore_errors=True)
+            self._condition.notify_all()
+
+    def path(self, name):
+        """Path of a held workspace, None once it has been freed or evicted."""
+        with self._condition:
+            workspace = self._workspaces.get(name)
+
+        return workspace['path'] if workspace else None
@@ -3,22 +3,50 @@ import shutil
 import os
 import zipfile
 import csv
-from time import clock, strftime
+from time import clock, time
 from hashlib import md5
+from operator import itemgetter
 # from xxhash import xxh32
 import json
-import io
 import ntpath
+import numpy as np
 
 from apiclient import errors
-from apiclient.http import MediaFileUpload, MediaIoBaseDownload
-import httplib2
-from apiclient import discovery
 from oauth2client import client
 from oauth2client import tools
 from oauth2client.file import Storage
 
-
+from spec_store import open_spec_store, shared_spec_db, spec_stem, SPEC_DB
+from work_queue import WorkQueue, run_worker
+from hash_store import HashStoreWriter, HASH_STORE_NAME, find_hash_store, read_hash_store, hash_lookup, match_digests, \
+    hash_row_blocks
+from change_tiles import summarize_changes, write_tile_summary
+from drive_changes import open_remote_mirror
+from hash_prefetch import HashPrefetcher, PREFETCH_WORKERS, download_file
+from drive_transport import build_service, upload_file, POOL_SIZE, MIN_CHUNK_SIZE, MAX_CHUNK_SIZE
+from path_registry import load_path_registry
+from scratch import ScratchManager, directory_size, GIGABYTE, SCRATCH_BUDGET, TMPFS_BUDGET
+from ziputil import zip_folder, update_zip, write_reproducible_data
+from dirutil import md5_file
+from schema_cache import load_schema
+import run_plan
+
+
+SCHEMA_CACHE_DIRECTORY = 'schema_cache'
+PACKAGE_BUILD_DIRECTORY = 'package_builds'
+#: package spec format that links to member zips instead of copying them
+REFERENCE_FORMAT = 'reference'
+#: reference package spec key that allows its full gdb and shape zips to be trashed
+RETIRE_FULL_ZIPS_KEY = 'retire_full_zips'
+SHORTCUT_MIME_TYPE = 'application/vnd.google-apps.shortcut'
+DOWNLOAD_LINK = 'https://drive.google.com/uc?export=download&id={}'
+BUILD_MANIFEST_NAME = 'members.json'
+#: columns too costly to read for the probe, the shape is covered by shape tokens
+PROBE_SKIPPED_TYPES = ('OID', 'Geometry', 'Blob', 'Raster')
+PROBE_SHAPE_TOKENS = ('SHAPE@XY', 'SHAPE@LENGTH', 'SHAPE@AREA')
+#: scratch used per byte of a feature's zipped drive artifacts
+SCRATCH_EXPANSION = 5
+DEFAULT_SCRATCH_BYTES = 500 * 1024 * 1024
 HASH_DRIVE_FOLDER = '0B3wvsjTJuTRQZUJXWEhEX3p3d1k'
 UTM_DRIVE_FOLDER = '0B3wvsjTJuTRQaGluYVphcUNEREE'
 # If modifying these scopes, delete your previously saved credentials
@@ -29,40 +57,46 @@ APPLICATION_NAME = 'Drive API Python Quickstart'
 
 try:
     import argparse
-    flags = argparse.ArgumentParser(parents=[tools.argparser]).parse_args()
+    parser = argparse.ArgumentParser(parents=[tools.argparser])
+    parser.add_argument('--queue', help='shared work queue database, workers on every host use the same path')
+    parser.add_argument('--worker-id', help='name recorded on leases, defaults to host:pid')
+    parser.add_argument('--spec-db', help='spec database, defaults to {} beside the --queue database when '
+                                          'there is one so every host shares it'.format(SPEC_DB))
+    parser.add_argument('--plan', help='write a plan of the predicted work to this path and stop')
+    parser.add_argument('--execute-plan', help='run exactly the work in a saved plan')
+    parser.add_argument('--prefetch-workers', type=int, default=PREFETCH_WORKERS,
+                        help='concurrent past hash downloads, sharing the --http-pool-size connections')
+    parser.add_argument('--http-pool-size', type=int, default=POOL_SIZE,
+                        help='keep-alive drive connections shared by all requests')
+    parser.add_argument('--min-chunk-mb', type=float, default=MIN_CHUNK_SIZE / (1024.0 * 1024),
+                        help='smallest resumable upload chunk')
+    parser.add_argument('--max-chunk-mb', type=float, default=MAX_CHUNK_SIZE / (1024.0 * 1024),
+                        help='largest resumable upload chunk')
+    parser.add_argument('--scratch-budget-gb', type=float, default=SCRATCH_BUDGET / float(GIGABYTE),
+                        help='disk held by feature workspaces before work waits')
+    parser.add_argument('--tmpfs', help='memory backed directory, hot workspaces go in its sgid-scratch folder')
+    parser.add_argument('--tmpfs-budget-gb', type=float, default=TMPFS_BUDGET / float(GIGABYTE),
+                        help='space used on --tmpfs')
+    flags = parser.parse_args()
 except ImportError:
     flags = None
 
 
 class DriveFile(object):
+    __slots__ = ('path', 'file_id', 'parent_id')
 
     def __init__(self, ftp_path, file_id, parent_id):
         self.path = ftp_path
-        self.name = os.path.basename(ftp_path)
         self.file_id = file_id
         self.parent_id = parent_id
 
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
     def update_file(self, local_file, drive_service):
         print 'updating {}'.format(self.name)
-        media_body = MediaFileUpload(local_file,
-                                     mimetype='application/zip',
-                                     resumable=True)
-        # file = drive_service.files().get(fileId=self.file_id, fields='').execute()
-        # print file
-        file_metadata = {'name': self.name}
-
-        # request = service.files().create(body=file_metadata,
-        #                                  media_body=media_body,
-        #                                  fields="id")
-        request = drive_service.files().update(fileId=self.file_id,
-                                               #body=file_metadata,
-                                               media_body=media_body)
-
-        response = None
-        while response is None:
-            status, response = request.next_chunk()
-        #   if status :
-        #     print('{} percent {}'.format(name, int(status.progress() * 100)))
+        response = upload_file(drive_service, local_file, file_id=self.file_id)
 
         return response.get('id')
 
@@ -99,10 +133,11 @@ def get_credentials():
 def setup_drive_service():
     # get auth
     credentials = get_credentials()
-    http = credentials.authorize(httplib2.Http())
-    service = discovery.build('drive', 'v3', http=http)
+    if flags:
+        return build_service(credentials, flags.http_pool_size,
+                             flags.min_chunk_mb * 1024 * 1024, flags.max_chunk_mb * 1024 * 1024)
 
-    return service
+    return build_service(credentials)
 
 
 def _filter_fields(fields):
@@ -134,16 +169,16 @@ def _create_hash(string, salt):
 
 
 def load_path_ids(folder_path_id_json):
-    path_id_list = None
-    with open(folder_path_id_json, 'r') as json_file:
-        path_id_list = json.load(json_file)
-    folder_path_drivefiles = {}
-    for path_id in path_id_list:
-        folder_path_drivefiles[path_id['path']] = DriveFile(path_id['path'], path_id['fileId'], path_id['parentId'])
-    return folder_path_drivefiles
+    return load_path_registry(folder_path_id_json, '/')
+
+
+def get_drive_file(path_registry, ftp_path):
+    return DriveFile(ftp_path, path_registry[ftp_path], path_registry.parent_id(ftp_path))
 
 
 def get_unpackaged_drivefiles_by_name(folder_path_drivefiles):
+    '''
+    folder_path_drivefiles: PathRegistry of ftp paths'''
     unpackaged_drivefiles = {}
 
     def _get_category_name(path):
@@ -152,132 +187,87 @@ def get_unpackaged_drivefiles_by_name(folder_path_drivefiles):
         category = path_list[cat_index]
         return category
     print 'name,path1,path2'
-    for ftp_path in folder_path_drivefiles:
-        if 'UnpackagedData' in ftp_path and 'OLD' not in ftp_path:
+    for ftp_path in folder_path_drivefiles.category('UnpackagedData'):
+        if 'OLD' not in ftp_path:
             category_file = _get_category_name(ftp_path).lower() + '|' + os.path.basename(ftp_path).lower()
             # category_file = os.path.basename(ftp_path)
             if category_file not in unpackaged_drivefiles:
-                unpackaged_drivefiles[category_file] = folder_path_drivefiles[ftp_path].path
+                unpackaged_drivefiles[category_file] = ftp_path
             else:
                 print '{},{},{}'.format(category_file, unpackaged_drivefiles[category_file], ftp_path)
                 # fix issue with /Volumes/ftp/UtahSGID_Vector/UTM12_NAD83/SOCIETY/UnpackagedData/UDOTMap_CityLocationsz
                 print'Duplicate unpackaged name'
-                print 'First: {}, {}, {}'.format(category_file, unpackaged_drivefiles[category_file], folder_path_drivefiles[ftp_path].file_id)
-                print 'Current: {}, {}, {}'.format(category_file, ftp_path, folder_path_drivefiles[ftp_path].file_id)
+                print 'First: {}, {}, {}'.format(category_file, unpackaged_drivefiles[category_file], folder_path_drivefiles[ftp_path])
+                print 'Current: {}, {}, {}'.format(category_file, ftp_path, folder_path_drivefiles[ftp_path])
 
     return unpackaged_drivefiles
 
 
-def zip_folder(folder_path, zip_name):
-    zf = zipfile.ZipFile(zip_name, "w", zipfile.ZIP_DEFLATED)
-    for root, subdirs, files in os.walk(folder_path):
-        for filename in files:
-            if not filename.endswith('.lock'):
-                zf.write(os.path.join(root, filename),
-                         os.path.relpath(os.path.join(root, filename), os.path.join(folder_path, '..')))
-    original_size = 0
-    compress_size = 0
-    for info in zf.infolist():
-        original_size += info.file_size
-        compress_size += info.compress_size
-    zf.close()
-    print '{} Compressed size: {} MB'.format(ntpath.basename(zip_name),
-                                             compress_size / 1000000.0)
-
-
 def unzip(zip_path, output_path):
     with zipfile.ZipFile(zip_path, 'r', zipfile.ZIP_DEFLATED) as zipped:
         zipped.extractall(output_path)
 
 
-def get_hash_lookup(hash_path, hash_field):
-    hash_lookup = {}
-    with arcpy.da.SearchCursor(hash_path, [hash_field, 'src_id']) as cursor:
-        for row in cursor:
-            hash_value, hash_oid = row
-            if hash_value not in hash_lookup:
-                hash_lookup[hash_value] = hash_oid  # hash_oid isn't used for anything yet
-            else:
-                'Hash OID {} is duplicate wtf?'.format(hash_oid)
-
-    return hash_lookup
-
-
 def create_hash_table(data_path, fields, output_hashes, shape_token=None):
     hash_store = output_hashes
     cursor_fields = list(fields)
-    attribute_subindex = -1
     cursor_fields.append('OID@')
     if shape_token:
         cursor_fields.append('SHAPE@XY')
         cursor_fields.append(shape_token)
-        attribute_subindex = -3
 
-    hashes = {}
     with arcpy.da.SearchCursor(data_path, cursor_fields) as cursor, \
-            open(hash_store, 'wb') as hash_csv:
-            hash_writer = csv.writer(hash_csv)
-            hash_writer.writerow(('src_id', 'hash', 'centroidxy'))
-            for row in cursor:
-                hasher = md5()  # Create/reset hash object
-                hasher.update(str(row[:attribute_subindex]))  # Hash only attributes first
-                if shape_token:
-                    shape_string = row[-1]
-                    if shape_string:  # None object won't hash
-                        hasher.update(shape_string)
-                    else:
-                        hasher.update('No shape')  # Add something to the hash to represent None geometry object
-                # Generate a unique hash if current row has duplicates
-                digest = hasher.hexdigest()
-                while digest in hashes:
-                    hasher.update(digest)
-                    digest = hasher.hexdigest()
-
-                oid = row[attribute_subindex]
-                hash_writer.writerow((oid, digest, str(row[-2])))
-
-
-def detect_changes(data_path, fields, past_hashes, output_fc, output_hashes, shape_token=None):
+            HashStoreWriter(hash_store) as hash_writer:
+            for rows, src_ids, digests, xs, ys in hash_row_blocks(cursor, len(fields), shape_token):
+                hash_writer.add_block(src_ids, ''.join(digests), xs, ys)
+
+
+def detect_changes(data_path, fields, past_hashes, output_fc, output_hashes, shape_token=None, past_store=None):
+    '''
+    fields: output fields, the last one is the shape and is not hashed as an attribute
+    past_hashes: {digest: [row indexes in past_store]}
+    past_store: HashStore of the last run, used to place removed rows in the tile summary'''
     # past_hashes = get_hash_lookup(hashes_path, hash_field)
     hash_store = output_hashes
     cursor_fields = list(fields)
-    attribute_subindex = -1
     cursor_fields.append('OID@')
     if shape_token:
         cursor_fields.append('SHAPE@XY')
         cursor_fields.append(shape_token)
-        attribute_subindex = -3
+    get_output_row = itemgetter(slice(0, len(fields)))
 
-    hashes = {}
     changes = 0
+    past_rows = len(past_store.src_id) if past_store is not None else sum(map(len, past_hashes.itervalues()))
+    past_seen = np.zeros(past_rows, dtype=bool)
+    matched = {}
+    added_xs = []
+    added_ys = []
     with arcpy.da.SearchCursor(data_path, cursor_fields) as cursor, \
             arcpy.da.InsertCursor(output_fc, fields) as ins_cursor, \
-            open(hash_store, 'wb') as hash_csv:
-            hash_writer = csv.writer(hash_csv)
-            hash_writer.writerow(('src_id', 'hash', 'centroidxy'))
-            for row in cursor:
-                hasher = md5()  # Create/reset hash object
-                hasher.update(str(row[:attribute_subindex - 1]))  # Hash only attributes first
-                if shape_token:
-                    shape_string = row[-1]
-                    if shape_string:  # None object won't hash
-                        hasher.update(shape_string)
-                    else:
-                        hasher.update('No shape')  # Add something to the hash to represent None geometry object
-                # Generate a unique hash if current row has duplicates
-                digest = hasher.hexdigest()
-                while digest in hashes:
-                    hasher.update(digest)
-                    digest = hasher.hexdigest()
-
-                oid = row[attribute_subindex]
-                hash_writer.writerow((oid, digest, str(row[-2])))
-                ins_cursor.insertRow(row[:attribute_subindex])
-
-                if digest not in past_hashes:
-                    changes += 1
+            HashStoreWriter(hash_store) as hash_writer:
+            for rows, src_ids, digests, xs, ys in hash_row_blocks(cursor, len(fields) - 1, shape_token):
+                hash_writer.add_block(src_ids, ''.join(digests), xs, ys)
+                # arcpy has no bulk insert, rows still go in one at a time
+                for row in rows:
+                    ins_cursor.insertRow(get_output_row(row))
+
+                past_indexes = match_digests(past_hashes, digests, matched)
+                added = past_indexes < 0
+                past_seen[past_indexes[~added]] = True
+                changes += int(added.sum())
+                added_xs.append(xs[added])
+                added_ys.append(ys[added])
     print 'Total changes: {}'.format(changes)
 
+    added_xs = np.concatenate(added_xs) if added_xs else np.zeros(0)
+    added_ys = np.concatenate(added_ys) if added_ys else np.zeros(0)
+    removed_xs = removed_ys = np.zeros(0)
+    if past_store is not None:
+        removed_xs = past_store.x[~past_seen]
+        removed_ys = past_store.y[~past_seen]
+    summary = summarize_changes(added_xs, added_ys, removed_xs, removed_ys)
+    write_tile_summary(os.path.splitext(hash_store)[0] + '_tiles.csv', summary)
+
 
 def create_formatted_outputs(output_directory, input_feature, output_name):
     input_desc = arcpy.Describe(input_feature)
@@ -335,18 +325,57 @@ def create_formatted_outputs(output_directory, input_feature, output_name):
     return (output_gdb, shape_directory, hash_directory)
 
 
-def create_changes_and_outputs(output_directory, input_feature, output_name, past_hashes, hash_field):
+def get_schema_fingerprint(input_desc, output_name):
+    '''
+    Fingerprint of everything the output feature class schema depends on.'''
+    field_parts = [(fld.name, fld.type, fld.length, fld.precision, fld.scale, fld.isNullable)
+                   for fld in input_desc.fields]
+    schema_parts = (output_name,
+                    input_desc.shapeType,
+                    getattr(input_desc, 'hasZ', False),
+                    getattr(input_desc, 'hasM', False),
+                    input_desc.spatialReference.exportToString(),
+                    field_parts)
+
+    return md5(repr(schema_parts)).hexdigest()
+
+
+def create_output_schema(output_directory, input_feature, output_name, cache_directory=SCHEMA_CACHE_DIRECTORY):
+    '''
+    Create the empty output gdb and feature class for input_feature.
+    returns: (output_gdb, output_fc, fields)
+    A template gdb and the filtered field list are cached per schema
+    fingerprint, so a known schema is a local copy instead of
+    CreateFileGDB, CreateFeatureclass and ListFields round trips.'''
     input_desc = arcpy.Describe(input_feature)
-    spatial_ref = input_desc.spatialReference
-    geo_type = input_desc.shapeType
+
+    def _build_schema(building_schema):
+        print 'Caching schema for {}'.format(output_name)
+        template_gdb = arcpy.CreateFileGDB_management(building_schema, output_name)[0]
+        template_fc = arcpy.CreateFeatureclass_management(template_gdb,
+                                                          output_name,
+                                                          input_desc.shapeType,
+                                                          input_feature,
+                                                          spatial_reference=input_desc.spatialReference)
+        fields = set([fld.name for fld in input_desc.fields]) & \
+            set([fld.name for fld in arcpy.ListFields(template_fc)])
+        return _filter_fields(fields)
+
+    cached_schema, fields = load_schema(cache_directory, get_schema_fingerprint(input_desc, output_name),
+                                        _build_schema)
+    output_gdb = os.path.join(output_directory, output_name + '.gdb')
+    shutil.copytree(os.path.join(cached_schema, output_name + '.gdb'),
+                    output_gdb,
+                    ignore=shutil.ignore_patterns('*.lock'))
+
+    return (output_gdb, os.path.join(output_gdb, output_name), [str(field) for field in fields])
+
+
+def create_changes_and_outputs(output_directory, input_feature, output_name, past_hashes, hash_field,
+                               past_store=None):
     # output_name = input_feature.split('.')[-1]
     # Create output GDB and feature class
-    output_gdb = arcpy.CreateFileGDB_management(output_directory, output_name)[0]
-    output_fc = arcpy.CreateFeatureclass_management(output_gdb,
-                                                    output_name,
-                                                    geo_type,
-                                                    input_feature,
-                                                    spatial_reference=spatial_ref)
+    output_gdb, output_fc, fields = create_output_schema(output_directory, input_feature, output_name)
     # Create directory to contain shape file
     shape_directory = os.path.join(output_directory, output_name)
     if not os.path.exists(shape_directory):
@@ -356,12 +385,9 @@ def create_changes_and_outputs(output_directory, input_feature, output_name, pas
     hash_directory = os.path.join(output_directory, output_name + '_hash')
     if not os.path.exists(hash_directory):
         os.makedirs(hash_directory)
-    hash_store = os.path.join(hash_directory, '{}_hashes.csv'.format(output_name))
+    hash_store = os.path.join(hash_directory, HASH_STORE_NAME.format(output_name))
 
     # Cursor through input_feature and do some stuff while creating output
-    fields = set([fld.name for fld in arcpy.ListFields(input_feature)]) & \
-        set([fld.name for fld in arcpy.ListFields(output_fc)])
-    fields = _filter_fields(fields)
     fields.append('SHAPE@')
     # fields.append('OID@')
     # sql_clause = (None, 'ORDER BY {}'.format('OBJECTID'))
@@ -369,7 +395,7 @@ def create_changes_and_outputs(output_directory, input_feature, output_name, pas
     hash_ins_time = clock()
     # past_hashes = get_hash_lookup(past_hashes_path, hash_field)
 
-    detect_changes(input_feature, fields, past_hashes, output_fc, hash_store, 'SHAPE@WKT')
+    detect_changes(input_feature, fields, past_hashes, output_fc, hash_store, 'SHAPE@WKT', past_store)
     #print 'hash ins time: {}'.format(clock() - hash_ins_time)
     # Create shape file
     arcpy.CopyFeatures_management(output_fc, output_shape)
@@ -378,40 +404,12 @@ def create_changes_and_outputs(output_directory, input_feature, output_name, pas
 
 
 def download_zip(file_id, service, output):
-    import shutil
-    request = service.files().get_media(fileId=file_id)
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while done is False:
-        status, done = downloader.next_chunk()
-        print "Download %d%%." % int(status.progress() * 100)
-    fh.seek(0)
-    with open(output, 'wb') as out_zip:
-        shutil.copyfileobj(fh, out_zip, length=131072)
+    download_file(service, file_id, output)
     print 'done'
 
 
 def update_file(file_id, local_file, drive_service):
-    media_body = MediaFileUpload(local_file,
-                                 mimetype='application/zip',
-                                 resumable=True)
-
-    # file = drive_service.files().get(fileId=self.file_id, fields='').execute()
-    # print file
-    # file_metadata = {'name': self.name}
-
-    # request = service.files().create(body=file_metadata,
-    #                                  media_body=media_body,
-    #                                  fields="id")
-    request = drive_service.files().update(fileId=file_id,
-                                           media_body=media_body)
-
-    response = None
-    while response is None:
-        status, response = request.next_chunk()
-    #   if status :
-    #     print('{} percent {}'.format(name, int(status.progress() * 100)))
+    response = upload_file(drive_service, local_file, file_id=file_id)
 
     return response.get('id')
 
@@ -421,18 +419,7 @@ def create_drive_zip(name, parent_ids, local_file, service):
     file_metadata = {'name': name,
                      'mimeType': 'application/zip',
                      'parents': parent_ids}
-
-    media_body = MediaFileUpload(local_file,
-                                 mimetype='application/zip',
-                                 resumable=True)
-    request = service.files().create(body=file_metadata,
-                                     media_body=media_body,
-                                     fields="id")
-    response = None
-    while response is None:
-        status, response = request.next_chunk()
-    #   if status :
-    #     print('{} percent {}'.format(name, int(status.progress() * 100)))
+    response = upload_file(service, local_file, body=file_metadata)
 
     return response.get('id')
 
@@ -466,15 +453,35 @@ def create_drive_folder(name, parent_ids, service):
     return response.get('id')
 
 
-def load_zip_to_drive(spec, id_key, new_zip, parent_folder_ids, service):
+def get_drive_md5(file_id, service, remote_mirror=None):
+    if remote_mirror and remote_mirror.get(file_id):
+        return remote_mirror.md5(file_id)
+    try:
+        response = service.files().get(fileId=file_id, fields='md5Checksum').execute()
+    except errors.HttpError:
+        return None
+
+    return response.get('md5Checksum')
+
+
+def load_zip_to_drive(spec, id_key, new_zip, parent_folder_ids, service, remote_mirror=None):
+    new_zip_md5 = md5_file(new_zip)
     if spec[id_key]:
+        if get_drive_md5(spec[id_key], service, remote_mirror) == new_zip_md5:
+            print '{} unchanged, upload skipped'.format(ntpath.basename(new_zip))
+            return
+        upload_start = time()
         update_file(spec[id_key], new_zip, service)
     else:
+        upload_start = time()
         temp_id = create_drive_zip(ntpath.basename(new_zip),
                                    parent_folder_ids,
                                    new_zip,
                                    service)
         spec[id_key] = temp_id
+    run_plan.record_upload(os.path.getsize(new_zip), time() - upload_start)
+    if remote_mirror:
+        remote_mirror.record_upload(spec[id_key], os.path.getsize(new_zip), new_zip_md5)
 
 
 def get_category_folder_id(category, parent_id, service):
@@ -493,58 +500,191 @@ def load_feature_json(json_path):
     return feature
 
 
-def save_spec_json(json_path, spec):
-    with open(json_path, 'w') as f_out:
-        spec['upload_date'] = strftime("%Y_%m_%d")
-        f_out.write(json.dumps(spec, sort_keys=True, indent=4))
-
-
 def valitdate_spec(spec):
     if "" in spec['parent_ids']:
         raise Exception('Invalid spec: {}'.format(spec))
 
 
+def probe_fields(describe, input_feature_path):
+    '''
+    The editor tracking last edit date when the feature keeps one, otherwise
+    every plain attribute and the centroid, length and area of the shape.'''
+    if getattr(describe, 'editorTrackingEnabled', False) and describe.lastEditDateFieldName:
+        return ['OID@', describe.lastEditDateFieldName]
+    fields = ['OID@'] + [field.name for field in arcpy.ListFields(input_feature_path)
+                         if field.type not in PROBE_SKIPPED_TYPES]
+    if getattr(describe, 'shapeType', None):
+        fields.extend(PROBE_SHAPE_TOKENS)
+
+    return fields
+
+
+def probe_feature(input_feature_path):
+    '''
+    Change probe covering every row: a hash of the probe_fields of each row
+    by OBJECTID. It skips geometry text, so it reads far less than the full
+    row hash. Used to plan runs, not to detect changes; run_plan also plans
+    a full rebuild of features that have not been rebuilt for a while.'''
+    describe = arcpy.Describe(input_feature_path)
+    hasher = md5()
+    sql_clause = (None, 'ORDER BY {}'.format(describe.OIDFieldName))
+    with arcpy.da.SearchCursor(input_feature_path, probe_fields(describe, input_feature_path),
+                               sql_clause=sql_clause) as cursor:
+        for row in cursor:
+            hasher.update(repr(row))
+
+    return hasher.hexdigest()
+
+
+def get_remote_sizes(drive_service, spec_store):
+    '''
+    {drive file id: bytes} for every spec artifact from the remote mirror.'''
+    remote_mirror = open_remote_mirror(drive_service, spec_store.drive_file_ids())
+    remote_mirror.save()
+
+    return remote_mirror.sizes()
+
+
+def plan_catalog(workspace, drive_service, spec_store, plan_json):
+    probes = {}
+    for spec_name in spec_store.feature_names():
+        sgid_name = spec_store.get_feature(spec_name)['sgid_name']
+        probes[sgid_name] = probe_feature(os.path.join(workspace, sgid_name))
+    plan = run_plan.build_plan(spec_store, probes, get_remote_sizes(drive_service, spec_store))
+    run_plan.print_plan(plan)
+    run_plan.save_plan(plan_json, plan)
+
+    return plan
+
+
+def prefetch_past_hashes(sgid_names, spec_store, drive_service, remote_mirror, workers=PREFETCH_WORKERS):
+    '''
+    Start downloading the past hash zips of every feature in sgid_names.'''
+    hash_ids = []
+    for sgid_name in sgid_names:
+        feature = spec_store.get_feature(create_feature_spec_name(sgid_name))
+        if feature and feature.get('hash_id'):
+            hash_ids.append(feature['hash_id'])
+
+    return HashPrefetcher(drive_service, remote_mirror, workers=workers).start(hash_ids)
+
+
+def retain_package_members(scratch, spec_store, package_names, sgid_names):
+    '''
+    Hold the workspace of each feature in sgid_names once for every package
+    in package_names that is built from it.'''
+    for package_name in package_names:
+        for sgid_name in spec_store.features_in_package(spec_stem(package_name)):
+            if sgid_name in sgid_names:
+                scratch.retain(feature_scratch_name(sgid_name))
+
+
+def execute_plan(plan_json, workspace, scratch, drive_service, spec_store,
+                 remote_mirror=None, prefetch_workers=PREFETCH_WORKERS):
+    plan = run_plan.load_plan(plan_json)
+    run_plan.print_plan(plan)
+    retain_package_members(scratch, spec_store, plan['packages'], plan['features'])
+    hash_prefetcher = None
+    if remote_mirror:
+        hash_prefetcher = prefetch_past_hashes(plan['features'], spec_store, drive_service, remote_mirror,
+                                               prefetch_workers)
+    for sgid_name in plan['features']:
+        update_feature(workspace, sgid_name, scratch, drive_service, spec_store, remote_mirror,
+                       hash_prefetcher, plan['probes'].get(sgid_name))
+    if hash_prefetcher:
+        hash_prefetcher.close()
+    for package_name in plan['packages']:
+        update_package(workspace, package_name, scratch, drive_service, spec_store, remote_mirror)
+    spec_store.export_json()
+
+
 def create_feature_spec_name(feature_class):
     spec_name = '_'.join(feature_class.split('.')[-2:]) + '.json'
     return spec_name
 
 
-def update_feature(workspace, feature_name, output_directory, drive_service):
+def feature_scratch_name(feature_class):
+    return '_'.join(feature_class.split('.')[-2:])
+
+
+def package_scratch_name(package_name):
+    return 'package_' + package_name
+
+
+def estimate_scratch_bytes(feature, remote_mirror=None):
+    '''
+    Scratch space a feature run needs: what the last run measured, or its
+    drive artifacts expanded by SCRATCH_EXPANSION.'''
+    if feature.get('scratch_bytes'):
+        return feature['scratch_bytes']
+    artifact_bytes = 0
+    if remote_mirror:
+        for id_key in ('gdb_id', 'shape_id', 'hash_id'):
+            if feature.get(id_key):
+                artifact_bytes += remote_mirror.size(feature[id_key]) or 0
+
+    return artifact_bytes * SCRATCH_EXPANSION or DEFAULT_SCRATCH_BYTES
+
+
+def update_feature(workspace, feature_name, scratch, drive_service, spec_store, remote_mirror=None,
+                   hash_prefetcher=None, probe=None):
+    '''
+    probe is the change probe plan_catalog took of the feature. Runs that
+    were not planned do not probe, they drop the stored probe instead so
+    the next plan can not match it against outputs built from other data.'''
     print '\nStarting feature:', feature_name
     empty_spec = os.path.join('features', 'template.json')
     input_feature_path = os.path.join(workspace, feature_name)
-    spec_name = '_'.join(feature_name.split('.')[-2:]) + '.json'
-    feature_spec = os.path.join('features', spec_name)
+    spec_name = create_feature_spec_name(feature_name)
 
-    feature = None
-    if not os.path.exists(feature_spec):
+    feature = spec_store.get_feature(spec_name)
+    if feature is None:
         feature = load_feature_json(empty_spec)
         feature['sgid_name'] = feature_name
         feature['name'] = input_feature_path.split('.')[-1]
         feature['category'] = input_feature_path.split('.')[-2]
+    process_start = time()
+    if probe:
+        feature['probe'] = probe
     else:
-        feature = load_feature_json(feature_spec)
+        feature.pop('probe', None)
 
     # Check for category folder
     category_id = get_category_folder_id(feature['category'], UTM_DRIVE_FOLDER, drive_service)
     if category_id not in feature['parent_ids']:
         feature['parent_ids'].append(category_id)
 
+    scratch_name = feature_scratch_name(feature_name)
+    output_directory = scratch.acquire(scratch_name, estimate_scratch_bytes(feature, remote_mirror), hot=True)
+    try:
+        _build_feature(feature, input_feature_path, output_directory, drive_service, remote_mirror, hash_prefetcher)
+        feature['process_seconds'] = round(time() - process_start, 1)
+        feature['scratch_bytes'] = directory_size(output_directory)
+        spec_store.save_feature(spec_name, feature)
+    finally:
+        scratch.release(scratch_name)
+
+
+def _build_feature(feature, input_feature_path, output_directory, drive_service, remote_mirror, hash_prefetcher):
     output_name = feature['name']
 
     # Get the last hash from drive to check changes
     past_hash_directory = os.path.join(output_directory, 'pasthashes')
     hash_field = 'hash'
     past_hash_zip = os.path.join(output_directory, 'TrailsDown.zip')
-    past_hash_store = os.path.join(past_hash_directory, output_name + '_hash', output_name + '_hashes.csv')
-    past_hashes = None
+    past_hashes = {}
+    past_store = None
     if feature['hash_id']:
-        download_zip(feature['hash_id'], drive_service, past_hash_zip)
+        if hash_prefetcher:
+            past_hash_zip = hash_prefetcher.get(feature['hash_id'])
+        else:
+            download_zip(feature['hash_id'], drive_service, past_hash_zip)
         print 'Past hashes downloaded'
         unzip(past_hash_zip, past_hash_directory)
-        past_hashes = get_hash_lookup(past_hash_store, hash_field)
-    else:
-        past_hashes = {}
+        past_hash_store = find_hash_store(os.path.join(past_hash_directory, output_name + '_hash'), output_name)
+        if past_hash_store:
+            past_store = read_hash_store(past_hash_store)
+            past_hashes = hash_lookup(past_store)
 
     # Copy data local and check for changes
     fc_directory, shape_directory, hash_directory = create_changes_and_outputs(
@@ -552,7 +692,8 @@ def update_feature(workspace, feature_name, output_directory, drive_service):
                                                                              input_feature_path,
                                                                              output_name,
                                                                              past_hashes,
-                                                                             hash_field)
+                                                                             hash_field,
+                                                                             past_store)
 
     # Zip up outputs
     new_gdb_zip = os.path.join(output_directory, '{}_gdb.zip'.format(output_name))
@@ -562,111 +703,327 @@ def update_feature(workspace, feature_name, output_directory, drive_service):
     zip_folder(fc_directory, new_gdb_zip)
     zip_folder(shape_directory, new_shape_zip)
     zip_folder(hash_directory, new_hash_zip)
+    #: the hash store covers every attribute and shape, packages use it to find changed members
+    feature['content_hash'] = md5_file(os.path.join(hash_directory, HASH_STORE_NAME.format(output_name)))
     # Upload to drive
-    load_zip_to_drive(feature, 'gdb_id', new_gdb_zip, feature['parent_ids'], drive_service)
+    load_zip_to_drive(feature, 'gdb_id', new_gdb_zip, feature['parent_ids'], drive_service, remote_mirror)
     print 'GDB loaded'
-    load_zip_to_drive(feature, 'shape_id', new_shape_zip, feature['parent_ids'], drive_service)
+    load_zip_to_drive(feature, 'shape_id', new_shape_zip, feature['parent_ids'], drive_service, remote_mirror)
     print 'Shape loaded'
-    load_zip_to_drive(feature, 'hash_id', new_hash_zip, [HASH_DRIVE_FOLDER], drive_service)
+    load_zip_to_drive(feature, 'hash_id', new_hash_zip, [HASH_DRIVE_FOLDER], drive_service, remote_mirror)
     print 'Hash loaded'
 
-    save_spec_json(feature_spec, feature)
 
+def load_build_manifest(build_directory):
+    '''
+    {member output name: content hash} of the last package build.'''
+    manifest_path = os.path.join(build_directory, BUILD_MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r') as manifest_file:
+        return json.load(manifest_file)['members']
 
-def update_package(workspace, package_name, output_directory, drive_service):
-    print '\nStarting package:', package_name
-    spec_name = package_name
-    if package_name.find('.json') == -1:
-        spec_name += '.json'
 
-    package_spec = os.path.join('packages', spec_name)
+def save_build_manifest(build_directory, members):
+    with open(os.path.join(build_directory, BUILD_MANIFEST_NAME), 'w') as manifest_file:
+        manifest_file.write(json.dumps({'members': members}, sort_keys=True, indent=4))
 
-    package = None
-    if not os.path.exists(package_spec):
-        raise Exception('Package spec does not exist at {}'.format(package_spec))
-    else:
-        package = load_feature_json(package_spec)
-    valitdate_spec(package)
-    # Check for category folder
-    category_id = get_category_folder_id(package['category'], UTM_DRIVE_FOLDER, drive_service)
-    category_packages_id = get_category_folder_id('packages', category_id, drive_service)
-    drive_folder_id = get_category_folder_id(package['name'], category_packages_id, drive_service)
-    if drive_folder_id not in package['parent_ids']:
-        package['parent_ids'].append(drive_folder_id)
 
-    package_gdb = arcpy.CreateFileGDB_management(output_directory, package['name'])[0]
-    package_shape = os.path.join(output_directory, package['name'])
-    os.makedirs(package_shape)
+def remove_package_member(package_gdb, package_shape, feature_output_name):
+    out_fc_path = os.path.join(package_gdb, feature_output_name)
+    if arcpy.Exists(out_fc_path):
+        arcpy.Delete_management(out_fc_path)
+    out_shape_directory = os.path.join(package_shape, feature_output_name)
+    if os.path.exists(out_shape_directory):
+        shutil.rmtree(out_shape_directory)
 
-    for feature_class in package['FeatureClasses']:
-        spec_name = create_feature_spec_name(feature_class)
-        feature_spec = os.path.join('features', spec_name)
-        if not os.path.exists(feature_spec):
-            update_feature(workspace, feature_class, os.path.join(output_directory, '..'), drive_service)
 
-        spec = load_feature_json(feature_spec)
-        if package_name not in spec['packages']:
-            spec['packages'].append(package_name)
-            save_spec_json(feature_spec, spec)
+def create_drive_shortcut(service, parent_id, name, target_id):
+    file_metadata = {'name': name,
+                     'mimeType': SHORTCUT_MIME_TYPE,
+                     'parents': [parent_id],
+                     'shortcutDetails': {'targetId': target_id}}
+    shortcut = service.files().create(body=file_metadata, fields='id').execute()
+
+    return shortcut.get('id')
+
 
+def trash_drive_file(service, file_id):
+    try:
+        service.files().update(fileId=file_id, body={'trashed': True}).execute()
+    except errors.HttpError, error:
+        print 'Could not trash {}: {}'.format(file_id, error)
+
+
+def write_package_manifest(manifest_zip, package, members, own_members):
+    manifest = {'name': package['name'],
+                'category': package['category'],
+                'members': members,
+                'included': own_members}
+    zf = zipfile.ZipFile(manifest_zip, 'w', zipfile.ZIP_DEFLATED)
+    write_reproducible_data(zf, '{}/manifest.json'.format(package['name']),
+                            json.dumps(manifest, sort_keys=True, indent=4))
+    zf.close()
+
+
+def publish_package_references(package, feature_specs, drive_folder_id, build_directory, drive_service,
+                               remote_mirror=None):
+    '''
+    Point a reference package at the gdb and shape zips its members already
+    publish, with a drive shortcut to each and a manifest zip listing them.
+    Returns the (feature_class, spec) members that are not published on
+    their own and still need package bytes.'''
+    shortcut_ids = package.setdefault('shortcut_ids', {})
+    members = []
+    own_specs = []
+    targets = set()
+    for feature_class, spec in feature_specs:
+        if not spec.get('gdb_id') or not spec.get('shape_id'):
+            own_specs.append((feature_class, spec))
+            continue
+        member = {'sgid_name': feature_class}
+        for id_key, suffix in (('gdb_id', '_gdb.zip'), ('shape_id', '_shp.zip')):
+            target_id = spec[id_key]
+            targets.add(target_id)
+            if target_id not in shortcut_ids:
+                shortcut_ids[target_id] = create_drive_shortcut(drive_service, drive_folder_id,
+                                                                spec['name'] + suffix, target_id)
+            member[id_key] = target_id
+            member[id_key.replace('_id', '_link')] = DOWNLOAD_LINK.format(target_id)
+        members.append(member)
+    for target_id in set(shortcut_ids) - targets:
+        trash_drive_file(drive_service, shortcut_ids.pop(target_id))
+    print 'Referenced members: {} included members: {}'.format(len(members), len(own_specs))
+
+    manifest_zip = os.path.join(build_directory, '{}_manifest.zip'.format(package['name']))
+    write_package_manifest(manifest_zip, package, members, [feature_class for feature_class, spec in own_specs])
+    package.setdefault('manifest_id', '')
+    load_zip_to_drive(package, 'manifest_id', manifest_zip, package['parent_ids'], drive_service, remote_mirror)
+    print 'Manifest loaded'
+
+    return own_specs
+
+
+def remove_package_references(package, drive_service):
+    '''Trash the member shortcuts of a package that is no longer in reference format.'''
+    shortcut_ids = package.pop('shortcut_ids', None) or {}
+    for shortcut_id in shortcut_ids.values():
+        trash_drive_file(drive_service, shortcut_id)
+    if shortcut_ids:
+        print 'Removed member shortcuts: {}'.format(len(shortcut_ids))
+
+
+def build_package_zips(workspace, package, feature_specs, build_directory, scratch):
+    '''
+    Bring the package gdb and shape folder in build_directory up to date
+    with feature_specs and return the updated (gdb zip, shape zip).'''
+    built_members = load_build_manifest(build_directory)
+    package_gdb = os.path.join(build_directory, package['name'] + '.gdb')
+    if not arcpy.Exists(package_gdb):
+        arcpy.CreateFileGDB_management(build_directory, package['name'])
+        built_members = {}
+    package_shape = os.path.join(build_directory, package['name'])
+    if not os.path.exists(package_shape):
+        os.makedirs(package_shape)
+        built_members = {}
+
+    members = {}
+    unchanged_prefixes = []
+    for feature_class, spec in feature_specs:
         feature_output_name = spec['name']
         out_fc_path = os.path.join(package_gdb, feature_output_name)
-
-        shape_directory_path = os.path.join(output_directory, '..', feature_output_name)
-        fc_path = os.path.join(shape_directory_path + '.gdb', feature_output_name)
-        if os.path.exists(shape_directory_path) and arcpy.Exists(fc_path):
+        out_shape_directory = os.path.join(package_shape, feature_output_name)
+        members[feature_output_name] = spec.get('content_hash') or spec.get('probe')
+        if members[feature_output_name] and built_members.get(feature_output_name) == members[feature_output_name] \
+                and arcpy.Exists(out_fc_path) and os.path.exists(out_shape_directory):
+            print feature_class, 'unchanged'
+            unchanged_prefixes.append('{}/{}/'.format(package['name'], feature_output_name))
+            scratch.release(feature_scratch_name(feature_class))
+            continue
+        remove_package_member(package_gdb, package_shape, feature_output_name)
+
+        # Member outputs are still in scratch when this run built them
+        feature_directory = scratch.path(feature_scratch_name(feature_class))
+        if feature_directory:
+            shape_directory_path = os.path.join(feature_directory, feature_output_name)
+            fc_path = os.path.join(shape_directory_path + '.gdb', feature_output_name)
+        if feature_directory and os.path.exists(shape_directory_path) and arcpy.Exists(fc_path):
             print feature_class, 'local'
             arcpy.CopyFeatures_management(fc_path,
                                           out_fc_path)
 
-            shutil.copytree(shape_directory_path, os.path.join(package_shape, feature_output_name))
+            shutil.copytree(shape_directory_path, out_shape_directory)
 
         else:
             print feature_class, 'workspace'
             arcpy.CopyFeatures_management(os.path.join(workspace, feature_class),
                                           out_fc_path)
 
-            s_dir = os.path.join(package_shape, feature_output_name)
-            os.makedirs(s_dir)
+            os.makedirs(out_shape_directory)
             arcpy.CopyFeatures_management(os.path.join(workspace, feature_class),
-                                          os.path.join(s_dir, feature_output_name))
+                                          os.path.join(out_shape_directory, feature_output_name))
+        scratch.release(feature_scratch_name(feature_class))
+
+    for feature_output_name in set(built_members) - set(members):
+        print feature_output_name, 'removed'
+        remove_package_member(package_gdb, package_shape, feature_output_name)
 
     # Zip up outputs
     print
-    new_gdb_zip = os.path.join(output_directory, '{}_gdb.zip'.format(package['name']))
-    new_shape_zip = os.path.join(output_directory, '{}_shp.zip'.format(package['name']))
+    new_gdb_zip = os.path.join(build_directory, '{}_gdb.zip'.format(package['name']))
+    new_shape_zip = os.path.join(build_directory, '{}_shp.zip'.format(package['name']))
+
+    update_zip(package_gdb, new_gdb_zip)
+    update_zip(package_shape, new_shape_zip, unchanged_prefixes)
+    save_build_manifest(build_directory, members)
+
+    return new_gdb_zip, new_shape_zip
+
+
+def update_package(workspace, package_name, scratch, drive_service, spec_store, remote_mirror=None):
+    '''
+    A package spec with "format": "reference" publishes a manifest and drive
+    shortcuts to its members' own zips. Full gdb and shape zips published
+    before keep every member so their links still work, unless the spec
+    sets "retire_full_zips": true. Then they only hold members that are not
+    published on their own, and are trashed once there are none.'''
+    print '\nStarting package:', package_name
+    package_name = spec_stem(package_name)
+
+    package = spec_store.get_package(package_name)
+    if package is None:
+        raise Exception('Package spec does not exist for {}'.format(package_name))
+    valitdate_spec(package)
+    # Check for category folder
+    category_id = get_category_folder_id(package['category'], UTM_DRIVE_FOLDER, drive_service)
+    category_packages_id = get_category_folder_id('packages', category_id, drive_service)
+    drive_folder_id = get_category_folder_id(package['name'], category_packages_id, drive_service)
+    if drive_folder_id not in package['parent_ids']:
+        package['parent_ids'].append(drive_folder_id)
+
+    feature_specs = []
+    for feature_class in package['FeatureClasses']:
+        spec_name = create_feature_spec_name(feature_class)
+        spec = spec_store.get_feature(spec_name)
+        if spec is None:
+            scratch.retain(feature_scratch_name(feature_class))
+            update_feature(workspace, feature_class, scratch, drive_service, spec_store, remote_mirror)
+            spec = spec_store.get_feature(spec_name)
+
+        if package_name not in spec['packages']:
+            spec_store.add_package_member(package_name, feature_class)
+        feature_specs.append((feature_class, spec))
+
+    # The build directory is kept between runs but counts against the scratch budget while in use
+    build_directory = os.path.join(PACKAGE_BUILD_DIRECTORY, package['name'])
+    scratch_name = package_scratch_name(package['name'])
+    scratch.acquire(scratch_name, estimate_package_scratch_bytes(build_directory, feature_specs, remote_mirror),
+                    path=build_directory)
+    try:
+        _build_package(workspace, package, feature_specs, build_directory, drive_folder_id, scratch,
+                       drive_service, remote_mirror)
+    finally:
+        scratch.release(scratch_name)
+
+    spec_store.save_package(package_name, package)
+
+
+def estimate_package_scratch_bytes(build_directory, feature_specs, remote_mirror=None):
+    '''
+    Scratch a package build needs: what its build directory holds now, or
+    what its members needed.'''
+    return directory_size(build_directory) or \
+        sum(estimate_scratch_bytes(spec, remote_mirror) for feature_class, spec in feature_specs)
+
+
+def _build_package(workspace, package, feature_specs, build_directory, drive_folder_id, scratch,
+                   drive_service, remote_mirror):
+    own_specs = feature_specs
+    if package.get('format') == REFERENCE_FORMAT:
+        unpublished_specs = publish_package_references(package, feature_specs, drive_folder_id, build_directory,
+                                                       drive_service, remote_mirror)
+        has_full_zips = package.get('gdb_id') or package.get('shape_id')
+        if package.get(RETIRE_FULL_ZIPS_KEY) or not has_full_zips:
+            own_specs = unpublished_specs
+            for feature_class, spec in feature_specs:
+                if (feature_class, spec) not in own_specs:
+                    scratch.release(feature_scratch_name(feature_class))
+    else:
+        remove_package_references(package, drive_service)
+
+    if own_specs:
+        new_gdb_zip, new_shape_zip = build_package_zips(workspace, package, own_specs, build_directory, scratch)
+        # Upload to drive
+        load_zip_to_drive(package, 'gdb_id', new_gdb_zip, package['parent_ids'], drive_service, remote_mirror)
+        print 'GDB loaded'
+        load_zip_to_drive(package, 'shape_id', new_shape_zip, package['parent_ids'], drive_service, remote_mirror)
+        print 'Shape loaded'
+    else:
+        # Every member is referenced and the spec retires its full zips, copies from before would go stale
+        for id_key in ('gdb_id', 'shape_id'):
+            if package.get(id_key):
+                trash_drive_file(drive_service, package[id_key])
+                package[id_key] = ''
 
-    zip_folder(package_gdb, new_gdb_zip)
-    zip_folder(package_shape, new_shape_zip)
-    # Upload to drive
-    load_zip_to_drive(package, 'gdb_id', new_gdb_zip, package['parent_ids'], drive_service)
-    print 'GDB loaded'
-    load_zip_to_drive(package, 'shape_id', new_shape_zip, package['parent_ids'], drive_service)
-    print 'Shape loaded'
 
-    save_spec_json(package_spec, package)
+def run_catalog_worker(queue_path, workspace, scratch, drive_service, spec_store,
+                       worker_id=None, remote_mirror=None):
+    '''
+    Work through a shared catalog queue. The first worker to open the queue
+    fills it from the spec store; later workers and restarts only claim
+    what is not done yet. spec_store has to be the store shared by every
+    host, see shared_spec_db, so once the queue drains each host exports
+    the same specs.'''
+    queue = WorkQueue(queue_path)
+    queue.enqueue_catalog(spec_store)
+    handlers = {
+        'feature': lambda name: update_feature(workspace, name, scratch, drive_service, spec_store, remote_mirror),
+        'package': lambda name: update_package(workspace, name, scratch, drive_service, spec_store, remote_mirror)
+    }
+    run_worker(queue, handlers, worker_id)
+    spec_store.export_json()
 
 
 if __name__ == '__main__':
     drive_service = setup_drive_service()
+    if flags and flags.spec_db:
+        spec_store = open_spec_store(flags.spec_db)
+    elif flags and flags.queue:
+        spec_store = open_spec_store(shared_spec_db(flags.queue))
+    else:
+        spec_store = open_spec_store()
     # -------------Set these to test--------------------
     workspace = r'Database Connections\Connection to sgid.agrc.utah.gov.sde'
     # feature_name = 'SGID10.RECREATION.Trailheads'
     output_directory = r'package_temp'
-    temp_package_directory = os.path.join(output_directory, 'output_packages')
-
-    def renew_temp_directory(directory, package_dir):
-        if not os.path.exists(directory):
-            os.makedirs(temp_package_directory)
-        else:
-            shutil.rmtree(directory)
-            print 'Temp directory removed'
-            os.makedirs(package_dir)
-    renew_temp_directory(output_directory, temp_package_directory)
+    if flags:
+        scratch = ScratchManager(output_directory, int(flags.scratch_budget_gb * GIGABYTE), flags.tmpfs,
+                                 int(flags.tmpfs_budget_gb * GIGABYTE))
+    else:
+        scratch = ScratchManager(output_directory)
 
     start_time = clock()
 
-    update_feature(workspace, 'SGID10.RECREATION.SkiTrails_XC', output_directory, drive_service)
-    update_package(workspace, 'SkiAreas', temp_package_directory, drive_service)
-    # update_package(workspace, 'Trails.json', temp_package_directory, drive_service)
-    print '\nComplete!', clock() - start_time
+    if flags and flags.plan:
+        plan_catalog(workspace, drive_service, spec_store, flags.plan)
+    else:
+        remote_mirror = open_remote_mirror(drive_service, spec_store.drive_file_ids())
+        if flags and flags.execute_plan:
+            execute_plan(flags.execute_plan, workspace, scratch, drive_service, spec_store, remote_mirror,
+                         flags.prefetch_workers)
+        elif flags and flags.queue:
+            run_catalog_worker(flags.queue, workspace, scratch, drive_service, spec_store, flags.worker_id,
+                               remote_mirror)
+        else:
+            hash_prefetcher = prefetch_past_hashes(['SGID10.RECREATION.SkiTrails_XC'], spec_store, drive_service,
+                                                   remote_mirror,
+                                                   flags.prefetch_workers if flags else PREFETCH_WORKERS)
+            retain_package_members(scratch, spec_store, ['SkiAreas'], ['SGID10.RECREATION.SkiTrails_XC'])
+            update_feature(workspace, 'SGID10.RECREATION.SkiTrails_XC', scratch, drive_service, spec_store,
+                           remote_mirror, hash_prefetcher)
+            hash_prefetcher.close()
+            update_package(workspace, 'SkiAreas', scratch, drive_service, spec_store, remote_mirror)
+            # update_package(workspace, 'Trails.json', scratch, drive_service, spec_store, remote_mirror)
+            spec_store.export_json()
+        remote_mirror.save()
+        print '\nComplete!', clock() - start_time
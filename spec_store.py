@@ -0,0 +1,271 @@
+from __future__ import print_function
+import os
+import glob
+import json
+import sqlite3
+from contextlib import contextmanager
+from time import strftime
+
+SPEC_DB = 'specs.sqlite'
+FEATURE_DIRECTORY = 'features'
+PACKAGE_DIRECTORY = 'packages'
+ID_KEYS = ('gdb_id', 'shape_id', 'hash_id')
+PACKAGE_ID_KEYS = ('gdb_id', 'shape_id', 'manifest_id')
+KIND_ID_KEYS = {'feature': ID_KEYS, 'package': PACKAGE_ID_KEYS}
+#: only reference format packages have a manifest, specs leave it out until it is set
+OPTIONAL_ID_KEYS = ('manifest_id',)
+ALL_ID_KEYS = ID_KEYS + OPTIONAL_ID_KEYS
+FEATURE_COLUMNS = ('sgid_name', 'name', 'category', 'upload_date')
+PACKAGE_COLUMNS = ('name', 'category', 'upload_date')
+LIST_KEYS = ('packages', 'FeatureClasses', 'parent_ids')
+#: change every run, so they stay in the database and out of the tracked JSON specs
+RUN_STAT_KEYS = ('probe', 'content_hash', 'process_seconds', 'scratch_bytes')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS features (
+    spec_name TEXT PRIMARY KEY,
+    sgid_name TEXT UNIQUE,
+    name TEXT,
+    category TEXT,
+    upload_date TEXT,
+    extra TEXT);
+CREATE TABLE IF NOT EXISTS packages (
+    spec_name TEXT PRIMARY KEY,
+    name TEXT,
+    category TEXT,
+    upload_date TEXT,
+    extra TEXT);
+CREATE TABLE IF NOT EXISTS memberships (
+    package TEXT,
+    sgid_name TEXT,
+    position INTEGER,
+    PRIMARY KEY (package, sgid_name));
+CREATE INDEX IF NOT EXISTS memberships_sgid_name ON memberships (sgid_name);
+CREATE TABLE IF NOT EXISTS drive_ids (
+    kind TEXT,
+    spec_name TEXT,
+    role TEXT,
+    position INTEGER,
+    file_id TEXT,
+    PRIMARY KEY (kind, spec_name, role, position));
+CREATE INDEX IF NOT EXISTS drive_ids_file_id ON drive_ids (file_id);
+'''
+
+
+def spec_stem(spec_name):
+    if spec_name.endswith('.json'):
+        return spec_name[:-len('.json')]
+    return spec_name
+
+
+class SpecStore(object):
+    """Feature and package specs in one SQLite database.
+
+    Every write runs in its own BEGIN IMMEDIATE transaction so several
+    workers can share the store without losing each other's updates.
+    Specs come back as the same dicts the JSON files in features/ and
+    packages/ hold; keys without a column round trip through extra.
+    """
+
+    def __init__(self, db_path=SPEC_DB, timeout=60):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+        self.connection.executescript(SCHEMA)
+
+    @contextmanager
+    def transaction(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield self.connection
+        except:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    def is_empty(self):
+        return not self.connection.execute('SELECT 1 FROM features UNION ALL SELECT 1 FROM packages LIMIT 1').fetchone()
+
+    def get_feature(self, spec_name):
+        spec_name = spec_stem(spec_name)
+        row = self.connection.execute('SELECT sgid_name, name, category, upload_date, extra FROM features WHERE spec_name = ?',
+                                      (spec_name,)).fetchone()
+        if not row:
+            return None
+        spec = json.loads(row[-1] or '{}')
+        spec.update((column, value) for column, value in zip(FEATURE_COLUMNS, row[:-1]) if value is not None)
+        spec.update(self._drive_ids('feature', spec_name))
+        spec['packages'] = self.packages_for_feature(spec['sgid_name'])
+
+        return spec
+
+    def get_package(self, spec_name):
+        spec_name = spec_stem(spec_name)
+        row = self.connection.execute('SELECT name, category, upload_date, extra FROM packages WHERE spec_name = ?',
+                                      (spec_name,)).fetchone()
+        if not row:
+            return None
+        spec = json.loads(row[-1] or '{}')
+        spec.update((column, value) for column, value in zip(PACKAGE_COLUMNS, row[:-1]) if value is not None)
+        spec.update(self._drive_ids('package', spec_name))
+        spec['FeatureClasses'] = self.features_in_package(spec_name)
+
+        return spec
+
+    def _drive_ids(self, kind, spec_name):
+        ids = dict((role, '') for role in KIND_ID_KEYS[kind] if role not in OPTIONAL_ID_KEYS)
+        ids['parent_ids'] = []
+        for role, file_id in self.connection.execute('''SELECT role, file_id FROM drive_ids
+                                                        WHERE kind = ? AND spec_name = ? ORDER BY role, position''',
+                                                     (kind, spec_name)):
+            if role == 'parent_ids':
+                ids['parent_ids'].append(file_id)
+            else:
+                ids[role] = file_id
+
+        return ids
+
+    def save_feature(self, spec_name, spec, stamp=True):
+        with self.transaction():
+            self._write_feature(spec_stem(spec_name), spec, stamp)
+
+    def save_package(self, spec_name, spec, stamp=True):
+        with self.transaction():
+            self._write_package(spec_stem(spec_name), spec, stamp)
+
+    def _write_feature(self, spec_name, spec, stamp):
+        if stamp:
+            spec['upload_date'] = strftime("%Y_%m_%d")
+        self.connection.execute('INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?, ?)',
+                                (spec_name,) + tuple(spec.get(column) for column in FEATURE_COLUMNS) +
+                                (self._extra(spec, FEATURE_COLUMNS, ID_KEYS),))
+        self._write_drive_ids('feature', spec_name, spec)
+        for package in spec.get('packages', []):
+            self.connection.execute('INSERT OR IGNORE INTO memberships VALUES (?, ?, NULL)',
+                                    (spec_stem(package), spec['sgid_name']))
+
+    def _write_package(self, spec_name, spec, stamp):
+        if stamp:
+            spec['upload_date'] = strftime("%Y_%m_%d")
+        self.connection.execute('INSERT OR REPLACE INTO packages VALUES (?, ?, ?, ?, ?)',
+                                (spec_name,) + tuple(spec.get(column) for column in PACKAGE_COLUMNS) +
+                                (self._extra(spec, PACKAGE_COLUMNS, PACKAGE_ID_KEYS),))
+        self._write_drive_ids('package', spec_name, spec)
+        self.connection.execute('UPDATE memberships SET position = NULL WHERE package = ?', (spec_name,))
+        for position, sgid_name in enumerate(spec.get('FeatureClasses', [])):
+            self.connection.execute('INSERT OR REPLACE INTO memberships VALUES (?, ?, ?)',
+                                    (spec_name, sgid_name, position))
+
+    def _write_drive_ids(self, kind, spec_name, spec):
+        self.connection.execute('DELETE FROM drive_ids WHERE kind = ? AND spec_name = ?', (kind, spec_name))
+        rows = [(kind, spec_name, role, 0, spec[role]) for role in KIND_ID_KEYS[kind] if spec.get(role)]
+        rows.extend((kind, spec_name, 'parent_ids', position, file_id)
+                    for position, file_id in enumerate(spec.get('parent_ids', [])))
+        self.connection.executemany('INSERT INTO drive_ids VALUES (?, ?, ?, ?, ?)', rows)
+
+    @staticmethod
+    def _extra(spec, columns, id_keys):
+        extra = dict((key, value) for key, value in spec.items()
+                     if key not in columns and key not in id_keys and key not in LIST_KEYS)
+        if not extra:
+            return None
+        return json.dumps(extra, sort_keys=True)
+
+    def add_package_member(self, package_name, sgid_name):
+        """Record that a feature belongs to a package without rewriting either spec."""
+        with self.transaction():
+            self.connection.execute('INSERT OR IGNORE INTO memberships VALUES (?, ?, NULL)',
+                                    (spec_stem(package_name), sgid_name))
+
+    def features_in_package(self, package_name):
+        """FeatureClasses of a package in spec order."""
+        return [row[0] for row in self.connection.execute('''SELECT sgid_name FROM memberships
+                                                             WHERE package = ? AND position IS NOT NULL
+                                                             ORDER BY position''',
+                                                          (spec_stem(package_name),))]
+
+    def packages_for_feature(self, sgid_name):
+        return [row[0] for row in self.connection.execute('SELECT package FROM memberships WHERE sgid_name = ? ORDER BY rowid',
+                                                          (sgid_name,))]
+
+    def find_drive_id(self, file_id):
+        """(kind, spec_name, role) rows that reference a drive file id."""
+        return self.connection.execute('SELECT kind, spec_name, role FROM drive_ids WHERE file_id = ?',
+                                       (file_id,)).fetchall()
+
+    def drive_file_ids(self, roles=ALL_ID_KEYS):
+        return [row[0] for row in self.connection.execute('''SELECT DISTINCT file_id FROM drive_ids
+                                                             WHERE role IN ({}) ORDER BY file_id'''.format(
+                                                                 ', '.join('?' * len(roles))),
+                                                          tuple(roles))]
+
+    def feature_names(self):
+        return [row[0] for row in self.connection.execute('SELECT spec_name FROM features ORDER BY spec_name')]
+
+    def package_names(self):
+        return [row[0] for row in self.connection.execute('SELECT spec_name FROM packages ORDER BY spec_name')]
+
+    def bulk_load(self, features=None, packages=None):
+        """Write many {spec_name: spec} dicts in a single transaction."""
+        with self.transaction():
+            self._write_all(features, packages)
+
+    def _write_all(self, features, packages):
+        for spec_name, spec in (features or {}).items():
+            self._write_feature(spec_stem(spec_name), spec, stamp=False)
+        for spec_name, spec in (packages or {}).items():
+            self._write_package(spec_stem(spec_name), spec, stamp=False)
+
+    def import_json(self, feature_directory=FEATURE_DIRECTORY, package_directory=PACKAGE_DIRECTORY, only_empty=False):
+        """Load the JSON specs. With only_empty, skip it unless the store is empty.
+
+        The emptiness check and the load share one transaction, so when
+        workers on several hosts open a new shared store only one seeds it.
+        """
+        features = _read_spec_directory(feature_directory)
+        packages = _read_spec_directory(package_directory)
+        with self.transaction():
+            if only_empty and not self.is_empty():
+                return False
+            self._write_all(features, packages)
+        print('Imported {} features and {} packages'.format(len(features), len(packages)))
+
+        return True
+
+    def export_json(self, feature_directory=FEATURE_DIRECTORY, package_directory=PACKAGE_DIRECTORY):
+        """Write every spec to its JSON file, leaving out the RUN_STAT_KEYS."""
+        for spec_name in self.feature_names():
+            _write_spec_json(os.path.join(feature_directory, spec_name + '.json'), self.get_feature(spec_name))
+        for spec_name in self.package_names():
+            _write_spec_json(os.path.join(package_directory, spec_name + '.json'), self.get_package(spec_name))
+
+
+def _read_spec_directory(spec_directory):
+    specs = {}
+    for json_path in glob.glob(os.path.join(spec_directory, '*.json')):
+        spec_name = spec_stem(os.path.basename(json_path))
+        if spec_name == 'template':
+            continue
+        with open(json_path, 'r') as json_file:
+            specs[spec_name] = json.load(json_file)
+
+    return specs
+
+
+def _write_spec_json(json_path, spec):
+    spec = dict((key, value) for key, value in spec.items() if key not in RUN_STAT_KEYS)
+    with open(json_path, 'w') as f_out:
+        f_out.write(json.dumps(spec, sort_keys=True, indent=4))
+
+
+def shared_spec_db(queue_path):
+    """Spec database kept next to a shared work queue so every host updates the same specs."""
+    return os.path.join(os.path.dirname(os.path.abspath(queue_path)), SPEC_DB)
+
+
+def open_spec_store(db_path=SPEC_DB):
+    """Open the store, seeding it from the JSON specs the first time."""
+    store = SpecStore(db_path)
+    if store.is_empty():
+        store.import_json(only_empty=True)
+
+    return store
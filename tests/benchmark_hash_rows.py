@@ -0,0 +1,63 @@
+"""Best of REPEATS rows per second of the original row at a time hash loop and of hash_row_blocks.
+
+Run from the repository root: python -m tests.benchmark_hash_rows [rows]
+Synthetic rows stand in for a SearchCursor, so only hashing and store
+writing are timed, not arcpy.
+"""
+from __future__ import print_function
+import csv
+import os
+import shutil
+import sys
+import tempfile
+from hashlib import md5
+from time import time
+
+from hash_store import HashStoreWriter, hash_row_blocks
+
+ATTRIBUTES = 12
+REPEATS = 5
+
+
+def synthetic_rows(count):
+    for number in xrange(count):
+        attributes = tuple('value {} {}'.format(field, number % 1000) for field in range(ATTRIBUTES))
+        wkt = 'LINESTRING ({0} {0}, {1} {1}, {2} {2})'.format(number, number + 1.5, number + 3.25)
+        yield attributes + ('SHAPE', number, (float(number), float(number)), wkt)
+
+
+def row_at_a_time(rows, store_path):
+    """The hash loop detect_changes ran before rows were hashed in blocks."""
+    with open(store_path, 'wb') as hash_csv:
+        hash_writer = csv.writer(hash_csv)
+        hash_writer.writerow(('src_id', 'hash', 'centroidxy'))
+        for row in rows:
+            hasher = md5()
+            hasher.update(str(row[:-4]))
+            hasher.update(row[-1] or 'No shape')
+            hash_writer.writerow((row[-3], hasher.hexdigest(), str(row[-2])))
+
+
+def in_blocks(rows, store_path):
+    with HashStoreWriter(store_path) as hash_writer:
+        for block_rows, src_ids, digests, xs, ys in hash_row_blocks(rows, ATTRIBUTES, 'SHAPE@WKT'):
+            hash_writer.add_block(src_ids, ''.join(digests), xs, ys)
+
+
+def main(row_count):
+    rows = list(synthetic_rows(row_count))
+    directory = tempfile.mkdtemp()
+    try:
+        for name, function in (('row at a time', row_at_a_time), ('blocks', in_blocks)):
+            seconds = None
+            for attempt in range(REPEATS):
+                start = time()
+                function(iter(rows), os.path.join(directory, name))
+                seconds = min(seconds or float('inf'), time() - start)
+            print('{}: {:.0f} rows/s'.format(name, row_count / seconds))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
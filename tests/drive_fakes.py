@@ -0,0 +1,249 @@
+"""In memory stand in for the parts of the drive v3 service the scripts use."""
+import re
+import itertools
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+
+class FakeResponse(object):
+
+    def __init__(self, status):
+        self.status = status
+        self.reason = ''
+
+
+class FakeHttpError(Exception):
+
+    def __init__(self, status):
+        Exception.__init__(self, status)
+        self.resp = FakeResponse(status)
+        self.content = ''
+
+
+class FakeHttpResponse(dict):
+
+    def __init__(self, status, headers=None):
+        dict.__init__(self, headers or {})
+        self['status'] = str(status)
+        self.status = status
+        self.reason = ''
+
+
+class FakeMediaHttp(object):
+    """Serves ranged GETs of one file's bytes like drive's media download."""
+
+    def __init__(self, drive, data):
+        self.drive = drive
+        self.data = data
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        self.drive.media_requests += 1
+        start, end = [int(value) for value in re.match(r'bytes=(\d+)-(\d+)', headers['range']).groups()]
+        end = min(end, len(self.data) - 1)
+        content_range = 'bytes {}-{}/{}'.format(start, end, len(self.data))
+        return FakeHttpResponse(206, {'content-range': content_range}), self.data[start:end + 1]
+
+
+class FakeMediaRequest(object):
+
+    def __init__(self, drive, data):
+        self.uri = 'https://www.googleapis.com/drive/v3/files/media'
+        self.headers = {}
+        self.http = FakeMediaHttp(drive, data)
+
+
+class FakeRequest(object):
+
+    def __init__(self, function, method='', body=None):
+        self.function = function
+        self.method = method
+        self.body = body
+
+    def execute(self):
+        return self.function()
+
+
+class FakeBatch(object):
+
+    def __init__(self, drive):
+        self.drive = drive
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request, callback, request_id))
+
+    def execute(self):
+        self.drive.batches += 1
+        self.drive.batch_sizes.append(len(self.requests))
+        for request, callback, request_id in self.requests:
+            try:
+                response = request.execute()
+            except Exception, error:
+                callback(request_id, None, error)
+            else:
+                callback(request_id, response, None)
+
+
+class FakeFiles(object):
+
+    def __init__(self, drive):
+        self.drive = drive
+
+    def list(self, q='', pageSize=100, pageToken=None, **kwargs):
+        def _list():
+            self.drive.list_queries.append(q)
+            matches = [drive_file for drive_file in self.drive.all_files() if _matches(q, drive_file)]
+            start = int(pageToken or 0)
+            response = {'files': [dict(drive_file) for drive_file in matches[start:start + pageSize]]}
+            if start + pageSize < len(matches):
+                response['nextPageToken'] = str(start + pageSize)
+            return response
+
+        return FakeRequest(_list, 'list')
+
+    def get(self, fileId, **kwargs):
+        def _get():
+            if fileId not in self.drive.items:
+                raise FakeHttpError(404)
+            return dict(self.drive.items[fileId])
+
+        return FakeRequest(_get, 'get')
+
+    def get_media(self, fileId):
+        return FakeMediaRequest(self.drive, self.drive.media[fileId])
+
+    def create(self, body=None, **kwargs):
+        def _create():
+            return {'id': self.drive.add(body['name'], body['parents'][0], body.get('mimeType'))}
+
+        return FakeRequest(_create, 'create', body)
+
+
+class FakeChanges(object):
+
+    def __init__(self, drive):
+        self.drive = drive
+
+    def getStartPageToken(self):
+        return FakeRequest(lambda: {'startPageToken': str(len(self.drive.change_log))})
+
+    def list(self, pageToken, pageSize=100, **kwargs):
+        def _list():
+            start = int(pageToken)
+            response = {'changes': self.drive.change_log[start:start + pageSize]}
+            if start + pageSize < len(self.drive.change_log):
+                response['nextPageToken'] = str(start + pageSize)
+            else:
+                response['newStartPageToken'] = str(len(self.drive.change_log))
+            return response
+
+        return FakeRequest(_list)
+
+
+class FakeRevisions(object):
+
+    def __init__(self, drive):
+        self.drive = drive
+
+    def list(self, fileId, pageSize=200, pageToken=None, **kwargs):
+        def _list():
+            if fileId not in self.drive.revisions_by_file:
+                raise FakeHttpError(404)
+            revisions = self.drive.revisions_by_file[fileId]
+            page_size = min(pageSize, self.drive.revision_page_size)
+            start = int(pageToken or 0)
+            response = {'revisions': [dict(revision) for revision in revisions[start:start + page_size]]}
+            if start + page_size < len(revisions):
+                response['nextPageToken'] = str(start + page_size)
+            return response
+
+        return FakeRequest(_list, 'list')
+
+    def delete(self, fileId, revisionId):
+        def _delete():
+            revisions = self.drive.revisions_by_file[fileId]
+            if revisionId not in [revision['id'] for revision in revisions]:
+                raise FakeHttpError(404)
+            revisions[:] = [revision for revision in revisions if revision['id'] != revisionId]
+            self.drive.deleted_revisions.append((fileId, revisionId))
+
+        return FakeRequest(_delete, 'delete')
+
+
+class FakeDrive(object):
+    """Files by id with a changes feed of every add, update and trash."""
+
+    def __init__(self):
+        self.items = {}
+        self.change_log = []
+        self.list_queries = []
+        self.batches = 0
+        self.media = {}
+        self.media_requests = 0
+        self.revisions_by_file = {}
+        #: drive caps revision pages well below the requested size
+        self.revision_page_size = 200
+        self.deleted_revisions = []
+        self.batch_sizes = []
+        self._ids = itertools.count(1)
+
+    def all_files(self):
+        return sorted(self.items.values(), key=lambda drive_file: drive_file['id'])
+
+    def add(self, name, parent_id, mime_type=None, size=None, md5_checksum=None):
+        file_id = 'id{}'.format(next(self._ids))
+        drive_file = {'id': file_id, 'name': name, 'parents': [parent_id], 'trashed': False}
+        if mime_type:
+            drive_file['mimeType'] = mime_type
+        if size is not None:
+            drive_file['size'] = str(size)
+        if md5_checksum:
+            drive_file['md5Checksum'] = md5_checksum
+        self.items[file_id] = drive_file
+        self._changed(file_id)
+        return file_id
+
+    def add_folder(self, name, parent_id):
+        return self.add(name, parent_id, FOLDER_MIME_TYPE)
+
+    def update(self, file_id, **values):
+        self.items[file_id].update(values)
+        self._changed(file_id)
+
+    def add_revision(self, file_id, modified_time, size=0, keep_forever=False):
+        revisions = self.revisions_by_file.setdefault(file_id, [])
+        revision = {'id': '{}r{}'.format(file_id, len(revisions) + 1), 'modifiedTime': modified_time,
+                    'keepForever': keep_forever, 'size': str(size)}
+        revisions.append(revision)
+        return revision['id']
+
+    def trash(self, file_id):
+        self.update(file_id, trashed=True)
+
+    def _changed(self, file_id):
+        self.change_log.append({'fileId': file_id, 'removed': False, 'file': dict(self.items[file_id])})
+
+    def files(self):
+        return FakeFiles(self)
+
+    def changes(self):
+        return FakeChanges(self)
+
+    def revisions(self):
+        return FakeRevisions(self)
+
+    def new_batch_http_request(self):
+        return FakeBatch(self)
+
+
+def _matches(q, drive_file):
+    if 'trashed=false' in q and drive_file.get('trashed'):
+        return False
+    parent_ids = re.findall(r"'([^']+)' in parents", q)
+    if parent_ids and not set(parent_ids) & set(drive_file.get('parents', [])):
+        return False
+    names = re.findall(r"name='((?:[^'\\]|\\.)*)'", q)
+    if names and drive_file['name'] != names[0].replace("\\'", "'"):
+        return False
+
+    return True
@@ -0,0 +1,41 @@
+import os
+import csv
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from change_tiles import tile_keys, summarize_changes, write_tile_summary
+
+
+class ChangeTilesTest(unittest.TestCase):
+
+    def test_tile_keys_drop_missing_centroids(self):
+        columns, rows = tile_keys([5.0, 15000.0, np.nan, -1.0], [5.0, 25000.0, 3.0, 1.0])
+
+        self.assertEqual(columns.tolist(), [0, 1, -1])
+        self.assertEqual(rows.tolist(), [0, 2, 0])
+
+    def test_summary_counts_added_and_removed_per_tile(self):
+        summary = summarize_changes([1.0, 2.0, 10001.0], [1.0, 2.0, 1.0],
+                                    [3.0, 50000.0, np.nan], [3.0, 50000.0, np.nan])
+
+        self.assertEqual(summary, [(0, 0, 2, 1), (1, 0, 1, 0), (5, 5, 0, 1)])
+        self.assertEqual(summarize_changes([], [], [], []), [])
+
+    def test_summary_csv_has_tile_bounds(self):
+        directory = tempfile.mkdtemp()
+        try:
+            summary_path = os.path.join(directory, 'tiles.csv')
+            write_tile_summary(summary_path, [(1, 2, 3, 0)], tile_size=100.0)
+            with open(summary_path, 'rb') as summary_csv:
+                rows = list(csv.reader(summary_csv))
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(rows[1], ['1', '2', '100.0', '200.0', '200.0', '300.0', '3', '0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
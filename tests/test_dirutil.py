@@ -0,0 +1,41 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import dirutil
+
+
+class HashFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as out_file:
+            out_file.write(data)
+        return path
+
+    def test_chunked_md5_matches_whole_file_md5(self):
+        data = os.urandom(3 * 1000 + 7)
+        path = self._write('a.zip', data)
+
+        self.assertEqual(dirutil.md5_file(path, chunk_size=1000), hashlib.md5(data).hexdigest())
+
+    def test_hash_files_maps_each_path_to_its_digest(self):
+        paths = [self._write('{}.zip'.format(number), str(number) * 100) for number in range(4)]
+
+        hex_digests = dirutil.hash_files(paths, processes=2)
+
+        self.assertEqual(hex_digests, dict((path, hashlib.md5(open(path, 'rb').read()).hexdigest())
+                                           for path in paths))
+        self.assertEqual(dirutil.hash_files([]), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
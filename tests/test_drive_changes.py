@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from drive_changes import RemoteMirror, open_remote_mirror
+from tests.drive_fakes import FakeDrive
+
+
+class RemoteMirrorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.drive = FakeDrive()
+        self.folder_id = self.drive.add_folder('SGID', 'account')
+        self.gdb_id = self.drive.add('Roads_gdb.zip', self.folder_id, size=10, md5_checksum='a')
+        self.shape_id = self.drive.add('Roads_shp.zip', self.folder_id, size=20, md5_checksum='b')
+        self.directory = tempfile.mkdtemp()
+        self.mirror_json = os.path.join(self.directory, 'mirror.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_track_fetches_in_batches_and_records_missing_files(self):
+        mirror = RemoteMirror().track(self.drive, [self.gdb_id, self.shape_id, 'deleted', ''])
+
+        self.assertEqual(self.drive.batches, 1)
+        self.assertEqual((mirror.size(self.gdb_id), mirror.md5(self.shape_id)), (10, 'b'))
+        self.assertIn('deleted', mirror.files)
+        self.assertFalse(mirror.exists('deleted'))
+        self.assertEqual(mirror.sizes(), {self.gdb_id: 10, self.shape_id: 20})
+
+    def test_reopened_mirror_only_reads_changes(self):
+        open_remote_mirror(self.drive, [self.gdb_id, self.shape_id], self.mirror_json).save(self.mirror_json)
+        self.drive.update(self.gdb_id, size='11', md5Checksum='c')
+        self.drive.trash(self.shape_id)
+        untracked_id = self.drive.add('notes.txt', self.folder_id)
+
+        mirror = open_remote_mirror(self.drive, [self.gdb_id, self.shape_id], self.mirror_json)
+
+        self.assertEqual(self.drive.batches, 1)
+        self.assertEqual((mirror.size(self.gdb_id), mirror.md5(self.gdb_id)), (11, 'c'))
+        self.assertTrue(mirror.is_trashed(self.shape_id))
+        self.assertFalse(mirror.exists(self.shape_id))
+        self.assertNotIn(untracked_id, mirror.files)
+
+    def test_record_upload_answers_without_a_call(self):
+        mirror = RemoteMirror().track(self.drive, [self.gdb_id])
+
+        mirror.record_upload(self.gdb_id, 12, 'd')
+        mirror.record_upload('new', 5, 'e')
+
+        self.assertEqual((mirror.size(self.gdb_id), mirror.md5(self.gdb_id)), (12, 'd'))
+        self.assertNotIn('modifiedTime', mirror.get(self.gdb_id))
+        self.assertTrue(mirror.exists('new'))
+
+
+if __name__ == '__main__':
+    unittest.main()
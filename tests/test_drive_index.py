@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from drive_index import DriveTreeIndex, load_drive_index
+from tests.drive_fakes import FakeDrive
+
+
+class DriveTreeIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.drive = FakeDrive()
+        self.root_id = self.drive.add_folder('SGID', 'account')
+        self.category_id = self.drive.add_folder('TRANSPORTATION', self.root_id)
+        self.zip_id = self.drive.add('Roads_gdb.zip', self.category_id, size=10, md5_checksum='a')
+        self.outside_id = self.drive.add('notes.txt', 'account')
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_build_lists_only_the_root_subtree(self):
+        index = DriveTreeIndex(self.root_id).build(self.drive)
+
+        self.assertEqual(set(index.files), set([self.category_id, self.zip_id]))
+        self.assertEqual(index.get_id(os.path.join('TRANSPORTATION', 'Roads_gdb.zip')), self.zip_id)
+        self.assertIn("'{}' in parents".format(self.root_id), self.drive.list_queries[0])
+        self.assertFalse(any('account' in query for query in self.drive.list_queries))
+
+    def test_build_pages_and_groups_parent_queries(self):
+        for number in range(120):
+            folder_id = self.drive.add_folder('folder{}'.format(number), self.root_id)
+            self.drive.add('file.zip', folder_id)
+        import drive_index
+        page_size = drive_index.PAGE_SIZE
+        drive_index.PAGE_SIZE = 50
+        try:
+            index = DriveTreeIndex(self.root_id).build(self.drive)
+        finally:
+            drive_index.PAGE_SIZE = page_size
+
+        self.assertEqual(len(index.paths), 2 + 240)
+        self.assertEqual(index.get_id('folder119/file.zip'), index.paths['folder119/file.zip']['id'])
+
+    def test_refresh_applies_changes_after_reload(self):
+        index_json = os.path.join(self.directory, 'index.json')
+        load_drive_index(self.root_id, index_json, self.drive).save(index_json)
+        new_id = self.drive.add('Rails_gdb.zip', self.category_id)
+        self.drive.trash(self.zip_id)
+        list_calls = len(self.drive.list_queries)
+
+        index = load_drive_index(self.root_id, index_json, self.drive)
+
+        self.assertEqual(len(self.drive.list_queries), list_calls)
+        self.assertEqual(index.get_id('TRANSPORTATION/Rails_gdb.zip'), new_id)
+        self.assertIsNone(index.get_id('TRANSPORTATION/Roads_gdb.zip'))
+
+    def test_add_file_updates_resolved_paths(self):
+        index = DriveTreeIndex(self.root_id).build(self.drive)
+        index.paths
+        index.add_file('new', 'Roads_shp.zip', self.category_id, size=5)
+
+        self.assertEqual(index.get_id('TRANSPORTATION/Roads_shp.zip'), 'new')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import unittest
+
+from apiclient import errors
+
+import drive_metadata
+from drive_metadata import MetadataClient, TokenBucket, find_file_id
+from tests.drive_fakes import FakeBatch, FakeDrive, FakeHttpResponse, FOLDER_MIME_TYPE
+
+
+class UnansweredBatch(FakeBatch):
+    """Runs every call but loses the response, like a batch that times out after drive acted on it."""
+
+    def execute(self):
+        FakeBatch.execute(self)
+        raise errors.HttpError(FakeHttpResponse(503), '')
+
+
+class FlakyDrive(FakeDrive):
+
+    def __init__(self, failed_batches):
+        FakeDrive.__init__(self)
+        self.failed_batches = failed_batches
+
+    def new_batch_http_request(self):
+        if self.failed_batches:
+            self.failed_batches -= 1
+            return UnansweredBatch(self)
+        return FakeBatch(self)
+
+
+class CreateFolderTreeTest(unittest.TestCase):
+
+    def setUp(self):
+        self._backoff = drive_metadata._backoff
+        drive_metadata._backoff = lambda attempt: None
+
+    def tearDown(self):
+        drive_metadata._backoff = self._backoff
+
+    def _folders(self, drive):
+        return sorted((item['name'], item['parents'][0]) for item in drive.items.values()
+                      if item.get('mimeType') == FOLDER_MIME_TYPE)
+
+    def test_failed_batch_does_not_create_duplicates(self):
+        drive = FlakyDrive(failed_batches=1)
+        root_id = drive.add_folder('ftp', 'drive_root')
+        root = os.path.join('ftp', 'UtahSGID_Vector')
+        dir_paths = [os.path.join(root, 'Roads'), os.path.join(root, 'Roads', 'O\'Brien'), os.path.join(root, 'Lakes')]
+        client = MetadataClient(drive, concurrency=2, quota=TokenBucket(1000, 1000))
+
+        folder_ids = client.create_folder_tree(root, root_id, dir_paths)
+
+        self.assertEqual(len(drive.items), 4)
+        self.assertEqual(self._folders(drive), [('Lakes', root_id),
+                                                ("O'Brien", folder_ids[dir_paths[0]]),
+                                                ('Roads', root_id),
+                                                ('ftp', 'drive_root')])
+        self.assertEqual(sorted(folder_ids), sorted(dir_paths + [root]))
+
+    def test_calls_without_a_check_are_retried(self):
+        drive = FlakyDrive(failed_batches=1)
+        root_id = drive.add_folder('ftp', 'drive_root')
+        client = MetadataClient(drive, quota=TokenBucket(1000, 1000))
+
+        results, failures = client.execute({'ftp': drive.files().get(fileId=root_id)})
+
+        self.assertEqual(failures, {})
+        self.assertEqual(results['ftp']['name'], 'ftp')
+        self.assertEqual(drive.batches, 2)
+
+
+class MapTest(unittest.TestCase):
+
+    def setUp(self):
+        self._backoff = drive_metadata._backoff
+        drive_metadata._backoff = lambda attempt: None
+        self.drive = FakeDrive()
+        self.folder_id = self.drive.add_folder('Roads', 'drive_root')
+        self.client = MetadataClient(self.drive, concurrency=2, quota=TokenBucket(1000, 1000))
+        self.calls = []
+
+    def tearDown(self):
+        drive_metadata._backoff = self._backoff
+
+    def _create_unanswered(self, service, name):
+        #: the upload commits but the response to its last chunk is lost
+        self.calls.append(name)
+        file_id = service.files().create(body={'name': name, 'parents': [self.folder_id]}).execute()['id']
+        if self.calls.count(name) == 1:
+            raise errors.HttpError(FakeHttpResponse(503), '')
+        return file_id
+
+    def _names(self):
+        return sorted(item['name'] for item in self.drive.items.values() if item['id'] != self.folder_id)
+
+    def test_create_found_after_a_failure_is_not_repeated(self):
+        find_existing = lambda service, name: find_file_id(service, name, self.folder_id)
+
+        results = sorted(self.client.map(self._create_unanswered, ["Roads_gdb.zip", "O'Brien_shp.zip"],
+                                         find_existing))
+
+        self.assertEqual(self._names(), ["O'Brien_shp.zip", 'Roads_gdb.zip'])
+        self.assertEqual([(name, error) for name, file_id, error in results],
+                         [("O'Brien_shp.zip", None), ('Roads_gdb.zip', None)])
+        self.assertEqual(sorted(file_id for name, file_id, error in results),
+                         sorted(item['id'] for item in self.drive.items.values() if item['id'] != self.folder_id))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_calls_without_a_check_are_retried(self):
+        results = list(self.client.map(self._create_unanswered, ['Roads_gdb.zip']))
+
+        self.assertIsNone(results[0][2])
+        self.assertEqual(len(self.calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
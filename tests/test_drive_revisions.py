@@ -0,0 +1,133 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from drive_revisions import list_all_revisions, select_expired_revisions, delete_revisions, prune_spec_revisions
+from spec_store import SpecStore
+from tests.drive_fakes import FakeDrive
+
+NOW = datetime(2017, 7, 1)
+
+
+def _revision(revision_id, day, keep_forever=False, size=10):
+    return {'id': revision_id, 'modifiedTime': '2017-06-{:02d}T12:00:00.000Z'.format(day),
+            'keepForever': keep_forever, 'size': str(size)}
+
+
+class SelectExpiredRevisionsTest(unittest.TestCase):
+
+    def _expired_ids(self, revisions, keep_revisions=2, keep_days=None):
+        return [revision['id'] for revision in select_expired_revisions(revisions, keep_revisions, keep_days, NOW)]
+
+    def test_newest_revisions_are_kept(self):
+        revisions = [_revision('r3', 3), _revision('r1', 1), _revision('r4', 4), _revision('r2', 2)]
+
+        self.assertEqual(self._expired_ids(revisions), ['r1', 'r2'])
+
+    def test_pinned_revisions_are_kept(self):
+        revisions = [_revision('r1', 1, keep_forever=True), _revision('r2', 2), _revision('r3', 3),
+                     _revision('r4', 4)]
+
+        self.assertEqual(self._expired_ids(revisions), ['r2'])
+
+    def test_recent_revisions_are_kept(self):
+        revisions = [_revision('r{}'.format(day), day) for day in (1, 20, 22, 28, 29)]
+
+        self.assertEqual(self._expired_ids(revisions, keep_days=10), ['r1', 'r20'])
+
+    def test_head_revision_is_always_kept(self):
+        revisions = [_revision('r1', 1), _revision('r2', 2)]
+
+        self.assertEqual(self._expired_ids(revisions, keep_revisions=0), ['r1'])
+
+
+class DriveRevisionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.drive = FakeDrive()
+        self.folder_id = self.drive.add_folder('SGID10', 'root')
+
+    def test_list_all_revisions_pages(self):
+        file_id = self.drive.add('Lakes_gdb.zip', self.folder_id)
+        for day in range(1, 6):
+            self.drive.add_revision(file_id, '2017-06-{:02d}'.format(day))
+        self.drive.revision_page_size = 2
+
+        revisions = list_all_revisions(self.drive, file_id)
+
+        self.assertEqual([revision['id'] for revision in revisions], [file_id + 'r{}'.format(i) for i in range(1, 6)])
+
+    def test_deletes_are_batched(self):
+        file_id = self.drive.add('Lakes_gdb.zip', self.folder_id)
+        for day in range(120):
+            self.drive.add_revision(file_id, str(day), size=3)
+        expired = [(file_id, revision) for revision in self.drive.revisions_by_file[file_id][:110]]
+
+        deleted, reclaimed = delete_revisions(self.drive, expired, pause=0)
+
+        self.assertEqual((deleted, reclaimed), (110, 330))
+        self.assertEqual(self.drive.batch_sizes, [50, 50, 10])
+        self.assertEqual(len(self.drive.revisions_by_file[file_id]), 10)
+
+    def test_failed_deletes_are_not_counted(self):
+        file_id = self.drive.add('Lakes_gdb.zip', self.folder_id)
+        revision_id = self.drive.add_revision(file_id, '1', size=3)
+        revision = self.drive.revisions_by_file[file_id][0]
+
+        deleted, reclaimed = delete_revisions(self.drive, [(file_id, revision), (file_id, dict(revision, id='gone'))],
+                                              pause=0)
+
+        self.assertEqual((deleted, reclaimed), (1, 3))
+        self.assertEqual(self.drive.deleted_revisions, [(file_id, revision_id)])
+
+
+class PruneSpecRevisionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.drive = FakeDrive()
+        folder_id = self.drive.add_folder('SGID10', 'root')
+        self.gdb_id = self.drive.add('Lakes_gdb.zip', folder_id)
+        self.manifest_id = self.drive.add('Water_manifest.json', folder_id)
+        self.trashed_id = self.drive.add('Lakes_shp.zip', folder_id)
+        self.drive.trash(self.trashed_id)
+        for file_id in (self.gdb_id, self.manifest_id, self.trashed_id):
+            for day in range(1, 5):
+                self.drive.add_revision(file_id, '2017-06-{:02d}T12:00:00.000Z'.format(day), size=5)
+        self.spec_store = SpecStore(os.path.join(self.directory, 'specs.sqlite'))
+        features = {'WATER_Lakes': {'sgid_name': 'SGID10.WATER.Lakes', 'name': 'Lakes', 'category': 'WATER',
+                                    'gdb_id': self.gdb_id, 'shape_id': self.trashed_id, 'hash_id': '',
+                                    'packages': ['Water']}}
+        packages = {'Water': {'name': 'Water', 'category': 'WATER', 'gdb_id': '', 'shape_id': '',
+                              'manifest_id': self.manifest_id, 'format': 'reference',
+                              'FeatureClasses': ['SGID10.WATER.Lakes']}}
+        self.spec_store.bulk_load(features, packages)
+        self.mirror_json = os.path.join(self.directory, 'remote_mirror.json')
+
+    def tearDown(self):
+        self.spec_store.connection.close()
+        shutil.rmtree(self.directory)
+
+    def test_manifests_are_pruned(self):
+        deleted, reclaimed = prune_spec_revisions(self.drive, keep_revisions=2, spec_store=self.spec_store,
+                                                  mirror_json=self.mirror_json)
+
+        self.assertEqual((deleted, reclaimed), (4, 20))
+        self.assertEqual(sorted(self.drive.deleted_revisions),
+                         sorted([(self.gdb_id, self.gdb_id + 'r1'), (self.gdb_id, self.gdb_id + 'r2'),
+                                 (self.manifest_id, self.manifest_id + 'r1'),
+                                 (self.manifest_id, self.manifest_id + 'r2')]))
+        self.assertTrue(os.path.exists(self.mirror_json))
+
+    def test_dry_run_deletes_nothing(self):
+        result = prune_spec_revisions(self.drive, keep_revisions=2, dry_run=True, spec_store=self.spec_store,
+                                      mirror_json=self.mirror_json)
+
+        self.assertEqual(result, (0, 0))
+        self.assertEqual(self.drive.deleted_revisions, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from apiclient.http import HttpRequest
+
+import drive_transport
+from drive_transport import ChunkSizer, HttpPool, CHUNK_UNIT
+from tests.drive_fakes import FakeHttpResponse
+
+UPLOAD_URI = 'https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable'
+SESSION_URI = 'https://www.googleapis.com/upload/drive/v3/files?upload_id=session'
+
+
+class FakeUploadHttp(object):
+    """Drive's resumable upload endpoint for a single file."""
+
+    def __init__(self):
+        self.received = ''
+        self.total = None
+        self.requests = []
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        self.requests.append((uri, method))
+        if uri == UPLOAD_URI:
+            self.total = int(headers['X-Upload-Content-Length'])
+            return FakeHttpResponse(200, {'location': SESSION_URI}), ''
+        self.received += body.read()
+        if len(self.received) == self.total:
+            return FakeHttpResponse(200), json.dumps({'id': 'uploaded'})
+        return FakeHttpResponse(308, {'range': 'bytes=0-{}'.format(len(self.received) - 1)}), ''
+
+
+class FakeCredentials(object):
+
+    def __init__(self, http):
+        self.http = http
+
+    def authorize(self, http):
+        return self.http
+
+
+class FakeUploadFiles(object):
+
+    def __init__(self, http):
+        self.http = http
+
+    def create(self, body=None, media_body=None, fields=None):
+        return HttpRequest(self.http, lambda resp, content: json.loads(content), UPLOAD_URI, method='POST',
+                           body=json.dumps(body), headers={'content-type': 'application/json'},
+                           resumable=media_body)
+
+
+class FakeUploadService(object):
+
+    def __init__(self, http):
+        self._http = http
+
+    def files(self):
+        return FakeUploadFiles(self._http)
+
+
+class ChunkSizerTest(unittest.TestCase):
+
+    def test_sizes_are_rounded_and_bounded(self):
+        sizer = ChunkSizer(CHUNK_UNIT + 1, 4 * CHUNK_UNIT, 10 * CHUNK_UNIT)
+
+        self.assertEqual(sizer.min_chunk_size, CHUNK_UNIT)
+        self.assertEqual(sizer.chunk_size, 4 * CHUNK_UNIT)
+        sizer.observe_chunk(CHUNK_UNIT, 100.0)
+        self.assertEqual(sizer.chunk_size, CHUNK_UNIT)
+
+    def test_chunk_covers_round_trips(self):
+        sizer = ChunkSizer(CHUNK_UNIT, 1024 * CHUNK_UNIT)
+        sizer.observe_rtt(1.0)
+        sizer.observe_chunk(CHUNK_UNIT, 1.0)
+
+        self.assertEqual(sizer.chunk_size, drive_transport.RTT_MULTIPLE * CHUNK_UNIT)
+
+
+class FakeContentHttp(object):
+
+    def __init__(self, content):
+        self.content = content
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        return FakeHttpResponse(200), self.content
+
+
+class HttpPoolTest(unittest.TestCase):
+
+    def test_small_requests_are_timed(self):
+        pool = HttpPool(FakeCredentials(FakeContentHttp('{"id": "file"}')))
+
+        self.assertEqual(pool.request('https://www.googleapis.com/drive/v3/files/file')[1], '{"id": "file"}')
+        self.assertIsNotNone(pool.sizer.rtt)
+
+    def test_large_responses_are_not_timed(self):
+        pool = HttpPool(FakeCredentials(FakeContentHttp('x' * (drive_transport.RTT_BODY_LIMIT + 1))))
+
+        pool.request('https://www.googleapis.com/drive/v3/files/file?alt=media')
+        self.assertIsNone(pool.sizer.rtt)
+
+    def test_large_bodies_are_not_timed(self):
+        pool = HttpPool(FakeCredentials(FakeContentHttp('')))
+
+        pool.request(UPLOAD_URI, 'POST', 'x' * (drive_transport.RTT_BODY_LIMIT + 1))
+        self.assertIsNone(pool.sizer.rtt)
+
+
+class UploadFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.local_file = os.path.join(self.directory, 'package.zip')
+        self.data = os.urandom(drive_transport.MULTIPART_LIMIT + CHUNK_UNIT + 100)
+        with open(self.local_file, 'wb') as out_file:
+            out_file.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_resumable_upload_through_the_pool(self):
+        upload_http = FakeUploadHttp()
+        pool = HttpPool(FakeCredentials(upload_http), sizer=ChunkSizer(CHUNK_UNIT, 4 * CHUNK_UNIT, CHUNK_UNIT))
+
+        response = drive_transport.upload_file(FakeUploadService(pool), self.local_file, {'name': 'package.zip'})
+
+        self.assertEqual(response, {'id': 'uploaded'})
+        self.assertEqual(upload_http.received, self.data)
+        self.assertEqual(upload_http.requests[0], (UPLOAD_URI, 'POST'))
+        self.assertTrue(all(request == (SESSION_URI, 'PUT') for request in upload_http.requests[1:]))
+        self.assertGreater(len(upload_http.requests), 2)
+        #: only the session request is small enough to time as a round trip
+        self.assertIsNotNone(pool.sizer.rtt)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+import ftp_catalog
+from ftp_catalog import FtpCatalog, FS_ENCODING
+
+
+def _can_encode(name):
+    try:
+        name.encode(FS_ENCODING)
+    except UnicodeError:
+        return False
+    return True
+
+
+class FtpCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.top = os.path.join(self.directory, 'ftp')
+        os.makedirs(os.path.join(self.top, 'TRANSPORTATION', 'Roads'))
+        self.roads_zip = self._write(os.path.join('TRANSPORTATION', 'Roads', 'Roads_gdb.zip'), 'a' * 10)
+        self._write(os.path.join('TRANSPORTATION', 'Roads', 'readme.txt'), 'b')
+        self.catalog = FtpCatalog(os.path.join(self.directory, 'catalog.sqlite')).refresh(self.top)
+
+    def tearDown(self):
+        self.catalog.connection.close()
+        shutil.rmtree(self.directory)
+
+    def _write(self, relative_path, data):
+        path = os.path.join(self.top, relative_path)
+        with open(path, 'wb') as out_file:
+            out_file.write(data)
+        return path
+
+    def test_files_filters_by_extension_under_top(self):
+        self.assertEqual([row[:2] for row in self.catalog.files(self.top, '.zip')], [(self.roads_zip, 10)])
+        self.assertEqual(self.catalog.files(os.path.join(self.top, 'TRANSPORTATION', 'Rails'), '.zip'), [])
+
+    def test_walk_matches_os_walk(self):
+        self.assertEqual(list(self.catalog.walk(self.top)),
+                         [(root, sorted(dirs), sorted(files)) for root, dirs, files in os.walk(self.top)])
+
+    def test_file_rewritten_in_place_is_picked_up(self):
+        roads_directory = os.path.dirname(self.roads_zip)
+        os.utime(roads_directory, (2000, 2000))
+        self.catalog.refresh(self.top)
+        self._write(self.roads_zip, 'c' * 25)
+        os.utime(self.roads_zip, (1000, 1000))
+        os.utime(roads_directory, (2000, 2000))
+
+        self.catalog.refresh(self.top)
+        #: the directory did not change, so a plain refresh does not stat its files
+        self.assertEqual(self.catalog.stat(self.roads_zip)[0], 10)
+        self.catalog.refresh(self.top, check_files=True)
+
+        self.assertEqual(self.catalog.stat(self.roads_zip), (25, 1000))
+
+    def test_open_catalog_refreshes_once_per_run(self):
+        db_path = os.path.join(self.directory, 'shared.sqlite')
+        catalog = ftp_catalog.open_catalog(self.top, db_path)
+        try:
+            self._write(os.path.join('TRANSPORTATION', 'Roads', 'Roads_shp.zip'), 'e')
+
+            self.assertIs(ftp_catalog.open_catalog(os.path.join(self.top, 'TRANSPORTATION'), db_path), catalog)
+            self.assertEqual(len(catalog.files(self.top, '.zip')), 1)
+        finally:
+            ftp_catalog._refreshed.pop((db_path, self.top.decode(FS_ENCODING)))
+            catalog.connection.close()
+
+    @unittest.skipUnless(_can_encode(u'Caf\xe9'), 'filesystem encoding can not hold the test name')
+    def test_byte_string_paths_with_non_ascii_names(self):
+        cafe = os.path.join(self.top, u'Caf\xe9'.encode(FS_ENCODING))
+        os.makedirs(cafe)
+        with open(os.path.join(cafe, 'Menu_gdb.zip'), 'wb') as out_file:
+            out_file.write('f')
+
+        self.catalog.refresh(self.top)
+
+        expected = os.path.join(self.top.decode(FS_ENCODING), u'Caf\xe9', u'Menu_gdb.zip')
+        self.assertIn(expected, [row[0] for row in self.catalog.files(self.top, '.zip')])
+        self.assertEqual(self.catalog.stat(expected.encode(FS_ENCODING))[0], 1)
+
+    def test_added_and_removed_entries(self):
+        shutil.rmtree(os.path.join(self.top, 'TRANSPORTATION', 'Roads'))
+        os.makedirs(os.path.join(self.top, 'WATER'))
+        lakes_zip = self._write(os.path.join('WATER', 'Lakes_shp.zip'), 'd' * 3)
+
+        self.catalog.refresh(self.top)
+
+        self.assertEqual([row[0] for row in self.catalog.files(self.top)], [lakes_zip])
+        self.assertEqual(sorted(self.catalog.directories(self.top)),
+                         [os.path.join(self.top, 'TRANSPORTATION'), os.path.join(self.top, 'WATER')])
+
+
+if __name__ == '__main__':
+    unittest.main()
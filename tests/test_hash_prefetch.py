@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from drive_changes import RemoteMirror
+from hash_prefetch import HashPrefetcher, download_file
+from tests.drive_fakes import FakeDrive
+
+
+class HashPrefetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.drive = FakeDrive()
+        self.file_id = self.drive.add('Roads_hash.zip', 'hashes')
+        self.drive.media[self.file_id] = os.urandom(10000)
+        self.mirror = RemoteMirror({self.file_id: {'id': self.file_id, 'modifiedTime': '2017-06-01T10:00:00.000Z'}})
+        self.directory = tempfile.mkdtemp()
+        self.cache_directory = os.path.join(self.directory, 'cache')
+        self.prefetcher = HashPrefetcher(self.drive, self.mirror, self.cache_directory,
+                                         workers=2, chunk_size=4096)
+
+    def tearDown(self):
+        self.prefetcher.close()
+        shutil.rmtree(self.directory)
+
+    def _read(self, path):
+        with open(path, 'rb') as zip_file:
+            return zip_file.read()
+
+    def test_download_streams_ranges_to_a_renamed_part_file(self):
+        output = os.path.join(self.directory, 'out.zip')
+
+        download_file(self.drive, self.file_id, output, chunk_size=4096)
+
+        self.assertEqual(self._read(output), self.drive.media[self.file_id])
+        self.assertEqual(self.drive.media_requests, 3)
+        self.assertFalse(os.path.exists(output + '.part'))
+
+    def test_prefetched_zip_is_cached_by_version(self):
+        first = self.prefetcher.start([self.file_id, '']).get(self.file_id)
+        requests = self.drive.media_requests
+
+        self.assertEqual(self._read(first), self.drive.media[self.file_id])
+        self.assertEqual(self.prefetcher.get(self.file_id), first)
+        self.assertEqual(self.drive.media_requests, requests)
+
+    def test_new_version_replaces_the_stale_cache(self):
+        first = self.prefetcher.get(self.file_id)
+        self.drive.media[self.file_id] = 'changed'
+        self.mirror.files[self.file_id]['modifiedTime'] = '2017-07-01T10:00:00.000Z'
+
+        second = self.prefetcher.get(self.file_id)
+
+        self.assertNotEqual(second, first)
+        self.assertEqual(self._read(second), 'changed')
+        self.assertEqual(os.listdir(self.cache_directory), [os.path.basename(second)])
+
+    def test_unknown_version_is_not_reused(self):
+        self.mirror.files[self.file_id].pop('modifiedTime')
+
+        self.prefetcher.get(self.file_id)
+        self.prefetcher.get(self.file_id)
+
+        self.assertEqual(self.drive.media_requests, 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import os
+import shutil
+import tempfile
+import unittest
+from hashlib import md5
+
+import numpy as np
+
+from hash_store import HashStoreWriter, read_hash_store, digest_keys, find_hash_store, hash_lookup, match_digests, \
+    hash_row_blocks
+
+
+def _digest(number):
+    return md5(str(number)).digest()
+
+
+class HashStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'Roads_hashes.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, compress, rows=10, block_rows=4):
+        with HashStoreWriter(self.path, compress=compress, block_rows=block_rows) as writer:
+            for number in range(rows):
+                writer.add(number, _digest(number), *((None, None) if number == 3 else (number * 1.5, -number)))
+            writer.add_block([100, 101], _digest(100) + _digest(101), [1.0, 2.0], [3.0, 4.0])
+        return writer
+
+    def test_round_trip_compressed_and_mapped(self):
+        for compress, use_mmap in ((True, False), (False, False), (False, True)):
+            writer = self._write(compress)
+            store = read_hash_store(self.path, use_mmap=use_mmap)
+
+            self.assertEqual(writer.row_count, 12)
+            self.assertEqual(store.src_id.tolist(), range(10) + [100, 101])
+            self.assertEqual(digest_keys(store.digest), [_digest(number) for number in range(10) + [100, 101]])
+            self.assertTrue(np.isnan(store.x[3]) and np.isnan(store.y[3]))
+            self.assertEqual((store.x[9], store.y[9], store.x[11]), (13.5, -9.0, 2.0))
+
+    def test_empty_store(self):
+        HashStoreWriter(self.path).close()
+
+        store = read_hash_store(self.path)
+
+        self.assertEqual((len(store.src_id), store.digest.shape), (0, (0, 16)))
+
+    def test_legacy_csv_store(self):
+        legacy_path = os.path.join(self.directory, 'Roads_hashes.csv')
+        with open(legacy_path, 'wb') as legacy:
+            legacy.write('src_id,hash,centroidxy\n')
+            legacy.write('7,{},"(1.5, 2.5)"\n'.format(md5('a').hexdigest()))
+            legacy.write('8,{},\n'.format(md5('b').hexdigest()))
+
+        store = read_hash_store(find_hash_store(self.directory, 'Roads'))
+
+        self.assertEqual(store.src_id.tolist(), [7, 8])
+        self.assertEqual(digest_keys(store.digest), [md5('a').digest(), md5('b').digest()])
+        self.assertEqual(store.x[0], 1.5)
+        self.assertTrue(np.isnan(store.y[1]))
+
+    def test_binary_store_preferred(self):
+        self._write(True)
+        open(os.path.join(self.directory, 'Roads_hashes.csv'), 'w').close()
+
+        self.assertEqual(find_hash_store(self.directory, 'Roads'), self.path)
+        self.assertIsNone(find_hash_store(self.directory, 'Rails'))
+
+
+class HashLookupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'Roads_hashes.csv')
+        #: legacy stores hold the same digest for identical rows
+        with open(self.path, 'wb') as legacy:
+            legacy.write('src_id,hash,centroidxy\n')
+            for src_id, value in enumerate('abab'):
+                legacy.write('{},{},\n'.format(src_id, md5(value).hexdigest()))
+        self.lookup = hash_lookup(read_hash_store(self.path))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_duplicate_digests_keep_every_row(self):
+        self.assertEqual(self.lookup, {md5('a').digest(): [0, 2], md5('b').digest(): [1, 3]})
+
+    def test_unchanged_duplicates_match_every_past_row(self):
+        matched = {}
+        indexes = np.concatenate((match_digests(self.lookup, [md5('a').digest(), md5('b').digest()], matched),
+                                  match_digests(self.lookup, [md5('b').digest(), md5('a').digest()], matched)))
+
+        self.assertEqual(sorted(indexes.tolist()), [0, 1, 2, 3])
+
+    def test_extra_and_missing_copies(self):
+        digests = [md5('a').digest()] * 3 + [md5('c').digest()]
+
+        indexes = match_digests(self.lookup, digests, {})
+
+        self.assertEqual(indexes.tolist(), [0, 2, -1, -1])
+        seen = np.zeros(4, dtype=bool)
+        seen[indexes[indexes >= 0]] = True
+        self.assertEqual(np.flatnonzero(~seen).tolist(), [1, 3])
+
+
+def _rows(count, shape=True):
+    rows = []
+    for number in range(count):
+        row = ('road {}'.format(number % 5), number % 3, None, 'SHAPE', number)
+        if shape:
+            row += ((number * 10.0, number * 20.0), 'LINESTRING ({} 0, 1 1)'.format(number % 5) if number else None)
+        rows.append(row)
+    return rows
+
+
+class HashRowBlocksTest(unittest.TestCase):
+
+    def _hash(self, rows, shape_token='SHAPE@WKT', **block_options):
+        blocks = list(hash_row_blocks(iter(rows), 3, shape_token, **block_options))
+        return blocks, [digest for block in blocks for digest in block[2]]
+
+    def test_digests_match_the_row_at_a_time_hash(self):
+        rows = _rows(23)
+        expected = []
+        for row in rows:
+            hasher = md5(str(row[:3]))
+            hasher.update(row[-1] or 'No shape')
+            expected.append(hasher.digest())
+
+        blocks, digests = self._hash(rows, block_rows=10)
+
+        self.assertEqual(digests, expected)
+        self.assertEqual([len(block[0]) for block in blocks], [10, 10, 3])
+        self.assertEqual([src_id for block in blocks for src_id in block[1]], range(23))
+        self.assertEqual(blocks[2][3].tolist(), [200.0, 210.0, 220.0])
+
+    def test_identical_rows_share_a_digest(self):
+        digests = self._hash(_rows(17))[1]
+
+        self.assertEqual(digests[1], digests[16])
+        self.assertNotEqual(digests[1], digests[2])
+
+    def test_blocks_are_bounded_by_shape_bytes(self):
+        rows = _rows(20)
+        shape_bytes = len(rows[1][-1])
+
+        blocks = self._hash(rows, block_bytes=shape_bytes * 4)[0]
+
+        self.assertEqual(sum(len(block[0]) for block in blocks), 20)
+        self.assertTrue(all(sum(len(row[-1] or '') for row in block[0]) <= shape_bytes * 4 for block in blocks))
+        self.assertTrue(len(blocks) > 4)
+
+    def test_rows_without_shape(self):
+        rows = _rows(4, shape=False)
+
+        blocks, digests = self._hash(rows, shape_token=None)
+
+        self.assertEqual(digests, [md5(str(row[:3])).digest() for row in rows])
+        self.assertEqual(blocks[0][1], range(4))
+        self.assertTrue(np.isnan(blocks[0][3]).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from path_registry import PathRegistry, load_path_registry
+
+PATHS = {
+    'ftp/UtahSGID_Vector': 'root',
+    'ftp/UtahSGID_Vector/UTM12_NAD83': 'utm',
+    'ftp/UtahSGID_Vector/UTM12_NAD83/TRANSPORTATION': 'transportation',
+    'ftp/UtahSGID_Vector/UTM12_NAD83/TRANSPORTATION/UnpackagedData': 'transportation_unpackaged',
+    'ftp/UtahSGID_Vector/UTM12_NAD83/TRANSPORTATION/UnpackagedData/Roads/_Statewide/Roads_gdb.zip': 'roads_gdb',
+    'ftp/UtahSGID_Vector/UTM12_NAD83/TRANSPORTATION/UnpackagedData/Roads/_Statewide/Roads_shp.zip': 'roads_shp',
+    'ftp/UtahSGID_Vector/UTM12_NAD83/TRANSPORTATION/PackagedData/Trails/Trails_gdb.zip': 'trails_gdb',
+    'ftp/UtahSGID_Vector/UTM12_NAD83/WATER/UnpackagedData/Lakes/_Statewide/Lakes_gdb.zip': 'lakes_gdb',
+    'ftp/UtahSGID_Vector/UTM12_NAD83/WATERS/Rivers_gdb.zip': 'rivers_gdb',
+}
+
+
+class PathRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = PathRegistry('/')
+        for path, file_id in PATHS.items():
+            self.registry.add(path, file_id, 'parent_' + file_id)
+
+    def test_dict_operations(self):
+        self.assertEqual(len(self.registry), len(PATHS))
+        self.assertEqual(self.registry['ftp/UtahSGID_Vector/UTM12_NAD83'], 'utm')
+        self.assertEqual(self.registry.parent_id('ftp/UtahSGID_Vector/UTM12_NAD83'), 'parent_utm')
+        self.assertEqual(sorted(self.registry.keys()), sorted(PATHS))
+        #: folders only on the way to a registered path are not registered themselves
+        self.assertNotIn('ftp', self.registry)
+        self.assertIsNone(self.registry.get('ftp/UtahSGID_Vector/UTM12_NAD83/WATER'))
+        self.assertRaises(KeyError, lambda: self.registry['ftp/missing'])
+        self.assertIsNone(self.registry.parent_id('ftp/missing/Roads_gdb.zip'))
+        self.assertIsNone(self.registry.parent_id('ftp'))
+
+        self.registry['ftp/UtahSGID_Vector/UTM12_NAD83'] = 'utm2'
+        self.assertEqual(self.registry['ftp/UtahSGID_Vector/UTM12_NAD83'], 'utm2')
+        self.assertEqual(len(self.registry), len(PATHS))
+
+    def test_under_prefix(self):
+        transportation = 'ftp/UtahSGID_Vector/UTM12_NAD83/TRANSPORTATION'
+        expected = [path for path in PATHS if path.startswith(transportation + '/')]
+
+        self.assertEqual(sorted(self.registry.under(transportation)), sorted(expected))
+        self.assertEqual(sorted(self.registry.under(transportation + '/')), sorted(expected))
+        #: a prefix matches whole components only
+        self.assertEqual(list(self.registry.under('ftp/UtahSGID_Vector/UTM12_NAD83/WATER')),
+                         ['ftp/UtahSGID_Vector/UTM12_NAD83/WATER/UnpackagedData/Lakes/_Statewide/Lakes_gdb.zip'])
+        self.assertEqual(list(self.registry.under('ftp/missing')), [])
+
+    def test_category(self):
+        unpackaged = [path for path in PATHS if '/UnpackagedData/' in path]
+
+        self.assertEqual(sorted(self.registry.category('UnpackagedData')), sorted(unpackaged))
+        self.assertEqual(sorted(self.registry.category('UnpackagedData', 'ftp/UtahSGID_Vector/UTM12_NAD83/WATER')),
+                         ['ftp/UtahSGID_Vector/UTM12_NAD83/WATER/UnpackagedData/Lakes/_Statewide/Lakes_gdb.zip'])
+        self.assertEqual(list(self.registry.category('PackagedData', 'ftp/UtahSGID_Vector/UTM12_NAD83/WATER')), [])
+        self.assertEqual(list(self.registry.category('UnpackagedData', 'ftp/missing')), [])
+
+    def test_category_folder_nested_in_another(self):
+        self.registry.add('ftp/UnpackagedData/UnpackagedData/Roads_gdb.zip', 'nested')
+
+        self.assertEqual(list(self.registry.category('UnpackagedData', 'ftp/UnpackagedData')),
+                         ['ftp/UnpackagedData/UnpackagedData/Roads_gdb.zip'])
+
+
+class LoadPathRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_load(self):
+        path_id_json = os.path.join(self.directory, 'path_ids.json')
+        with open(path_id_json, 'w') as json_file:
+            json.dump([{'path': 'ftp\\Roads_gdb.zip', 'fileId': 'roads', 'parentId': 'ftp'},
+                       {'path': 'ftp', 'fileId': 'ftp'}], json_file)
+
+        registry = load_path_registry(path_id_json, '\\')
+
+        self.assertEqual(registry['ftp\\Roads_gdb.zip'], 'roads')
+        self.assertEqual(registry.parent_id('ftp\\Roads_gdb.zip'), 'ftp')
+        self.assertEqual(registry.parent_id('ftp'), '')
+        self.assertEqual(list(registry.under('ftp')), ['ftp\\Roads_gdb.zip'])
+
+
+if __name__ == '__main__':
+    unittest.main()
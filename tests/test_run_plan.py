@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+import run_plan
+from spec_store import SpecStore
+
+NOW = datetime(2017, 7, 1)
+
+
+class BuildPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.spec_store = SpecStore(os.path.join(self.directory, 'specs.sqlite'))
+        features = {}
+        for name in ('Lakes', 'Streams'):
+            features['WATER_' + name] = {'sgid_name': 'SGID10.WATER.' + name, 'name': name, 'category': 'WATER',
+                                         'gdb_id': name + '_gdb', 'shape_id': name + '_shp', 'hash_id': '',
+                                         'probe': name + '_probe', 'process_seconds': 10.0,
+                                         'upload_date': '2017_06_25', 'packages': ['Water']}
+        packages = {'Water': {'name': 'Water', 'category': 'WATER', 'gdb_id': 'water_gdb', 'shape_id': '',
+                              'format': 'reference',
+                              'FeatureClasses': ['SGID10.WATER.Lakes', 'SGID10.WATER.Streams']}}
+        self.spec_store.bulk_load(features, packages)
+        self.remote_sizes = {'Lakes_gdb': 100, 'Lakes_shp': 50, 'water_gdb': 7}
+
+    def tearDown(self):
+        self.spec_store.connection.close()
+        shutil.rmtree(self.directory)
+
+    def _plan(self, probes):
+        return run_plan.build_plan(self.spec_store, probes, self.remote_sizes, rate=10.0, now=NOW)
+
+    def test_unchanged_probes_plan_nothing(self):
+        plan = self._plan({'SGID10.WATER.Lakes': 'Lakes_probe', 'SGID10.WATER.Streams': 'Streams_probe'})
+
+        self.assertEqual((plan['features'], plan['packages'], plan['upload_bytes']), ([], [], 0))
+
+    def test_changed_probe_plans_feature_and_package(self):
+        plan = self._plan({'SGID10.WATER.Lakes': 'edited', 'SGID10.WATER.Streams': 'Streams_probe'})
+
+        self.assertEqual(plan['features'], ['SGID10.WATER.Lakes'])
+        self.assertEqual(plan['packages'], ['Water'])
+        self.assertEqual(plan['probes'], {'SGID10.WATER.Lakes': 'edited'})
+        #: lakes gdb and shape, the package gdb; the empty reference package shape is not counted
+        self.assertEqual((plan['upload_bytes'], plan['unknown_sizes']), (157, 1))
+        self.assertEqual(plan['estimated_seconds'], 10.0 + 15.7)
+
+    def test_full_check_is_planned_when_due(self):
+        spec = self.spec_store.get_feature('WATER_Streams')
+        spec['upload_date'] = '2017_05_01'
+        self.spec_store.save_feature('WATER_Streams', spec, stamp=False)
+
+        plan = self._plan({'SGID10.WATER.Lakes': 'Lakes_probe', 'SGID10.WATER.Streams': 'Streams_probe'})
+
+        self.assertEqual(plan['features'], ['SGID10.WATER.Streams'])
+        self.assertTrue(run_plan.is_full_check_due({}, NOW))
+
+    def test_plan_round_trips(self):
+        plan_json = os.path.join(self.directory, 'plan.json')
+        plan = self._plan({})
+
+        run_plan.save_plan(plan_json, plan)
+
+        self.assertEqual(run_plan.load_plan(plan_json), plan)
+
+
+class ThroughputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.throughput_json = os.path.join(self.directory, 'throughput.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_rate_over_recent_uploads(self):
+        self.assertEqual(run_plan.upload_rate(self.throughput_json), run_plan.DEFAULT_UPLOAD_RATE)
+        for upload in range(run_plan.THROUGHPUT_SAMPLES + 5):
+            run_plan.record_upload(1000 if upload < 5 else 300, 1.0, self.throughput_json)
+
+        self.assertEqual(run_plan.upload_rate(self.throughput_json), 300.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import schema_cache
+from schema_cache import load_schema, BUILDING_SUFFIX, FIELDS_JSON
+
+
+class LoadSchemaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_directory = os.path.join(self.directory, 'schema_cache')
+        self.builds = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _build(self, building):
+        self.builds.append(building)
+        with open(os.path.join(building, 'Lakes.gdb'), 'w') as template:
+            template.write('template')
+        return ['NAME', 'TYPE']
+
+    def _leftovers(self):
+        return [name for name in os.listdir(self.cache_directory) if BUILDING_SUFFIX in name]
+
+    def test_schema_is_built_once(self):
+        schema_directory, fields = load_schema(self.cache_directory, 'abc', self._build)
+        cached = load_schema(self.cache_directory, 'abc', self._build)
+
+        self.assertEqual((schema_directory, fields), (os.path.join(self.cache_directory, 'abc'), ['NAME', 'TYPE']))
+        self.assertEqual(cached, (schema_directory, ['NAME', 'TYPE']))
+        self.assertEqual(len(self.builds), 1)
+        self.assertTrue(os.path.exists(os.path.join(schema_directory, 'Lakes.gdb')))
+        self.assertEqual(self._leftovers(), [])
+
+    def test_stale_build_is_cleared(self):
+        stale = os.path.join(self.cache_directory, 'abc' + BUILDING_SUFFIX)
+        os.makedirs(stale)
+        old = time.time() - schema_cache.STALE_BUILD_SECONDS - 10
+        os.utime(stale, (old, old))
+
+        load_schema(self.cache_directory, 'abc', self._build)
+
+        self.assertFalse(os.path.exists(stale))
+        self.assertEqual(self._leftovers(), [])
+
+    def test_running_build_is_left_alone(self):
+        running = os.path.join(self.cache_directory, 'abc' + BUILDING_SUFFIX + 'other')
+        os.makedirs(running)
+
+        load_schema(self.cache_directory, 'abc', self._build)
+
+        self.assertTrue(os.path.exists(running))
+        self.assertNotEqual(self.builds[0], running)
+
+    def test_schema_cached_by_another_run_is_used(self):
+        def _build_while_another_run_finishes(building):
+            other = os.path.join(self.cache_directory, 'abc')
+            os.makedirs(other)
+            with open(os.path.join(other, FIELDS_JSON), 'w') as fields_json:
+                fields_json.write('["NAME"]')
+            with open(os.path.join(other, 'Lakes.gdb'), 'w') as template:
+                template.write('theirs')
+            return self._build(building)
+
+        schema_directory, fields = load_schema(self.cache_directory, 'abc', _build_while_another_run_finishes)
+
+        self.assertEqual(fields, ['NAME'])
+        with open(os.path.join(schema_directory, 'Lakes.gdb')) as template:
+            self.assertEqual(template.read(), 'theirs')
+        self.assertEqual(self._leftovers(), [])
+
+    def test_failed_build_is_removed(self):
+        def _fail(building):
+            raise RuntimeError('CreateFeatureclass failed')
+
+        self.assertRaises(RuntimeError, load_schema, self.cache_directory, 'abc', _fail)
+        self.assertEqual(self._leftovers(), [])
+        self.assertFalse(os.path.exists(os.path.join(self.cache_directory, 'abc')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from scratch import ScratchManager, TMPFS_SUBDIRECTORY
+
+
+class ScratchManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.root = os.path.join(self.directory, 'scratch')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_workspace_is_kept_until_every_hold_is_released(self):
+        scratch = ScratchManager(self.root, budget=100)
+        scratch.retain('RECREATION_Trails')
+        path = scratch.acquire('RECREATION_Trails', 10)
+
+        scratch.release('RECREATION_Trails')
+        self.assertTrue(os.path.isdir(path))
+        self.assertEqual(scratch.path('RECREATION_Trails'), path)
+        scratch.release('RECREATION_Trails')
+        self.assertFalse(os.path.exists(path))
+        self.assertIsNone(scratch.path('RECREATION_Trails'))
+
+    def test_idle_retained_workspaces_are_evicted_largest_first(self):
+        scratch = ScratchManager(self.root, budget=100)
+        for name, estimate in (('A', 30), ('B', 60)):
+            scratch.retain(name)
+            scratch.acquire(name, estimate)
+            scratch.release(name)
+
+        path = scratch.acquire('C', 60)
+
+        self.assertTrue(os.path.isdir(path))
+        self.assertIsNone(scratch.path('B'))
+        self.assertIsNotNone(scratch.path('A'))
+        #: the package holding B finds it gone and its release is a no-op
+        scratch.release('B')
+        self.assertEqual(scratch._reserved(False), 90)
+
+    def test_single_thread_goes_over_budget_instead_of_waiting(self):
+        scratch = ScratchManager(self.root, budget=100)
+        scratch.acquire('A', 60)
+
+        path = scratch.acquire('B', 60)
+
+        self.assertTrue(os.path.isdir(path))
+        self.assertIsNotNone(scratch.path('A'))
+
+    def test_waits_for_another_thread_to_release(self):
+        scratch = ScratchManager(self.root, budget=100)
+        scratch.acquire('A', 60)
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(scratch.acquire('B', 60)))
+        waiter.start()
+        time.sleep(0.2)
+
+        self.assertEqual(acquired, [])
+        scratch.release('A')
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(len(acquired), 1)
+
+    def test_threads_waiting_on_each_other_do_not_deadlock(self):
+        scratch = ScratchManager(self.root, budget=100)
+        first_held = threading.Event()
+        second_held = threading.Event()
+        acquired = []
+
+        def _first():
+            scratch.acquire('A', 50)
+            first_held.set()
+            second_held.wait(5)
+            acquired.append(scratch.acquire('C', 50))
+            scratch.release('C')
+            scratch.release('A')
+
+        def _second():
+            first_held.wait(5)
+            scratch.acquire('B', 50)
+            second_held.set()
+            acquired.append(scratch.acquire('D', 50))
+            scratch.release('D')
+            scratch.release('B')
+
+        threads = [threading.Thread(target=_first), threading.Thread(target=_second)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual(len(acquired), 2)
+
+    def test_kept_path_counts_against_the_budget_and_survives_release(self):
+        scratch = ScratchManager(self.root, budget=100)
+        build_directory = os.path.join(self.directory, 'package_builds', 'SkiAreas')
+        os.makedirs(build_directory)
+        with open(os.path.join(build_directory, 'members.json'), 'w') as manifest:
+            manifest.write('{}')
+
+        self.assertEqual(scratch.acquire('package_SkiAreas', 80, path=build_directory), build_directory)
+        self.assertEqual(scratch._reserved(False), 80)
+        scratch.release('package_SkiAreas')
+        self.assertTrue(os.path.exists(os.path.join(build_directory, 'members.json')))
+
+    def test_hot_workspaces_use_tmpfs_while_it_has_room(self):
+        tmpfs_root = os.path.join(self.directory, 'tmpfs')
+        scratch = ScratchManager(self.root, budget=100, tmpfs_root=tmpfs_root, tmpfs_budget=50)
+
+        self.assertTrue(scratch.acquire('A', 40, hot=True).startswith(scratch.tmpfs_root))
+        self.assertTrue(scratch.acquire('B', 40, hot=True).startswith(self.root))
+        self.assertTrue(scratch.acquire('C', 40).startswith(self.root))
+
+    def test_only_its_own_tmpfs_directory_is_removed(self):
+        tmpfs_root = os.path.join(self.directory, 'shm')
+        other_directory = os.path.join(tmpfs_root, 'other')
+        os.makedirs(os.path.join(tmpfs_root, TMPFS_SUBDIRECTORY, 'stale'))
+        os.makedirs(other_directory)
+
+        scratch = ScratchManager(self.root, tmpfs_root=tmpfs_root)
+
+        self.assertTrue(os.path.isdir(other_directory))
+        self.assertEqual(scratch.tmpfs_root, os.path.join(tmpfs_root, TMPFS_SUBDIRECTORY))
+        self.assertEqual(os.listdir(scratch.tmpfs_root), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import glob
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from spec_store import SpecStore, RUN_STAT_KEYS
+
+REPO_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def _feature(sgid_name, **values):
+    category, name = sgid_name.split('.')[1:]
+    spec = {'sgid_name': sgid_name, 'name': name, 'category': category,
+            'gdb_id': '', 'shape_id': '', 'hash_id': '', 'parent_ids': [], 'packages': []}
+    spec.update(values)
+    return spec
+
+
+class SpecStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, 'specs.sqlite')
+        self.store = SpecStore(self.db_path)
+
+    def tearDown(self):
+        self.store.connection.close()
+        shutil.rmtree(self.directory)
+
+    def test_feature_round_trips_with_extra_keys(self):
+        spec = _feature('SGID10.WATER.Lakes', gdb_id='g', parent_ids=['p1', 'p2'],
+                        process_seconds=1.5, content_hash='abc')
+
+        self.store.save_feature('WATER_Lakes.json', spec, stamp=False)
+
+        self.assertEqual(self.store.get_feature('WATER_Lakes'), spec)
+        self.assertEqual(self.store.find_drive_id('p2'), [('feature', 'WATER_Lakes', 'parent_ids')])
+
+    def test_repo_specs_round_trip_unchanged(self):
+        export_directory = os.path.join(self.directory, 'export')
+        for spec_directory in ('features', 'packages'):
+            os.makedirs(os.path.join(export_directory, spec_directory))
+
+        self.store.import_json(os.path.join(REPO_DIRECTORY, 'features'), os.path.join(REPO_DIRECTORY, 'packages'))
+        self.store.export_json(os.path.join(export_directory, 'features'), os.path.join(export_directory, 'packages'))
+
+        for spec_directory in ('features', 'packages'):
+            originals = [path for path in glob.glob(os.path.join(REPO_DIRECTORY, spec_directory, '*.json'))
+                         if os.path.basename(path) != 'template.json']
+            self.assertEqual(sorted(os.listdir(os.path.join(export_directory, spec_directory))),
+                             sorted(os.path.basename(path) for path in originals))
+            for original in originals:
+                with open(original) as original_file, \
+                        open(os.path.join(export_directory, spec_directory, os.path.basename(original))) as exported:
+                    self.assertEqual(exported.read(), original_file.read(), original)
+
+    def test_run_stats_stay_out_of_exported_specs(self):
+        export_directory = os.path.join(self.directory, 'export')
+        for spec_directory in ('features', 'packages'):
+            os.makedirs(os.path.join(export_directory, spec_directory))
+        spec = _feature('SGID10.WATER.Lakes', gdb_id='g', probe='p', content_hash='abc', process_seconds=1.5,
+                        scratch_bytes=100, full_check_note='kept')
+        self.store.save_feature('WATER_Lakes', spec, stamp=False)
+
+        self.store.export_json(os.path.join(export_directory, 'features'), os.path.join(export_directory, 'packages'))
+
+        with open(os.path.join(export_directory, 'features', 'WATER_Lakes.json')) as exported:
+            exported_spec = json.load(exported)
+        self.assertFalse(set(RUN_STAT_KEYS) & set(exported_spec))
+        self.assertEqual(exported_spec['full_check_note'], 'kept')
+        self.assertEqual(self.store.get_feature('WATER_Lakes')['probe'], 'p')
+
+    def test_package_manifest_id_is_a_drive_id(self):
+        package = {'name': 'Water', 'category': 'WATER', 'gdb_id': '', 'shape_id': '', 'parent_ids': [],
+                   'FeatureClasses': [], 'format': 'reference', 'manifest_id': 'm'}
+
+        self.store.save_package('Water', package, stamp=False)
+
+        self.assertEqual(self.store.get_package('Water'), package)
+        self.assertEqual(self.store.find_drive_id('m'), [('package', 'Water', 'manifest_id')])
+        self.assertIn('m', self.store.drive_file_ids())
+        self.assertNotIn('manifest_id', self.store.connection.execute('SELECT extra FROM packages').fetchone()[0])
+
+    def test_features_have_no_manifest_id(self):
+        self.store.save_feature('WATER_Lakes', _feature('SGID10.WATER.Lakes'), stamp=False)
+
+        self.assertNotIn('manifest_id', self.store.get_feature('WATER_Lakes'))
+
+    def test_memberships_follow_package_order(self):
+        self.store.bulk_load(features={'WATER_Lakes': _feature('SGID10.WATER.Lakes', packages=['Water'])},
+                             packages={'Water': {'name': 'Water', 'category': 'WATER', 'gdb_id': '', 'shape_id': '',
+                                                 'parent_ids': [],
+                                                 'FeatureClasses': ['SGID10.WATER.Streams', 'SGID10.WATER.Lakes']}})
+
+        self.assertEqual(self.store.features_in_package('Water.json'), ['SGID10.WATER.Streams', 'SGID10.WATER.Lakes'])
+        self.assertEqual(self.store.get_feature('WATER_Lakes')['packages'], ['Water'])
+
+    def test_failed_transaction_leaves_store_unchanged(self):
+        self.store.save_feature('WATER_Lakes', _feature('SGID10.WATER.Lakes'), stamp=False)
+
+        with self.assertRaises(KeyError):
+            with self.store.transaction():
+                self.store.connection.execute('DELETE FROM features')
+                raise KeyError('sgid_name')
+
+        self.assertEqual(self.store.feature_names(), ['WATER_Lakes'])
+
+    def test_concurrent_writers_keep_every_update(self):
+        def _save(number):
+            store = SpecStore(self.db_path)
+            for count in range(10):
+                store.save_feature('WATER_Lake{}_{}'.format(number, count),
+                                   _feature('SGID10.WATER.Lake{}_{}'.format(number, count)))
+            store.connection.close()
+
+        threads = [threading.Thread(target=_save, args=(number,)) for number in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.store.feature_names()), 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from spec_store import SpecStore, open_spec_store, shared_spec_db
+from work_queue import WorkQueue, run_worker, MAX_ATTEMPTS
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.queue_path = os.path.join(self.directory, 'queue.sqlite')
+        self.queue = WorkQueue(self.queue_path)
+        self.spec_store = SpecStore(os.path.join(self.directory, 'specs.sqlite'))
+        self.spec_store.bulk_load(
+            features=dict(('WATER_{}'.format(name), {'sgid_name': 'SGID10.WATER.{}'.format(name), 'name': name,
+                                                     'category': 'WATER', 'packages': ['Water']})
+                          for name in ('Lakes', 'Streams')),
+            packages={'Water': {'name': 'Water', 'category': 'WATER',
+                                'FeatureClasses': ['SGID10.WATER.Lakes', 'SGID10.WATER.Streams']}})
+        self.queue.enqueue_catalog(self.spec_store)
+
+    def tearDown(self):
+        self.queue.connection.close()
+        self.spec_store.connection.close()
+        shutil.rmtree(self.directory)
+
+    def _claim_all(self, worker_id):
+        claimed = []
+        job = self.queue.claim(worker_id)
+        while job:
+            claimed.append(job[0])
+            job = self.queue.claim(worker_id)
+        return claimed
+
+    def test_package_waits_for_its_features(self):
+        self.assertEqual(self._claim_all('a'), ['feature:SGID10.WATER.Lakes', 'feature:SGID10.WATER.Streams'])
+        self.queue.complete('feature:SGID10.WATER.Lakes', 'a')
+        self.assertIsNone(self.queue.claim('a'))
+        self.queue.complete('feature:SGID10.WATER.Streams', 'a')
+
+        self.assertEqual(self.queue.claim('a'), ('package:Water', 'package', 'Water'))
+
+    def test_expired_lease_goes_to_another_worker(self):
+        job_id = self.queue.claim('a', lease_seconds=-1)[0]
+
+        self.assertEqual(self.queue.claim('b')[0], job_id)
+        self.assertFalse(self.queue.heartbeat(job_id, 'a'))
+        self.queue.complete(job_id, 'a')
+        self.assertEqual(self.queue.counts(), {'leased': 1, 'queued': 2})
+
+    def test_reopened_queue_resumes(self):
+        job_id = self.queue.claim('a')[0]
+        self.queue.complete(job_id, 'a', 'ok')
+
+        reopened = WorkQueue(self.queue_path)
+        reopened.enqueue_catalog(self.spec_store)
+
+        self.assertEqual(reopened.counts(), {'done': 1, 'queued': 2})
+        self.assertNotEqual(reopened.claim('b')[0], job_id)
+        reopened.connection.close()
+
+    def test_failed_member_stops_its_package(self):
+        for attempt in range(MAX_ATTEMPTS):
+            job_id = self.queue.claim('a')[0]
+            self.queue.fail(job_id, 'a', ValueError('boom'))
+        self._claim_all('a')
+        self.queue.complete('feature:SGID10.WATER.Streams', 'a')
+
+        self.assertEqual(self.queue.counts(), {'done': 1, 'failed': 1, 'queued': 1})
+        self.assertFalse(self.queue.is_active())
+
+    def test_run_worker_drains_the_queue(self):
+        calls = []
+        handlers = {'feature': lambda name: calls.append(name),
+                    'package': lambda name: calls.append(name)}
+
+        run_worker(self.queue, handlers, 'a', heartbeat_seconds=60, poll_seconds=0)
+
+        self.assertEqual(calls, ['SGID10.WATER.Lakes', 'SGID10.WATER.Streams', 'Water'])
+        self.assertEqual(self.queue.counts(), {'done': 3})
+
+
+class SharedSpecStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_spec_db_sits_beside_the_queue(self):
+        self.assertEqual(shared_spec_db(os.path.join(self.directory, 'queue.sqlite')),
+                         os.path.join(self.directory, 'specs.sqlite'))
+
+    def test_only_the_first_worker_seeds_the_shared_store(self):
+        db_path = shared_spec_db(os.path.join(self.directory, 'queue.sqlite'))
+        first = open_spec_store(db_path)
+        spec = first.get_feature('RECREATION_SkiLifts')
+        spec['gdb_id'] = 'rebuilt'
+        first.save_feature('RECREATION_SkiLifts', spec)
+
+        second = open_spec_store(db_path)
+
+        self.assertFalse(second.import_json(only_empty=True))
+        self.assertEqual(second.get_feature('RECREATION_SkiLifts')['gdb_id'], 'rebuilt')
+        first.connection.close()
+        second.connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
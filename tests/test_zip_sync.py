@@ -0,0 +1,130 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import zip_sync
+from drive_index import DriveTreeIndex
+from zip_sync import drive_time, load_local_hashes, save_local_hashes, select_zip_uploads
+from tests.drive_fakes import FakeDrive
+
+DRIVE_TIME = '2017-06-01T12:00:00.000Z'
+
+
+class SelectZipUploadsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.top_dir = os.path.join(self.directory, 'UtahSGID_Vector')
+        os.makedirs(os.path.join(self.top_dir, 'WATER'))
+        self.drive = FakeDrive()
+        self.root_id = self.drive.add_folder('UtahSGID_Vector', 'account')
+        self.water_id = self.drive.add_folder('WATER', self.root_id)
+        self.zip_stats = {}
+        self.hashed = []
+        self.original_hash_files = zip_sync.hash_files
+        zip_sync.hash_files = self._hash_files
+
+    def tearDown(self):
+        zip_sync.hash_files = self.original_hash_files
+        shutil.rmtree(self.directory)
+
+    def _hash_files(self, file_list):
+        self.hashed.extend(file_list)
+        return self.original_hash_files(file_list, processes=1)
+
+    def _local(self, name, data):
+        local_path = os.path.join(self.top_dir, 'WATER', name)
+        with open(local_path, 'wb') as zip_file:
+            zip_file.write(data)
+        self.zip_stats[local_path] = (len(data), drive_time(os.path.getmtime(local_path)))
+        return local_path
+
+    def _remote(self, name, data, modified_time=DRIVE_TIME):
+        file_id = self.drive.add(name, self.water_id, size=len(data), md5_checksum=hashlib.md5(data).hexdigest())
+        self.drive.update(file_id, modifiedTime=modified_time)
+        return file_id
+
+    def _select(self, local_hashes=None):
+        local_hashes = {} if local_hashes is None else local_hashes
+        drive_index = DriveTreeIndex(self.root_id).build(self.drive)
+        return select_zip_uploads(self.top_dir, self.zip_stats, drive_index, local_hashes)
+
+    def test_new_zip_is_uploaded_without_hashing(self):
+        local_path = self._local('Lakes.zip', 'lakes')
+
+        uploads, google_file_ids = self._select()
+
+        self.assertEqual((uploads, google_file_ids, self.hashed), ([local_path], {}, []))
+
+    def test_size_change_is_uploaded_without_hashing(self):
+        local_path = self._local('Lakes.zip', 'lakes v2')
+        file_id = self._remote('Lakes.zip', 'lakes')
+
+        uploads, google_file_ids = self._select()
+
+        self.assertEqual((uploads, google_file_ids, self.hashed), ([local_path], {local_path: file_id}, []))
+
+    def test_same_modified_time_is_skipped_without_hashing(self):
+        local_path = self._local('Lakes.zip', 'lakes')
+        file_id = self._remote('Lakes.zip', 'other', self.zip_stats[local_path][1])
+
+        uploads, google_file_ids = self._select()
+
+        self.assertEqual((uploads, google_file_ids, self.hashed), ([], {local_path: file_id}, []))
+
+    def test_md5_match_is_skipped_and_cached(self):
+        local_path = self._local('Lakes.zip', 'lakes')
+        self._remote('Lakes.zip', 'lakes')
+        local_hashes = {}
+
+        uploads, google_file_ids = self._select(local_hashes)
+
+        self.assertEqual((uploads, self.hashed), ([], [local_path]))
+        file_size, modified_time = self.zip_stats[local_path]
+        self.assertEqual(local_hashes[local_path], {'size': file_size, 'modifiedTime': modified_time,
+                                                    'md5': hashlib.md5('lakes').hexdigest()})
+
+    def test_md5_mismatch_is_uploaded(self):
+        local_path = self._local('Lakes.zip', 'lakes')
+        self._remote('Lakes.zip', 'rakes')
+
+        uploads, google_file_ids = self._select()
+
+        self.assertEqual((uploads, self.hashed), ([local_path], [local_path]))
+
+    def test_cached_md5_is_not_rehashed(self):
+        local_path = self._local('Lakes.zip', 'lakes')
+        self._remote('Lakes.zip', 'lakes')
+        local_hashes = {}
+        self._select(local_hashes)
+        hash_json = os.path.join(self.directory, 'local_hashes.json')
+        save_local_hashes(hash_json, local_hashes)
+        self.hashed = []
+
+        uploads, google_file_ids = self._select(load_local_hashes(hash_json))
+
+        self.assertEqual((uploads, self.hashed), ([], []))
+
+    def test_stale_cache_entry_is_rehashed(self):
+        local_path = self._local('Lakes.zip', 'lakes')
+        self._remote('Lakes.zip', 'lakes')
+        file_size, modified_time = self.zip_stats[local_path]
+        local_hashes = {local_path: {'size': file_size, 'modifiedTime': DRIVE_TIME, 'md5': 'stale'}}
+
+        uploads, google_file_ids = self._select(local_hashes)
+
+        self.assertEqual((uploads, self.hashed), ([], [local_path]))
+        self.assertEqual(local_hashes[local_path]['md5'], hashlib.md5('lakes').hexdigest())
+        self.assertEqual(local_hashes[local_path]['modifiedTime'], modified_time)
+
+
+class DriveTimeTest(unittest.TestCase):
+
+    def test_millisecond_precision(self):
+        self.assertEqual(drive_time(1496318400.1234), '2017-06-01T12:00:00.123Z')
+
+
+if __name__ == '__main__':
+    unittest.main()
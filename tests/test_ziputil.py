@@ -0,0 +1,182 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+import zlib
+
+import ziputil
+
+
+class ReproducibleZipTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.folder = os.path.join(self.directory, 'Roads')
+        os.makedirs(os.path.join(self.folder, 'Roads.gdb'))
+        self.dbf_data = '\x03\x75\x0a\x13' + os.urandom(2000)
+        self._write('Roads.dbf', self.dbf_data)
+        self._write('Roads.shp', os.urandom(5000) + 'a' * 20000)
+        self._write(os.path.join('Roads.gdb', 'a00000001.gdbtable'), 'b' * 3000)
+        self._write(os.path.join('Roads.gdb', '_gdb.host.lock'), 'lock')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, relative_path, data):
+        with open(os.path.join(self.folder, relative_path), 'wb') as out_file:
+            out_file.write(data)
+
+    def _zip_bytes(self, name):
+        zip_name = os.path.join(self.directory, name)
+        ziputil.zip_folder(self.folder, zip_name)
+        with open(zip_name, 'rb') as zip_file:
+            return zip_file.read()
+
+    def test_same_content_gives_same_bytes(self):
+        first = self._zip_bytes('first.zip')
+        for file_path, arcname in ziputil.zip_members(self.folder):
+            os.utime(file_path, (1500000000, 1500000000))
+            os.chmod(file_path, 0o600)
+
+        self.assertEqual(self._zip_bytes('second.zip'), first)
+
+    def test_rebuilt_shapefile_gives_same_bytes(self):
+        self._write('Roads.shp.xml', self._metadata('20170324', '10384300'))
+        first = self._zip_bytes('first.zip')
+        self._write('Roads.dbf', '\x03\x76\x01\x02' + self.dbf_data[4:])
+        self._write('Roads.shp.xml', self._metadata('20180101', '23595900'))
+
+        self.assertEqual(self._zip_bytes('second.zip'), first)
+
+    def _metadata(self, date, time):
+        return ('<metadata><Esri><CreaDate>{0}</CreaDate><CreaTime>{1}</CreaTime>'
+                '<ModDate>{0}</ModDate><ModTime>{1}</ModTime></Esri>'
+                '<DataProperties><lineage>\n<Process Date="{0}" Time="{1}">CopyFeatures C:\\scratch\\{1}</Process>'
+                '\n</lineage></DataProperties><mdDateSt Sync="TRUE">{0}</mdDateSt></metadata>').format(date, time)
+
+    def test_metadata_stamps_and_history_are_dropped(self):
+        self.assertEqual(ziputil.normalize_metadata(self._metadata('20170324', '10384300')),
+                         '<metadata><Esri><CreaDate></CreaDate><CreaTime></CreaTime><ModDate></ModDate>'
+                         '<ModTime></ModTime></Esri><DataProperties></DataProperties>'
+                         '<mdDateSt Sync="TRUE"></mdDateSt></metadata>')
+
+    def test_source_files_are_not_touched(self):
+        self._write('Roads.shp.xml', self._metadata('20170324', '10384300'))
+        times = {}
+        for file_path, arcname in ziputil.zip_members(self.folder):
+            os.utime(file_path, (1500000000, 1500000000))
+            times[file_path] = os.stat(file_path).st_mtime
+
+        zip_bytes = self._zip_bytes('roads.zip')
+
+        self.assertEqual(dict((file_path, os.stat(file_path).st_mtime) for file_path in times), times)
+        with open(os.path.join(self.directory, 'roads.zip'), 'rb') as zip_file:
+            self.assertEqual(zip_file.read(), zip_bytes)
+
+    def test_dbf_date_is_pinned_and_source_kept(self):
+        zip_name = os.path.join(self.directory, 'roads.zip')
+        ziputil.zip_folder(self.folder, zip_name)
+
+        with zipfile.ZipFile(zip_name) as zf:
+            self.assertEqual(zf.namelist(), ['Roads/Roads.dbf', 'Roads/Roads.shp', 'Roads/Roads.gdb/a00000001.gdbtable'])
+            self.assertEqual(zf.read('Roads/Roads.dbf'), self.dbf_data[:1] + ziputil.DBF_FIXED_DATE + self.dbf_data[4:])
+            for info in zf.infolist():
+                self.assertEqual(info.date_time, ziputil.ZIP_DATE_TIME)
+                self.assertEqual(info.external_attr, ziputil.ZIP_FILE_ATTR)
+        with open(os.path.join(self.folder, 'Roads.dbf'), 'rb') as dbf:
+            self.assertEqual(dbf.read(), self.dbf_data)
+
+    def test_streamed_members_match_members_written_from_memory(self):
+        reference_name = os.path.join(self.directory, 'reference.zip')
+        reference = zipfile.ZipFile(reference_name, 'w', zipfile.ZIP_DEFLATED)
+        for file_path, arcname in ziputil.zip_members(self.folder):
+            with open(file_path, 'rb') as member:
+                data = member.read()
+            if arcname.endswith('.dbf'):
+                data = data[:1] + ziputil.DBF_FIXED_DATE + data[4:]
+            ziputil.write_reproducible_data(reference, arcname, data)
+        reference.close()
+
+        with open(reference_name, 'rb') as reference_file:
+            self.assertEqual(self._zip_bytes('streamed.zip'), reference_file.read())
+
+    def test_reproducible_crc_matches_archived_crc(self):
+        zip_name = os.path.join(self.directory, 'roads.zip')
+        self._write('Roads.shp.xml', self._metadata('20170324', '10384300'))
+        ziputil.zip_folder(self.folder, zip_name)
+        read_chunk_size = ziputil.READ_CHUNK_SIZE
+        ziputil.READ_CHUNK_SIZE = 1000
+        try:
+            with zipfile.ZipFile(zip_name) as zf:
+                for file_path, arcname in ziputil.zip_members(self.folder):
+                    info = zf.getinfo(arcname)
+                    self.assertEqual(ziputil.reproducible_crc(file_path, arcname), (info.file_size, info.CRC))
+                    self.assertEqual(info.CRC, zlib.crc32(zf.read(arcname)) & 0xffffffff)
+        finally:
+            ziputil.READ_CHUNK_SIZE = read_chunk_size
+
+
+class UpdateZipTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.folder = os.path.join(self.directory, 'Package')
+        self.zip_name = os.path.join(self.directory, 'package.zip')
+        for member in ('Lakes', 'Roads'):
+            os.makedirs(os.path.join(self.folder, member))
+            self._write(member, 'data.dbf', '\x03\x75\x0a\x13' + member * 400)
+            self._write(member, 'data.shp', os.urandom(3000))
+        ziputil.zip_folder(self.folder, self.zip_name)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, member, name, data):
+        with open(os.path.join(self.folder, member, name), 'wb') as out_file:
+            out_file.write(data)
+
+    def _assert_matches_full_rebuild(self):
+        rebuilt = os.path.join(self.directory, 'rebuilt.zip')
+        ziputil.zip_folder(self.folder, rebuilt)
+        with open(self.zip_name, 'rb') as updated_file, open(rebuilt, 'rb') as rebuilt_file:
+            self.assertEqual(updated_file.read(), rebuilt_file.read())
+        with zipfile.ZipFile(self.zip_name) as zf:
+            self.assertIsNone(zf.testzip())
+
+    def test_unchanged_members_are_copied_byte_identical(self):
+        ziputil.update_zip(self.folder, self.zip_name)
+
+        self._assert_matches_full_rebuild()
+
+    def test_changed_added_and_removed_members(self):
+        self._write('Roads', 'data.shp', os.urandom(4000))
+        os.makedirs(os.path.join(self.folder, 'Rails'))
+        self._write('Rails', 'data.shp', 'rails' * 100)
+        os.remove(os.path.join(self.folder, 'Lakes', 'data.dbf'))
+        read_chunk_size = ziputil.READ_CHUNK_SIZE
+        ziputil.READ_CHUNK_SIZE = 1000
+        try:
+            ziputil.update_zip(self.folder, self.zip_name, ['Package/Lakes/'])
+        finally:
+            ziputil.READ_CHUNK_SIZE = read_chunk_size
+
+        self._assert_matches_full_rebuild()
+        self.assertFalse(os.path.exists(self.zip_name + '.tmp'))
+
+    def test_copied_entry_from_a_data_descriptor_zip(self):
+        with zipfile.ZipFile(self.zip_name) as source:
+            info = source.getinfo('Package/Roads/data.shp')
+            info.flag_bits |= ziputil.DATA_DESCRIPTOR_FLAG
+            copy_name = os.path.join(self.directory, 'copy.zip')
+            with zipfile.ZipFile(copy_name, 'w') as zf:
+                ziputil.copy_raw_member(source, info, zf)
+            expected = source.read('Package/Roads/data.shp')
+
+        with zipfile.ZipFile(copy_name) as copied:
+            self.assertEqual(copied.getinfo('Package/Roads/data.shp').flag_bits & ziputil.DATA_DESCRIPTOR_FLAG, 0)
+            self.assertEqual(copied.read('Package/Roads/data.shp'), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
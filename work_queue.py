@@ -0,0 +1,204 @@
+from __future__ import print_function
+import sqlite3
+import socket
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+LEASE_SECONDS = 900
+HEARTBEAT_SECONDS = 60
+POLL_SECONDS = 30
+MAX_ATTEMPTS = 3
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT,
+    name TEXT,
+    state TEXT DEFAULT 'queued',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER DEFAULT 0,
+    result TEXT,
+    updated REAL);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+CREATE TABLE IF NOT EXISTS job_dependencies (
+    job_id TEXT,
+    depends_on TEXT,
+    PRIMARY KEY (job_id, depends_on));
+'''
+
+
+def job_id_for(kind, name):
+    return '{}:{}'.format(kind, name)
+
+
+def default_worker_id():
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+class WorkQueue(object):
+    """Durable feature and package jobs shared by workers through SQLite.
+
+    Workers claim a job with a time limited lease and keep it with
+    heartbeats. A lease that runs out goes back to the queue. Package jobs
+    are only claimable once every member feature job is done. Use one queue
+    file per catalog run; rerunning against the same file resumes it.
+    """
+
+    def __init__(self, db_path, timeout=60):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+        self.connection.executescript(SCHEMA)
+
+    @contextmanager
+    def transaction(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield self.connection
+        except:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    def enqueue(self, kind, name, depends_on=()):
+        job_id = job_id_for(kind, name)
+        with self.transaction():
+            self._enqueue(job_id, kind, name, depends_on)
+
+        return job_id
+
+    def _enqueue(self, job_id, kind, name, depends_on):
+        self.connection.execute('INSERT OR IGNORE INTO jobs (job_id, kind, name, updated) VALUES (?, ?, ?, ?)',
+                                (job_id, kind, name, time.time()))
+        self.connection.executemany('INSERT OR IGNORE INTO job_dependencies VALUES (?, ?)',
+                                    [(job_id, dependency) for dependency in depends_on])
+
+    def enqueue_catalog(self, spec_store):
+        """Queue every feature and package in the spec store."""
+        with self.transaction():
+            for spec_name in spec_store.feature_names():
+                sgid_name = spec_store.get_feature(spec_name)['sgid_name']
+                self._enqueue(job_id_for('feature', sgid_name), 'feature', sgid_name, ())
+            for package_name in spec_store.package_names():
+                member_jobs = []
+                for sgid_name in spec_store.features_in_package(package_name):
+                    member_job = job_id_for('feature', sgid_name)
+                    self._enqueue(member_job, 'feature', sgid_name, ())
+                    member_jobs.append(member_job)
+                self._enqueue(job_id_for('package', package_name), 'package', package_name, member_jobs)
+        print('Queued jobs: {}'.format(self.counts()))
+
+    def _requeue_expired(self, now):
+        self.connection.execute('''UPDATE jobs SET state = 'queued', owner = NULL, lease_expires = NULL, updated = ?
+                                   WHERE state = 'leased' AND lease_expires < ?''', (now, now))
+
+    def claim(self, worker_id, lease_seconds=LEASE_SECONDS):
+        """Lease the next ready job. Returns (job_id, kind, name) or None."""
+        now = time.time()
+        with self.transaction():
+            self._requeue_expired(now)
+            job = self.connection.execute('''SELECT job_id, kind, name FROM jobs
+                                             WHERE state = 'queued' AND NOT EXISTS (
+                                                 SELECT 1 FROM job_dependencies d JOIN jobs m ON m.job_id = d.depends_on
+                                                 WHERE d.job_id = jobs.job_id AND m.state != 'done')
+                                             ORDER BY kind = 'package', job_id LIMIT 1''').fetchone()
+            if job:
+                self.connection.execute('''UPDATE jobs SET state = 'leased', owner = ?, lease_expires = ?,
+                                           attempts = attempts + 1, updated = ? WHERE job_id = ?''',
+                                        (worker_id, now + lease_seconds, now, job[0]))
+
+        return job
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=LEASE_SECONDS):
+        """Extend a lease. Returns False when the lease was lost."""
+        now = time.time()
+        with self.transaction():
+            extended = self.connection.execute('''UPDATE jobs SET lease_expires = ?, updated = ?
+                                                  WHERE job_id = ? AND owner = ? AND state = 'leased' ''',
+                                               (now + lease_seconds, now, job_id, worker_id)).rowcount
+
+        return extended == 1
+
+    def complete(self, job_id, worker_id, result=None):
+        with self.transaction():
+            self.connection.execute('''UPDATE jobs SET state = 'done', lease_expires = NULL, result = ?, updated = ?
+                                       WHERE job_id = ? AND owner = ?''',
+                                    (result, time.time(), job_id, worker_id))
+
+    def fail(self, job_id, worker_id, error, max_attempts=MAX_ATTEMPTS):
+        with self.transaction():
+            self.connection.execute('''UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                                       owner = NULL, lease_expires = NULL, result = ?, updated = ?
+                                       WHERE job_id = ? AND owner = ?''',
+                                    (max_attempts, str(error), time.time(), job_id, worker_id))
+
+    def counts(self):
+        return dict(self.connection.execute('SELECT state, count(*) FROM jobs GROUP BY state').fetchall())
+
+    def is_active(self):
+        """True while some job could still become claimable."""
+        now = time.time()
+        with self.transaction():
+            self._requeue_expired(now)
+        if self.connection.execute("SELECT 1 FROM jobs WHERE state = 'leased' LIMIT 1").fetchone():
+            return True
+
+        return self.connection.execute('''SELECT 1 FROM jobs WHERE state = 'queued' AND NOT EXISTS (
+                                              SELECT 1 FROM job_dependencies d JOIN jobs m ON m.job_id = d.depends_on
+                                              WHERE d.job_id = jobs.job_id AND m.state = 'failed')
+                                          LIMIT 1''').fetchone() is not None
+
+
+class _Heartbeat(threading.Thread):
+
+    def __init__(self, db_path, job_id, worker_id, lease_seconds, interval):
+        super(_Heartbeat, self).__init__()
+        self.daemon = True
+        self.db_path = db_path
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        #: sqlite connections can not be shared across threads
+        queue = WorkQueue(self.db_path)
+        while not self.stopped.wait(self.interval):
+            if not queue.heartbeat(self.job_id, self.worker_id, self.lease_seconds):
+                print('Lease lost for {}'.format(self.job_id))
+                return
+
+
+def run_worker(queue, handlers, worker_id=None, lease_seconds=LEASE_SECONDS,
+               heartbeat_seconds=HEARTBEAT_SECONDS, poll_seconds=POLL_SECONDS):
+    """Claim and run jobs until nothing is left.
+
+    handlers maps a job kind to a function of the job name.
+    """
+    worker_id = worker_id or default_worker_id()
+    while True:
+        job = queue.claim(worker_id, lease_seconds)
+        if not job:
+            if not queue.is_active():
+                break
+            time.sleep(poll_seconds)
+            continue
+
+        job_id, kind, name = job
+        print('{} claimed {}'.format(worker_id, job_id))
+        heartbeat = _Heartbeat(queue.db_path, job_id, worker_id, lease_seconds, heartbeat_seconds)
+        heartbeat.start()
+        try:
+            result = handlers[kind](name)
+        except Exception as error:
+            print('{} failed: {}'.format(job_id, error))
+            queue.fail(job_id, worker_id, error)
+        else:
+            queue.complete(job_id, worker_id, result)
+        finally:
+            heartbeat.stopped.set()
+            heartbeat.join()
+    print('Worker {} finished: {}'.format(worker_id, queue.counts()))
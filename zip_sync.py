@@ -0,0 +1,68 @@
+from __future__ import print_function
+import os
+import json
+from datetime import datetime
+
+from dirutil import hash_files
+
+
+def drive_time(timestamp):
+    """RFC 3339 time with the millisecond precision Drive stores."""
+    milliseconds = int(round(timestamp * 1000))
+    return '{}.{:03d}Z'.format(datetime.utcfromtimestamp(milliseconds // 1000).strftime('%Y-%m-%dT%H:%M:%S'),
+                               milliseconds % 1000)
+
+
+def load_local_hashes(local_hash_json):
+    if not os.path.exists(local_hash_json):
+        return {}
+    with open(local_hash_json, 'r') as json_file:
+        return json.load(json_file)
+
+
+def save_local_hashes(local_hash_json, local_hashes):
+    with open(local_hash_json, 'w') as json_file:
+        json.dump(local_hashes, json_file)
+
+
+def select_zip_uploads(top_dir, zip_stats, drive_index, local_hashes):
+    """Zips under top_dir that differ from their drive copy.
+
+    zip_stats maps each local zip path to (size, drive modified time). A
+    zip is uploaded when drive has no copy or the sizes differ, and skipped
+    when the modified times match. Otherwise its md5 is compared with the
+    drive md5Checksum; local_hashes caches md5s by size and modified time,
+    so only zips touched since they were last hashed are read, and it is
+    updated in place. Returns (upload paths, {path: drive id} of zips
+    already on drive).
+    """
+    uploads = []
+    google_file_ids = {}
+    md5_checks = []
+    needs_hash = []
+    for dir_path, (file_size, modified_time) in zip_stats.iteritems():
+        drive_file = drive_index.get_path(os.path.relpath(dir_path, top_dir))
+        if not drive_file:
+            uploads.append(dir_path)
+            continue
+        google_file_ids[dir_path] = drive_file['id']
+        if int(drive_file.get('size', -1)) != file_size:
+            uploads.append(dir_path)
+        elif drive_file.get('modifiedTime') == modified_time:
+            continue
+        else:
+            md5_checks.append((dir_path, drive_file))
+            cached = local_hashes.get(dir_path)
+            if not cached or cached['size'] != file_size or cached['modifiedTime'] != modified_time:
+                needs_hash.append(dir_path)
+
+    print('Hashing {} zips'.format(len(needs_hash)))
+    for dir_path, hex_digest in hash_files(needs_hash).iteritems():
+        file_size, modified_time = zip_stats[dir_path]
+        local_hashes[dir_path] = {'size': file_size, 'modifiedTime': modified_time, 'md5': hex_digest}
+
+    for dir_path, drive_file in md5_checks:
+        if local_hashes[dir_path]['md5'] != drive_file.get('md5Checksum'):
+            uploads.append(dir_path)
+
+    return uploads, google_file_ids
@@ -0,0 +1,205 @@
+from __future__ import print_function
+import os
+import re
+import shutil
+import struct
+import tempfile
+import zipfile
+import zlib
+
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+ZIP_FILE_ATTR = 0o100644 << 16
+ZIP_UNIX_SYSTEM = 3
+DBF_FIXED_DATE = '\x50\x01\x01'  # 1980-01-01 as YY(-1900) MM DD
+READ_CHUNK_SIZE = 1024 * 1024
+#: local header bit saying sizes and crc follow the data
+DATA_DESCRIPTOR_FLAG = 0x08
+#: offset of the modification time and date in a local file header
+LOCAL_HEADER_TIME_OFFSET = 10
+#: geoprocessing history and edit stamps ArcGIS writes into .shp.xml metadata
+METADATA_HISTORY = re.compile(r'<lineage>.*?</lineage>', re.S)
+METADATA_STAMPS = re.compile(r'<(CreaDate|CreaTime|ModDate|ModTime|SyncDate|SyncTime|mdDateSt)([^>]*)>[^<]*</\1>')
+
+
+def _is_dbf(arcname):
+    return arcname.lower().endswith('.dbf')
+
+
+def _is_metadata(arcname):
+    return arcname.lower().endswith('.xml')
+
+
+def normalize_metadata(data):
+    """Metadata xml without its geoprocessing history and with empty date and time stamps."""
+    return METADATA_STAMPS.sub(r'<\1\2></\1>', METADATA_HISTORY.sub('', data))
+
+
+def _pin_date_time(zf, info):
+    """Give a member zipfile wrote from a file the fixed ZIP_DATE_TIME instead of the file's mtime."""
+    date_time = info.date_time = ZIP_DATE_TIME
+    dos_date = (date_time[0] - 1980) << 9 | date_time[1] << 5 | date_time[2]
+    dos_time = date_time[3] << 11 | date_time[4] << 5 | (date_time[5] // 2)
+    #: the local header is already written, patch it in place as zipfile does for the crc
+    position = zf.fp.tell()
+    zf.fp.seek(info.header_offset + LOCAL_HEADER_TIME_OFFSET)
+    zf.fp.write(struct.pack('<HH', dos_time, dos_date))
+    zf.fp.seek(position)
+
+
+def _fix_info(info):
+    #: the creating system and attributes only go in the central directory,
+    #: which is written when the archive is closed
+    info.create_system = ZIP_UNIX_SYSTEM
+    info.external_attr = ZIP_FILE_ATTR
+
+
+def write_reproducible(zf, file_path, arcname):
+    """Stream a member with a fixed timestamp, permissions and compression.
+
+    The same content always gives the same archive bytes. The source file
+    is left as it is. dbf headers carry the date they were written, so a
+    dbf is patched in a temporary copy. Metadata xml is small and is
+    written through normalize_metadata. File geodatabase tables keep the
+    edit times ArcGIS stores in them, so a rebuilt gdb zips differently
+    even when its rows are the same.
+    """
+    if _is_metadata(arcname):
+        with open(file_path, 'rb') as metadata:
+            write_reproducible_data(zf, arcname, normalize_metadata(metadata.read()))
+        return
+    temp_path = None
+    if _is_dbf(arcname) and os.path.getsize(file_path) > 4:
+        handle, temp_path = tempfile.mkstemp(suffix='.dbf')
+        os.close(handle)
+        shutil.copyfile(file_path, temp_path)
+        with open(temp_path, 'r+b') as dbf:
+            dbf.seek(1)
+            dbf.write(DBF_FIXED_DATE)
+        file_path = temp_path
+    try:
+        zf.write(file_path, arcname, zipfile.ZIP_DEFLATED)
+    finally:
+        if temp_path:
+            os.remove(temp_path)
+    info = zf.getinfo(arcname)
+    _pin_date_time(zf, info)
+    _fix_info(info)
+
+
+def write_reproducible_data(zf, arcname, data):
+    """write_reproducible for a small member held in memory."""
+    info = zipfile.ZipInfo(arcname, ZIP_DATE_TIME)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    _fix_info(info)
+    zf.writestr(info, data)
+
+
+def reproducible_crc(file_path, arcname):
+    """(size, crc) write_reproducible would record for file_path, read in chunks."""
+    if _is_metadata(arcname):
+        with open(file_path, 'rb') as metadata:
+            data = normalize_metadata(metadata.read())
+        return len(data), zlib.crc32(data) & 0xffffffff
+    crc = 0
+    with open(file_path, 'rb') as member:
+        chunk = member.read(READ_CHUNK_SIZE)
+        if _is_dbf(arcname) and len(chunk) > 4:
+            chunk = chunk[:1] + DBF_FIXED_DATE + chunk[4:]
+        while chunk:
+            crc = zlib.crc32(chunk, crc)
+            chunk = member.read(READ_CHUNK_SIZE)
+
+    return os.path.getsize(file_path), crc & 0xffffffff
+
+
+def zip_members(folder_path):
+    """(file path, archive name) for every file under folder_path in a stable order."""
+    for root, subdirs, files in os.walk(folder_path):
+        subdirs.sort()
+        for filename in sorted(files):
+            if not filename.endswith('.lock'):
+                file_path = os.path.join(root, filename)
+                arcname = os.path.relpath(file_path, os.path.join(folder_path, '..'))
+                yield file_path, arcname.replace(os.sep, '/')
+
+
+def zip_folder(folder_path, zip_name, reproducible=True):
+    zf = zipfile.ZipFile(zip_name, 'w', zipfile.ZIP_DEFLATED)
+    for file_path, arcname in zip_members(folder_path):
+        if reproducible:
+            write_reproducible(zf, file_path, arcname)
+        else:
+            zf.write(file_path, arcname)
+    compress_size = 0
+    for info in zf.infolist():
+        compress_size += info.compress_size
+    zf.close()
+    print('{} Compressed size: {} MB'.format(os.path.basename(zip_name), compress_size / 1000000.0))
+
+
+def copy_raw_member(source_zip, info, zf):
+    """Copy an entry's compressed bytes from source_zip into zf without inflating and deflating them.
+
+    zipfile has no public way to do this, so it reads the source local
+    header and writes the new one through the ZipFile internals that
+    ZipFile.write uses itself. The copy streams in READ_CHUNK_SIZE pieces.
+    """
+    source_zip.fp.seek(info.header_offset)
+    header = source_zip.fp.read(zipfile.sizeFileHeader)
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    source_zip.fp.seek(name_length + extra_length, 1)
+
+    copied = zipfile.ZipInfo(info.filename, info.date_time)
+    copied.compress_type = info.compress_type
+    copied.create_system = info.create_system
+    copied.external_attr = info.external_attr
+    #: sizes and crc go in the local header so no data descriptor follows
+    copied.flag_bits = info.flag_bits & ~DATA_DESCRIPTOR_FLAG
+    copied.CRC = info.CRC
+    copied.compress_size = info.compress_size
+    copied.file_size = info.file_size
+    copied.header_offset = zf.fp.tell()
+    zf.fp.write(copied.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        chunk = source_zip.fp.read(min(remaining, READ_CHUNK_SIZE))
+        zf.fp.write(chunk)
+        remaining -= len(chunk)
+    zf.filelist.append(copied)
+    zf.NameToInfo[copied.filename] = copied
+    zf._didModify = True
+
+
+def update_zip(folder_path, zip_name, unchanged_prefixes=()):
+    """Bring an existing reproducible zip of folder_path up to date.
+
+    Entries under unchanged_prefixes and files whose crc and size match the
+    old entry are copied compressed; only the rest are deflated again. The
+    result is byte for byte what zip_folder would write.
+    """
+    if not os.path.exists(zip_name):
+        zip_folder(folder_path, zip_name)
+        return
+    unchanged_prefixes = tuple(unchanged_prefixes)
+    copied_count = 0
+    written_count = 0
+    temp_zip = zip_name + '.tmp'
+    previous = zipfile.ZipFile(zip_name, 'r')
+    previous_entries = dict((info.filename, info) for info in previous.infolist())
+    zf = zipfile.ZipFile(temp_zip, 'w', zipfile.ZIP_DEFLATED)
+    for file_path, arcname in zip_members(folder_path):
+        info = previous_entries.get(arcname)
+        if info and unchanged_prefixes and arcname.startswith(unchanged_prefixes):
+            copy_raw_member(previous, info, zf)
+            copied_count += 1
+        elif info and (info.file_size, info.CRC) == reproducible_crc(file_path, arcname):
+            copy_raw_member(previous, info, zf)
+            copied_count += 1
+        else:
+            write_reproducible(zf, file_path, arcname)
+            written_count += 1
+    zf.close()
+    previous.close()
+    os.remove(zip_name)
+    os.rename(temp_zip, zip_name)
+    print('{} entries rewritten: {} copied: {}'.format(os.path.basename(zip_name), written_count, copied_count))